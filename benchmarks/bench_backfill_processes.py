@@ -0,0 +1,104 @@
+"""Measures how the transform of a sharded backfill scales with the number of worker processes.
+
+A synthetic backfill of several million events is split in shards of one region and
+time window. Every shard is decoded, validated, hashed and transformed by
+`transform_shard`, first in this process and then in pools of 1 to N processes.
+
+Run from the root directory with:
+    python -m benchmarks.bench_backfill_processes
+    python -m benchmarks.bench_backfill_processes --rows 4000000 --processes 1 2 4 8
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from benchmarks.fixtures import make_usgs_csv
+from functions.backfill import transform_pool, transform_shard
+
+# Distinct responses written once and shared by the shards, to keep the setup short
+DISTINCT_RESPONSES = 8
+
+
+def make_shards(directory, n_rows, shard_rows):
+    paths = []
+    for seed in range(DISTINCT_RESPONSES):
+        path = os.path.join(directory, f"response-{seed}.csv")
+        with open(path, "w") as file:
+            file.write(make_usgs_csv(shard_rows, seed=seed, null_fraction=0.3))
+        paths.append(path)
+
+    return [
+        {
+            "region_name": "pleo_dk",
+            "response_path": paths[index % len(paths)],
+            "file_format": "csv",
+            "locations": {"pleo_dk": [55.69, 12.57]},
+            "maxradiuskm": 500,
+            "output_dir": directory,
+        }
+        for index in range(n_rows // shard_rows)
+    ]
+
+
+def remove_batches(results):
+    for batches in results:
+        for batch in batches:
+            os.remove(batch["raw_path"])
+            os.remove(batch["curated_path"])
+
+
+def time_in_process(shards):
+    start = time.perf_counter()
+    results = [transform_shard(shard) for shard in shards]
+    elapsed = time.perf_counter() - start
+    remove_batches(results)
+    return elapsed
+
+
+def time_in_processes(shards, processes):
+    with transform_pool(processes) as pool:
+        # Start the workers and import pandas in them outside of the timing
+        remove_batches(pool.map(transform_shard, shards[:processes]))
+
+        start = time.perf_counter()
+        results = list(pool.map(transform_shard, shards))
+        elapsed = time.perf_counter() - start
+    remove_batches(results)
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--shard-rows", type=int, default=50_000)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        nargs="+",
+        help="Pool sizes to time. Default is 1, 2, 4... up to the number of CPUs.",
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    cpus = os.cpu_count() or 1
+    pool_sizes = args.processes or [
+        2**power for power in range(cpus.bit_length()) if 2**power <= cpus
+    ]
+
+    with tempfile.TemporaryDirectory(prefix="bench-backfill-") as directory:
+        shards = make_shards(directory, args.rows, args.shard_rows)
+        n_rows = len(shards) * args.shard_rows
+        print(f"{n_rows} events in {len(shards)} shards, {cpus} CPUs")
+
+        baseline = time_in_process(shards)
+        print(f"in process: {baseline:.2f}s, {n_rows / baseline:,.0f} events/s")
+
+        for processes in pool_sizes:
+            elapsed = time_in_processes(shards, processes)
+            speedup = baseline / elapsed
+            print(
+                f"{processes} processes: {elapsed:.2f}s, {n_rows / elapsed:,.0f} events/s, "
+                f"{speedup:.2f}x ({speedup / processes:.0%} of linear)"
+            )
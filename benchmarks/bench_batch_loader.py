@@ -0,0 +1,42 @@
+"""Compares one load job per frame with the batched loader, against the fake BigQuery client.
+
+The fake client waits `JOB_LATENCY` seconds per job to mimic the startup latency of load jobs.
+
+Run from the root directory with:
+    python -m benchmarks.bench_batch_loader
+"""
+
+import time
+from benchmarks.fixtures import make_usgs_dataframe
+from functions.bigquery_functions import BatchLoader, push_data_to_bigquery
+from functions.fake_bigquery import FakeBigQueryClient
+
+JOB_LATENCY = 0.5
+
+
+def load_per_frame(frames, client):
+    """The previous approach, kept as the baseline for the comparison."""
+    for df in frames:
+        push_data_to_bigquery(
+            df, "project", "curated_data", "earthquakes", client=client
+        )
+
+
+def load_batched(frames, client):
+    with BatchLoader("project", client=client) as loader:
+        for df in frames:
+            loader.add(df, "curated_data", "earthquakes")
+
+
+if __name__ == "__main__":
+    frames = [make_usgs_dataframe(20_000, seed=seed) for seed in range(8)]
+    rows = sum(len(df) for df in frames)
+
+    for name, function in (("per frame", load_per_frame), ("batched", load_batched)):
+        client = FakeBigQueryClient(job_latency=JOB_LATENCY)
+        start = time.perf_counter()
+        function(frames, client)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name}: {len(client.jobs)} jobs, {elapsed:.2f}s, {rows / elapsed:,.0f} rows/s"
+        )
@@ -0,0 +1,61 @@
+"""Compares the setup overhead of one new BigQuery client per load with the shared client.
+
+No request is sent to BigQuery: the benchmark uses a throwaway service account key and only
+measures loading the credentials and creating the client, as done before every load.
+
+Run from the root directory with:
+    python -m benchmarks.bench_bigquery_client
+"""
+
+import json
+import os
+import tempfile
+import time
+import rsa
+from google.cloud import bigquery
+from functions import bigquery_client as client_module
+
+
+def write_fake_key(path):
+    _, private_key = rsa.newkeys(2048)
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "type": "service_account",
+                "project_id": "benchmark-project",
+                "private_key_id": "benchmark",
+                "private_key": private_key.save_pkcs1().decode(),
+                "client_email": "benchmark@benchmark-project.iam.gserviceaccount.com",
+                "client_id": "0",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            },
+            file,
+        )
+
+
+def new_client_per_load():
+    """The previous implementation, kept as the baseline for the comparison."""
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = client_module.KEY_PATH
+    return bigquery.Client()
+
+
+def setup_time_per_load(function, loads):
+    start = time.perf_counter()
+    for _ in range(loads):
+        function()
+    return (time.perf_counter() - start) / loads
+
+
+if __name__ == "__main__":
+    loads = 8  # Seven raw tables and the curated table
+    with tempfile.TemporaryDirectory() as directory:
+        client_module.KEY_PATH = os.path.join(directory, "key.json")
+        write_fake_key(client_module.KEY_PATH)
+
+        before = setup_time_per_load(new_client_per_load, loads)
+        after = setup_time_per_load(client_module.bigquery_client, loads)
+
+    print(
+        f"Setup per load over {loads} loads: new client {before * 1000:.2f} ms, "
+        f"shared client {after * 1000:.2f} ms"
+    )
@@ -0,0 +1,63 @@
+"""Compares appending every location to the combined DataFrame with combining them once.
+
+Run from the root directory with:
+    python -m benchmarks.bench_combine_locations
+"""
+
+import logging
+import time
+from benchmarks.fixtures import make_usgs_dataframe
+from functions.transformation import (
+    combine_dataframes,
+    minor_transform_and_append_dataframe,
+    minor_transform_dataframe,
+)
+
+COLUMNS_TO_KEEP = [
+    "hashed_id",
+    "time",
+    "mag",
+    "latitude",
+    "longitude",
+    "place",
+    "location",
+    "inserted_at",
+]
+
+
+def append_per_location(frames):
+    """The previous approach, kept as the baseline for the comparison."""
+    combined_df = None
+    for location_name, df in frames.items():
+        combined_df = minor_transform_and_append_dataframe(
+            location_name, df, COLUMNS_TO_KEEP, combined_df
+        )
+    return combined_df
+
+
+def combine_once(frames):
+    transformed = [
+        minor_transform_dataframe(location_name, df)
+        for location_name, df in frames.items()
+    ]
+    return combine_dataframes(transformed, COLUMNS_TO_KEEP)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    n_rows = 5_000
+    for n_locations in (10, 60, 120):
+        for name, function in (
+            ("append per location", append_per_location),
+            ("combine once", combine_once),
+        ):
+            frames = {
+                f"location_{i}": make_usgs_dataframe(n_rows, seed=i)
+                for i in range(n_locations)
+            }
+            start = time.perf_counter()
+            result = function(frames)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{n_locations} locations, {name}: {len(result)} rows in {elapsed:.2f}s"
+            )
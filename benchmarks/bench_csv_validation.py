@@ -0,0 +1,49 @@
+"""Compares the dict-per-row validation followed by a second parse with the single typed parse.
+
+Run from the root directory with:
+    python -m benchmarks.bench_csv_validation
+"""
+
+import time
+import tracemalloc
+from io import StringIO
+import pandas as pd
+from benchmarks.fixtures import make_usgs_csv
+from functions.transformation import (
+    read_and_validate_csv,
+    validate_and_transform_schema_from_csv,
+)
+
+
+def validate_then_parse(content):
+    """The previous implementation, kept as the baseline for the comparison."""
+    text = content.decode()
+    validate_and_transform_schema_from_csv(text)
+    return pd.read_csv(StringIO(text))
+
+
+def measure(function, content):
+    start = time.perf_counter()
+    function(content)
+    elapsed = time.perf_counter() - start
+
+    # Tracing slows down the run, so the peak memory is measured separately
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    for n_rows in (20_000, 200_000):
+        content = make_usgs_csv(n_rows).encode()
+        for name, function in (
+            ("validate+parse", validate_then_parse),
+            ("typed parse", read_and_validate_csv),
+        ):
+            elapsed, peak = measure(function, content)
+            print(
+                f"{n_rows} rows, {name}: {elapsed:.2f}s, "
+                f"peak {peak / len(content):.1f}x payload ({len(content) / 1e6:.1f} MB)"
+            )
@@ -0,0 +1,54 @@
+"""Compares the memory per event of the curated data as a DataFrame and as a CuratedBatch.
+
+Run from the root directory with:
+    python -m benchmarks.bench_curated_batch
+    python -m benchmarks.bench_curated_batch --rows 250000
+"""
+
+import argparse
+import logging
+import time
+from benchmarks.fixtures import make_usgs_dataframe
+from functions.curated import CURATED_COLUMNS, CuratedBatch, compact_raw
+from functions.transformation import minor_transform_dataframe
+
+
+def bytes_per_event(df):
+    return df.memory_usage(deep=True, index=False).sum() / len(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    raw_df = make_usgs_dataframe(args.rows, null_fraction=0.3)
+
+    start = time.perf_counter()
+    curated_df = minor_transform_dataframe("pleo_dk", raw_df.copy(deep=False))
+    plain_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = CuratedBatch.from_raw("pleo_dk", raw_df)
+    compact_seconds = time.perf_counter() - start
+
+    plain = bytes_per_event(curated_df[CURATED_COLUMNS])
+    compact = batch.nbytes / len(batch)
+    print(f"{len(batch)} events")
+    print(f"curated DataFrame: {plain:.1f} bytes/event, {plain_seconds:.2f}s")
+    print(
+        f"CuratedBatch: {compact:.1f} bytes/event, {compact_seconds:.2f}s "
+        f"({plain / compact:.1f}x smaller)"
+    )
+    for column in batch.df.columns:
+        print(
+            f"    {column}: {curated_df[column].memory_usage(deep=True, index=False) / len(batch):.1f}"
+            f" -> {batch.df[column].memory_usage(deep=True, index=False) / len(batch):.1f}"
+        )
+
+    raw = bytes_per_event(raw_df)
+    compact_raw_bytes = bytes_per_event(compact_raw(raw_df))
+    print(
+        f"raw data: {raw:.1f} -> {compact_raw_bytes:.1f} bytes/event with categoricals"
+    )
@@ -0,0 +1,34 @@
+"""Compares bytes transferred and decode time per 10k events for every USGS format.
+
+Run from the root directory with:
+    python -m benchmarks.bench_formats
+"""
+
+import gzip
+import logging
+import time
+from benchmarks.fixtures import make_usgs_csv, make_usgs_geojson, make_usgs_text
+from functions.formats import decode_response
+
+FIXTURES = {
+    "csv": make_usgs_csv,
+    "text": make_usgs_text,
+    "geojson": make_usgs_geojson,
+}
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    n_rows = 100_000
+    per = 10_000 / n_rows
+
+    for file_format, make_fixture in FIXTURES.items():
+        content = make_fixture(n_rows).encode()
+        start = time.perf_counter()
+        decode_response(content, file_format)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{file_format}: {len(content) * per / 1e6:.2f} MB "
+            f"({len(gzip.compress(content)) * per / 1e6:.2f} MB gzipped), "
+            f"decoded in {elapsed * per * 1000:.1f} ms per 10k events"
+        )
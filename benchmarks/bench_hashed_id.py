@@ -0,0 +1,34 @@
+"""Compares the row-wise and the columnar computation of hashed_id.
+
+Run from the root directory with:
+    python -m benchmarks.bench_hashed_id
+"""
+
+import time
+from benchmarks.fixtures import make_usgs_dataframe
+from functions.transformation import compute_hashed_id
+
+
+def row_wise_hashed_id(df):
+    """The previous implementation, kept as the baseline for the comparison."""
+    return df.apply(
+        lambda x: hash(tuple(x[col] for col in df.columns if col != "id")),
+        axis=1,
+    )
+
+
+def rows_per_second(function, df):
+    start = time.perf_counter()
+    function(df)
+    return len(df) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    for n_rows in (100_000, 250_000):
+        df = make_usgs_dataframe(n_rows)
+        row_wise = rows_per_second(row_wise_hashed_id, df)
+        columnar = rows_per_second(compute_hashed_id, df)
+        print(
+            f"{n_rows} rows: apply {row_wise:,.0f} rows/s, "
+            f"columnar {columnar:,.0f} rows/s ({columnar / row_wise:.0f}x)"
+        )
@@ -0,0 +1,91 @@
+"""Compares the load throughput of the sinks, on the curated table.
+
+The curated batches of several locations are buffered by the BatchLoader and written to
+each sink, first appended and then merged again on `id` and `location`. BigQuery is
+measured against the local fake client, so only its appends, i.e. the serialization, are
+timed: the merges of the fake client are simulated in Python.
+
+Run from the root directory with:
+    python -m benchmarks.bench_sinks
+    python -m benchmarks.bench_sinks --rows 200000 --sinks parquet duckdb
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import tempfile
+import time
+from benchmarks.fixtures import make_usgs_dataframe
+from functions.bigquery_functions import BatchLoader, BigQuerySink
+from functions.curated import CuratedBatch
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.sinks import DuckDBSink, ParquetSink
+from functions.tables import CURATED_TABLE
+
+LOCATIONS = [
+    "pleo_dk",
+    "pleo_uk",
+    "pleo_de",
+    "pleo_es",
+    "pleo_pt",
+    "pleo_ca",
+    "pleo_se",
+]
+
+
+def make_sink(name, directory):
+    if name == "duckdb":
+        return DuckDBSink(os.path.join(directory, "earthquakes.duckdb"))
+    if name == "parquet":
+        return ParquetSink(os.path.join(directory, "parquet"))
+    return BigQuerySink("project", client=FakeBigQueryClient())
+
+
+def time_load(sink, batches, if_exists):
+    start = time.perf_counter()
+    with BatchLoader("project", if_exists=if_exists, sink=sink) as loader:
+        for batch in batches:
+            loader.add(
+                batch,
+                "curated_data",
+                "earthquakes",
+                ["id", "location"],
+                CURATED_TABLE,
+            )
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--sinks",
+        nargs="+",
+        default=["bigquery", "parquet", "duckdb"],
+        help="Sinks to time. DuckDB is skipped if it is not installed.",
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rows_per_location = args.rows // len(LOCATIONS)
+    batches = [
+        CuratedBatch.from_raw(name, make_usgs_dataframe(rows_per_location, seed=seed))
+        for seed, name in enumerate(LOCATIONS)
+    ]
+    n_rows = sum(len(batch) for batch in batches)
+    print(f"{n_rows} curated events of {len(LOCATIONS)} locations")
+
+    for name in args.sinks:
+        if name == "duckdb" and importlib.util.find_spec("duckdb") is None:
+            print("duckdb: not installed, pip install duckdb")
+            continue
+        with tempfile.TemporaryDirectory(prefix="bench-sinks-") as directory:
+            sink = make_sink(name, directory)
+            appended = time_load(sink, batches, "append")
+            result = f"{name}: append {n_rows / appended:,.0f} rows/s ({appended:.2f}s)"
+            if name != "bigquery":
+                merged = time_load(sink, batches, "merge")
+                result += f", merge {n_rows / merged:,.0f} rows/s ({merged:.2f}s)"
+            sink.close()
+        print(result)
@@ -0,0 +1,111 @@
+"""Compares one radius query per office with region queries shared by nearby offices.
+
+Both modes run against a local stub of the USGS API, serving a synthetic catalogue
+around the seven offices of `config.toml`.
+
+Run from the root directory with:
+    python -m benchmarks.bench_spatial_regions
+"""
+
+import logging
+import math
+import time
+from urllib.parse import parse_qs, urlencode, urlsplit
+import pandas as pd
+from benchmarks.fixtures import make_usgs_dataframe
+from functions.extraction import extract_data_return_df
+from functions.spatial import assign_to_offices, haversine_km, plan_regions
+from tests.stub_usgs_server import StubUSGSServer
+
+# Geocoded coordinates of the offices in `config.toml`
+OFFICES = {
+    "pleo_dk": (55.6867, 12.5701),
+    "pleo_uk": (51.5233, -0.0790),
+    "pleo_de": (52.5233, 13.4167),
+    "pleo_es": (40.4203, -3.7058),
+    "pleo_pt": (38.7167, -9.1500),
+    "pleo_ca": (45.5017, -73.5673),
+    "pleo_se": (59.3365, 18.0627),
+}
+RADIUS_KM = 500
+
+
+class CatalogueServer(StubUSGSServer):
+    """Stub answering `/query` with the catalogue events inside the requested area."""
+
+    def __init__(self, catalogue):
+        super().__init__()
+        self.catalogue = catalogue
+        self.bytes_sent = 0
+
+    def body_for(self, path):
+        params = {
+            key: float(value[0])
+            for key, value in parse_qs(urlsplit(path).query).items()
+            if key != "format"
+        }
+        latitude = self.catalogue["latitude"]
+        longitude = self.catalogue["longitude"]
+        if "maxradiuskm" in params:
+            distances = haversine_km(
+                params["latitude"], params["longitude"], latitude, longitude
+            )
+            mask = distances <= params["maxradiuskm"]
+        else:
+            mask = latitude.between(
+                params["minlatitude"], params["maxlatitude"]
+            ) & longitude.between(params["minlongitude"], params["maxlongitude"])
+        body = self.catalogue[mask].to_csv(index=False)
+        with self._lock:
+            self.bytes_sent += len(body)
+        return body
+
+
+def make_catalogue(n_rows):
+    """Events spread over Europe, plus a quarter as many around the Canadian office."""
+    europe = make_usgs_dataframe(n_rows)
+    america = make_usgs_dataframe(n_rows // 4, seed=1)
+    america["longitude"] = america["longitude"] - 70
+    america["id"] = "ca" + america["id"]
+    return pd.concat([europe, america], ignore_index=True)
+
+
+def run(server, max_overfetch):
+    regions = plan_regions(OFFICES, RADIUS_KM, max_overfetch=max_overfetch)
+    requests_before, bytes_before = len(server.requests), server.bytes_sent
+    pairs = 0
+    start = time.perf_counter()
+    for region_name, region in regions.items():
+        df = extract_data_return_df(
+            f"{server.url}/fdsnws/event/1/query?format=csv&{urlencode(region['query'])}",
+            region_name,
+        )
+        offices = {name: OFFICES[name] for name in region["locations"]}
+        pairs += sum(
+            len(events) for events in assign_to_offices(df, offices, RADIUS_KM).values()
+        )
+    elapsed = time.perf_counter() - start
+    return (
+        len(server.requests) - requests_before,
+        server.bytes_sent - bytes_before,
+        pairs,
+        elapsed,
+    )
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    catalogue = make_catalogue(400_000)
+
+    with CatalogueServer(catalogue) as server:
+        for label, max_overfetch in (
+            ("one query per office", None),
+            ("regions, max_overfetch=0.0", 0.0),
+            ("regions, max_overfetch=0.25", 0.25),
+            ("one box for all offices", math.inf),
+        ):
+            n_requests, n_bytes, pairs, elapsed = run(server, max_overfetch)
+            print(
+                f"{label}: {n_requests} requests, {n_bytes / 1e6:.1f} MB, "
+                f"{pairs} office-event pairs in {elapsed:.2f}s"
+            )
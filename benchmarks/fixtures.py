@@ -0,0 +1,186 @@
+"""Synthetic USGS fixtures used by the benchmarks"""
+
+import json
+import numpy as np
+import pandas as pd
+
+USGS_COLUMNS = [
+    "time",
+    "latitude",
+    "longitude",
+    "depth",
+    "mag",
+    "magType",
+    "nst",
+    "gap",
+    "dmin",
+    "rms",
+    "net",
+    "id",
+    "updated",
+    "place",
+    "type",
+    "horizontalError",
+    "depthError",
+    "magError",
+    "magNst",
+    "status",
+    "locationSource",
+    "magSource",
+]
+
+
+def make_usgs_dataframe(n_rows, seed=0, null_fraction=0.0):
+    """
+    Creates a DataFrame shaped like a USGS CSV response.
+
+    Args:
+        n_rows (int): The number of events to generate.
+        seed (int, optional): Seed for the random generator. Default is 0.
+        null_fraction (float, optional): Share of events left without station data, as
+        reported by some contributing networks: `nst` and `gap` are empty together, and
+        `magNst` is empty on its own for another share. Default is 0.0.
+
+    Returns:
+        pd.DataFrame: The synthetic events, with the columns of the USGS CSV feed.
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp("2020-01-01", tz="UTC") + pd.to_timedelta(
+        rng.integers(0, 4 * 365 * 24 * 3600, n_rows), unit="s"
+    )
+    networks = np.array(["us", "ak", "ci", "nc", "hv"])
+    net = networks[rng.integers(0, len(networks), n_rows)]
+
+    df = pd.DataFrame(
+        {
+            "time": times.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "latitude": rng.uniform(35.0, 65.0, n_rows).round(4),
+            "longitude": rng.uniform(-10.0, 30.0, n_rows).round(4),
+            "depth": rng.uniform(0.0, 70.0, n_rows).round(3),
+            "mag": rng.uniform(1.0, 6.5, n_rows).round(1),
+            "magType": np.array(["ml", "mb", "mww", "md"])[rng.integers(0, 4, n_rows)],
+            "nst": rng.integers(5, 150, n_rows).astype("float64"),
+            "gap": rng.integers(10, 300, n_rows),
+            "dmin": rng.uniform(0.0, 10.0, n_rows).round(3),
+            "rms": rng.uniform(0.1, 1.5, n_rows).round(2),
+            "net": net,
+            "id": np.char.add(net, np.arange(n_rows).astype(str)),
+            "updated": times.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "place": np.char.add(
+                rng.integers(1, 500, n_rows).astype(str), " km NW of Somewhere"
+            ),
+            "type": "earthquake",
+            "horizontalError": rng.uniform(0.5, 15.0, n_rows).round(2),
+            "depthError": rng.uniform(0.5, 10.0, n_rows).round(2),
+            "magError": rng.uniform(0.01, 0.3, n_rows).round(3),
+            "magNst": rng.integers(1, 100, n_rows),
+            "status": "reviewed",
+            "locationSource": net,
+            "magSource": net,
+        },
+        columns=USGS_COLUMNS,
+    )
+
+    if null_fraction:
+        no_stations = rng.random(n_rows) < null_fraction
+        df.loc[no_stations, "nst"] = np.nan
+        df["gap"] = df["gap"].astype("Int64").mask(no_stations)
+        df["magNst"] = (
+            df["magNst"].astype("Int64").mask(rng.random(n_rows) < null_fraction)
+        )
+    return df
+
+
+def make_usgs_csv(n_rows, seed=0, null_fraction=0.0):
+    """
+    Creates the CSV body of a USGS response.
+
+    Args:
+        n_rows (int): The number of events to generate.
+        seed (int, optional): Seed for the random generator. Default is 0.
+        null_fraction (float, optional): Share of events without station data. See
+        `make_usgs_dataframe`. Default is 0.0.
+
+    Returns:
+        str: The CSV text, including the header row.
+    """
+    return make_usgs_dataframe(n_rows, seed=seed, null_fraction=null_fraction).to_csv(
+        index=False
+    )
+
+
+def make_usgs_geojson(n_rows, seed=0):
+    """
+    Creates the GeoJSON body of a USGS response, with the same events as `make_usgs_csv`.
+
+    Args:
+        n_rows (int): The number of events to generate.
+        seed (int, optional): Seed for the random generator. Default is 0.
+
+    Returns:
+        str: The GeoJSON text.
+    """
+    df = make_usgs_dataframe(n_rows, seed=seed)
+    epoch = pd.Timestamp("1970-01-01", tz="UTC")
+    time = (pd.to_datetime(df["time"]) - epoch) // pd.Timedelta(milliseconds=1)
+    updated = (pd.to_datetime(df["updated"]) - epoch) // pd.Timedelta(milliseconds=1)
+    features = [
+        {
+            "type": "Feature",
+            "properties": {
+                "mag": row.mag,
+                "place": row.place,
+                "time": int(row_time),
+                "updated": int(row_updated),
+                "status": row.status,
+                "net": row.net,
+                "nst": row.nst,
+                "dmin": row.dmin,
+                "rms": row.rms,
+                "gap": row.gap,
+                "magType": row.magType,
+                "type": row.type,
+            },
+            "geometry": {
+                "type": "Point",
+                "coordinates": [row.longitude, row.latitude, row.depth],
+            },
+            "id": row.id,
+        }
+        for row, row_time, row_updated in zip(df.itertuples(), time, updated)
+    ]
+    return json.dumps({"type": "FeatureCollection", "features": features})
+
+
+def make_usgs_text(n_rows, seed=0):
+    """
+    Creates the pipe-delimited FDSN text body of a USGS response, with the same events
+    as `make_usgs_csv`.
+
+    Args:
+        n_rows (int): The number of events to generate.
+        seed (int, optional): Seed for the random generator. Default is 0.
+
+    Returns:
+        str: The text body, including the header row.
+    """
+    df = make_usgs_dataframe(n_rows, seed=seed)
+    text = pd.DataFrame(
+        {
+            "#EventID": df["id"],
+            "Time": df["time"].str.rstrip("Z"),
+            "Latitude": df["latitude"],
+            "Longitude": df["longitude"],
+            "Depth/km": df["depth"],
+            "Author": df["locationSource"],
+            "Catalog": df["net"],
+            "Contributor": df["net"],
+            "ContributorID": df["id"],
+            "MagType": df["magType"],
+            "Magnitude": df["mag"],
+            "MagAuthor": df["magSource"],
+            "EventLocationName": df["place"],
+            "EventType": df["type"],
+        }
+    )
+    return text.to_csv(sep="|", index=False)
@@ -0,0 +1,218 @@
+"""Times every hot path of the pipeline at several sizes and stores the results as JSON.
+
+The results of two commits can be compared to catch regressions.
+
+Run from the root directory with:
+    python -m benchmarks.suite --sizes 1000 10000 100000
+    python -m benchmarks.suite --sizes 1000000 --cases extract_data_return_df
+    python -m benchmarks.suite --compare benchmarks/results/<previous commit>.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import pandas as pd
+from benchmarks.fixtures import make_usgs_csv, make_usgs_dataframe
+from functions.bigquery_functions import push_data_to_bigquery
+from functions.extraction import extract_data_return_df
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.transformation import (
+    determine_type,
+    minor_transform_and_append_dataframe,
+    validate_and_transform_schema_from_csv,
+)
+from tests.stub_usgs_server import StubUSGSServer
+
+# Share of events without station data, close to the USGS feed around the offices
+NULL_FRACTION = 0.3
+
+COLUMNS_TO_KEEP = [
+    "hashed_id",
+    "time",
+    "mag",
+    "latitude",
+    "longitude",
+    "place",
+    "location",
+    "inserted_at",
+]
+
+# Benchmark cases by name. Each one prepares its data for a number of rows, outside
+# of the timings, and yields the function to time
+CASES = {}
+
+
+def case(function):
+    """Registers a benchmark case under the name of its function."""
+    CASES[function.__name__] = contextmanager(function)
+    return function
+
+
+@case
+def determine_type_case(n_rows):
+    values = [
+        value
+        for line in make_usgs_csv(n_rows, null_fraction=NULL_FRACTION).splitlines()[1:]
+        for value in line.split(",")
+        if value
+    ]
+    yield lambda: [determine_type(value) for value in values]
+
+
+@case
+def validate_and_transform_schema_from_csv_case(n_rows):
+    text = make_usgs_csv(n_rows, null_fraction=NULL_FRACTION)
+    yield lambda: validate_and_transform_schema_from_csv(text)
+
+
+@case
+def extract_data_return_df_case(n_rows):
+    body = make_usgs_csv(n_rows, null_fraction=NULL_FRACTION)
+    with StubUSGSServer(csv_body=body) as server:
+        url = f"{server.url}/fdsnws/event/1/query?format=csv"
+        yield lambda: extract_data_return_df(url, "pleo_dk")
+
+
+@case
+def minor_transform_and_append_dataframe_case(n_rows):
+    df = make_usgs_dataframe(n_rows, null_fraction=NULL_FRACTION)
+    combined_df = make_usgs_dataframe(n_rows, seed=1, null_fraction=NULL_FRACTION)
+    combined_df = minor_transform_and_append_dataframe(
+        "pleo_de", combined_df, COLUMNS_TO_KEEP, None
+    )
+    # The function adds columns to its input, so every run transforms a fresh copy
+    yield lambda: minor_transform_and_append_dataframe(
+        "pleo_dk", df.copy(), COLUMNS_TO_KEEP, combined_df
+    )
+
+
+@case
+def push_data_to_bigquery_case(n_rows):
+    df = make_usgs_dataframe(n_rows, null_fraction=NULL_FRACTION)
+    client = FakeBigQueryClient()
+    yield lambda: push_data_to_bigquery(
+        df, "project", "raw_data", "pleo_dk", if_exists="replace", client=client
+    )
+
+
+def measure(name, n_rows, repeat):
+    """
+    Times a case, keeping the best and the median of `repeat` runs.
+
+    Returns:
+        dict: The timings of the case.
+    """
+    timings = []
+    with CASES[name](n_rows) as function:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {
+        "case": name.removesuffix("_case"),
+        "rows": n_rows,
+        "repeat": repeat,
+        "best_seconds": best,
+        "median_seconds": statistics.median(timings),
+        "rows_per_second": n_rows / best if best else None,
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous, threshold):
+    """
+    Prints the change of every case against previous results.
+
+    Returns:
+        bool: True if a case is slower than `threshold` times its previous best.
+    """
+    previous_best = {
+        (result["case"], result["rows"]): result["best_seconds"]
+        for result in previous["results"]
+    }
+    regression = False
+    for result in results["results"]:
+        before = previous_best.get((result["case"], result["rows"]))
+        if before is None:
+            continue
+        ratio = result["best_seconds"] / before
+        flag = " REGRESSION" if ratio > threshold else ""
+        regression = regression or bool(flag)
+        print(
+            f"{result['case']} ({result['rows']} rows): {before:.4f}s -> "
+            f"{result['best_seconds']:.4f}s ({ratio:.2f}x){flag}"
+        )
+    return regression
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=[name.removesuffix("_case") for name in CASES],
+        help="Cases to run. Default is all.",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Default is benchmarks/results/<commit>.json.")
+    parser.add_argument("--compare", help="Results of a previous run to compare with.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Slowdown flagged as a regression by --compare. Default is 1.2.",
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    names = [f"{name}_case" for name in args.cases] if args.cases else list(CASES)
+
+    commit = current_commit()
+    results = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "results": [],
+    }
+    for n_rows in args.sizes:
+        for name in names:
+            result = measure(name, n_rows, args.repeat)
+            results["results"].append(result)
+            print(
+                f"{result['case']} ({n_rows} rows): best {result['best_seconds']:.4f}s, "
+                f"median {result['median_seconds']:.4f}s"
+            )
+
+    output = args.output or f"benchmarks/results/{commit or 'local'}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())
+        sys.exit(1 if compare(results, previous, args.threshold) else 0)
@@ -0,0 +1,127 @@
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+from functions.curated import CuratedBatch, compact_raw
+from functions.formats import decode_response
+from functions.logger import get_logger
+from functions.spatial import assign_to_offices
+
+logger = get_logger("backfill")
+
+
+def transform_pool(processes):
+    """
+    Creates the pool of processes decoding and transforming the shards of a backfill.
+
+    The processes are spawned rather than forked, since the pipeline already runs
+    threads whose locks would be copied in an undefined state. Log levels disabled
+    with `logging.disable` in this process are disabled in the workers too.
+
+    Args:
+        processes (int): The number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The pool, to be used as a context manager.
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=logging.disable,
+        initargs=(logging.root.manager.disable,),
+    )
+
+
+def write_batch(df, directory):
+    """
+    Writes a DataFrame to a new Arrow IPC file, keeping its column types.
+
+    Args:
+        df (pd.DataFrame): The data to write.
+        directory (str): The directory of the file.
+
+    Returns:
+        str: The path of the file.
+    """
+    path = os.path.join(directory, f"batch-{uuid.uuid4().hex}.arrow")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+
+def read_batch(path, remove=True):
+    """
+    Reads a DataFrame written by `write_batch`, mapping the file instead of copying it.
+
+    Args:
+        path (str): The path of the Arrow IPC file.
+        remove (bool, optional): Delete the file once read. Default is True.
+
+    Returns:
+        pd.DataFrame: The data, with the column types it was written with.
+    """
+    # Pandas string columns are Arrow strings in this pipeline, so do not copy them to Python objects
+    with pa.memory_map(path) as source, pd.option_context(
+        "mode.string_storage", "pyarrow"
+    ):
+        df = pa.ipc.open_file(source).read_all().to_pandas()
+    if remove:
+        os.remove(path)
+    return df
+
+
+def transform_shard(shard):
+    """
+    Decodes, validates and transforms the response of one region and time window.
+
+    Runs in a worker process. The response and the results are exchanged as files, so
+    that only their paths are pickled between the processes.
+
+    Args:
+        shard (dict): The work of the shard, with:
+            - region_name (str): The name of the region.
+            - response_path (str): The file holding the response body.
+            - file_format (str): The format of the response.
+            - locations (dict): The [latitude, longitude] of every location in the region.
+            - maxradiuskm (float): The radius of the locations, used to split merged regions.
+            - output_dir (str): The directory of the result files.
+
+    Returns:
+        list: A dict for every location with data, with:
+            - location_name (str): The name of the location.
+            - raw_path (str): The Arrow IPC file of the raw data, unique on 'id'.
+            - curated_path (str): The Arrow IPC file of the CuratedBatch columns, row by
+              row aligned with the raw data.
+            - inserted_at (datetime): The insertion time of the CuratedBatch.
+            - rows (int): The number of events.
+    """
+    with open(shard["response_path"], "rb") as file:
+        df = decode_response(file.read(), shard["file_format"])
+
+    if len(shard["locations"]) == 1:
+        located_data = {shard["region_name"]: df}
+    else:
+        # Keep the events within maxradiuskm of each office, as its radius query would
+        located_data = assign_to_offices(df, shard["locations"], shard["maxradiuskm"])
+
+    batches = []
+    for location_name, location_df in located_data.items():
+        if location_df.empty:
+            continue
+        raw_df = compact_raw(location_df[~location_df["id"].duplicated()])
+        curated = CuratedBatch.from_raw(location_name, raw_df)
+        batches.append(
+            {
+                "location_name": location_name,
+                "raw_path": write_batch(raw_df, shard["output_dir"]),
+                "curated_path": write_batch(curated.df, shard["output_dir"]),
+                "inserted_at": curated.inserted_at,
+                "rows": len(curated),
+            }
+        )
+    return batches
@@ -1,16 +1,24 @@
 from google.cloud import bigquery
 import os
+import threading
 from functions.logger import get_logger
 
 logger = get_logger("bigquery-client")
 
+# Path to the service account key file
+KEY_PATH = "./bigquery-project-earthquake-secrets.json"
+
+_client = None
+_client_lock = threading.Lock()
+
 
 def bigquery_client():
     """
-    Creates and returns a BigQuery client using a service account key file for authentication.
+    Returns the BigQuery client shared by the whole process, creating it on first use.
 
-    The function sets the environment variable `GOOGLE_APPLICATION_CREDENTIALS` to the path of the
-    service account key file and then creates a BigQuery client.
+    The first call sets the environment variable `GOOGLE_APPLICATION_CREDENTIALS` to the path of the
+    service account key file and creates the client. Later calls return the same client, so the
+    credentials are loaded once and HTTP connections are reused across loads.
 
     Returns:
         google.cloud.bigquery.Client: An authenticated BigQuery client.
@@ -18,13 +26,29 @@ def bigquery_client():
     Raises:
         google.auth.exceptions.DefaultCredentialsError: If the credentials are not found or invalid.
     """
-    # Path to the service account key file
-    key_path = "./bigquery-project-earthquake-secrets.json"
-    logger.debug("Create BigQuery client.")
-    # Set the environment variable for authentication
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = key_path
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            logger.debug("Create BigQuery client.")
+            # Set the environment variable for authentication
+            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = KEY_PATH
+
+            # Create a BigQuery client
+            _client = bigquery.Client()
+
+        return _client
 
-    # Create a BigQuery client
-    client = bigquery.Client()
 
-    return client
+def set_bigquery_client(client):
+    """
+    Replaces the shared BigQuery client, e.g. with a local fake in tests.
+
+    Args:
+        client: The client returned by `bigquery_client` from now on. Pass None to
+        create a new authenticated client on the next call.
+    """
+    global _client
+
+    with _client_lock:
+        _client = client
@@ -1,14 +1,216 @@
-import pandas_gbq
+from google.cloud import bigquery
+from datetime import timedelta
+from io import BytesIO
+import threading
 from functions.bigquery_client import bigquery_client
+from functions.curated import CuratedBatch
 from functions.logger import get_logger
+from functions.metrics import stage
+from functions.sinks import Sink, to_arrow
+from functions.tables import ensure_table
 import pandas as pd
+import pyarrow.parquet as pq
 
 logger = get_logger("bigquery-functions")
 
+# Write dispositions matching the `if_exists` options of pandas_gbq
+WRITE_DISPOSITIONS = {
+    "fail": bigquery.WriteDisposition.WRITE_EMPTY,
+    "replace": bigquery.WriteDisposition.WRITE_TRUNCATE,
+    "append": bigquery.WriteDisposition.WRITE_APPEND,
+}
 
-def push_data_to_bigquery(df, project_id, dataset_id, table_name, if_exists="append"):
+
+def build_merge_query(table_id, staging_id, columns, merge_keys, partition_filter=None):
+    """
+    Builds the SQL upserting the rows of a staging table into the target table.
+
+    Rows of the target matching a staged row on `merge_keys` are replaced by the staged row,
+    and the other staged rows are inserted. The target is created from the staging table if
+    it does not exist yet. Only SQL also accepted by SQLite is used, so the local fake can run it.
+
+    Args:
+        table_id (str): The target table, as "project.dataset.table".
+        staging_id (str): The staging table holding the new rows.
+        columns (list): The columns to insert.
+        merge_keys (list): The columns identifying a row, e.g. ["id"].
+        partition_filter (str, optional): Condition on the `target` alias limiting the
+        rows replaced, so that only the partitions of the staged rows are scanned.
+
+    Returns:
+        str: The SQL script.
+    """
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    key_condition = " AND ".join(
+        f"staging.`{key}` = target.`{key}`" for key in merge_keys
+    )
+    condition = (
+        f"EXISTS (SELECT 1 FROM `{staging_id}` AS staging WHERE {key_condition})"
+    )
+    if partition_filter:
+        condition = f"{partition_filter}\nAND {condition}"
+    return f"""
+CREATE TABLE IF NOT EXISTS `{table_id}` AS SELECT * FROM `{staging_id}` LIMIT 0;
+BEGIN TRANSACTION;
+DELETE FROM `{table_id}` AS target
+WHERE {condition};
+INSERT INTO `{table_id}` ({column_list}) SELECT {column_list} FROM `{staging_id}`;
+COMMIT TRANSACTION;
+"""
+
+
+def build_replace_query(table_id, staging_id, columns, partition_filter):
+    """
+    Builds the SQL replacing the partitions spanned by a staging table with its rows.
+
+    Args:
+        table_id (str): The target table, as "project.dataset.table".
+        staging_id (str): The staging table holding the new rows.
+        columns (list): The columns to insert.
+        partition_filter (str): Condition on the `target` alias selecting the rows replaced.
+
+    Returns:
+        str: The SQL script.
+    """
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    return f"""
+BEGIN TRANSACTION;
+DELETE FROM `{table_id}` AS target
+WHERE {partition_filter};
+INSERT INTO `{table_id}` ({column_list}) SELECT {column_list} FROM `{staging_id}`;
+COMMIT TRANSACTION;
+"""
+
+
+def load_job_config(if_exists, spec=None, source_format=None):
+    """
+    Builds the configuration of a load job, with the explicit schema of the table if any.
+
+    Args:
+        if_exists (str): Options are 'fail', 'replace', 'append'.
+        spec (TableSpec, optional): The definition of the target table.
+        source_format (str, optional): The format of the loaded file, e.g. PARQUET.
+
+    Returns:
+        google.cloud.bigquery.LoadJobConfig: The configuration of the job.
+    """
+    job_config = bigquery.LoadJobConfig(write_disposition=WRITE_DISPOSITIONS[if_exists])
+    if source_format is not None:
+        job_config.source_format = source_format
+    if spec is not None:
+        job_config.schema = spec.bigquery_schema
+    return job_config
+
+
+def stage_rows(client, df, table_id, query, project_id=None, spec=None):
+    """
+    Loads rows to a staging table next to the target, runs a query and drops the staging table.
+
+    Args:
+        client (google.cloud.bigquery.Client): The client used for the load and the query.
+        df (pd.DataFrame): The rows to stage.
+        table_id (str): The target table, as "project.dataset.table".
+        query (callable): Takes the staging table ID and returns the SQL to run.
+        project_id (str, optional): The Google Cloud project ID running the jobs.
+        spec (TableSpec, optional): The definition of the target table.
+    """
+    staging_id = f"{table_id}__staging"
+    client.load_table_from_dataframe(
+        df,
+        staging_id,
+        project=project_id,
+        job_config=load_job_config("replace", spec),
+    ).result()
+
+    try:
+        client.query(query(staging_id), project=project_id).result()
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+
+def merge_into_table(client, df, table_id, merge_keys, project_id=None, spec=None):
+    """
+    Upserts a DataFrame into a table through a staging table, keyed on `merge_keys`.
+
+    Loading the same rows again does not change the size of the table, and rows whose
+    key is already present are replaced by their latest version. With a table definition,
+    the table is created partitioned and clustered, and only the partitions of the rows
+    are scanned.
+
+    Args:
+        client (google.cloud.bigquery.Client): The client used for the load and the query.
+        df (pd.DataFrame): The rows to upsert.
+        table_id (str): The target table, as "project.dataset.table".
+        merge_keys (list): The columns identifying a row, e.g. ["id"].
+        project_id (str, optional): The Google Cloud project ID running the jobs.
+        spec (TableSpec, optional): The definition of the target table.
+    """
+    # A key can only match one staged row, so keep the latest version of each
+    df = df.drop_duplicates(subset=merge_keys, keep="last")
+    partition_filter = None
+    if spec is not None:
+        ensure_table(client, table_id, spec)
+        df = spec.prepare(df)
+        partition_filter = spec.partition_filter(df, "target")
+
+    stage_rows(
+        client,
+        df,
+        table_id,
+        lambda staging_id: build_merge_query(
+            table_id, staging_id, list(df.columns), merge_keys, partition_filter
+        ),
+        project_id=project_id,
+        spec=spec,
+    )
+    logger.debug(f"Merged {len(df)} rows into {table_id} on {merge_keys}.")
+
+
+def replace_partitions(client, df, table_id, spec, project_id=None):
+    """
+    Replaces the day partitions spanned by the rows of a DataFrame, keeping the other ones.
+
+    Args:
+        client (google.cloud.bigquery.Client): The client used for the load and the query.
+        df (pd.DataFrame): The rows of the partitions.
+        table_id (str): The target table, as "project.dataset.table".
+        spec (TableSpec): The definition of the target table.
+        project_id (str, optional): The Google Cloud project ID running the jobs.
+    """
+    ensure_table(client, table_id, spec)
+    df = spec.prepare(df)
+    partition_filter = spec.partition_filter(df, "target", margin=timedelta(0))
+    if partition_filter is None:
+        partition_filter = "FALSE"  # No partition time, so there is nothing to replace
+
+    stage_rows(
+        client,
+        df,
+        table_id,
+        lambda staging_id: build_replace_query(
+            table_id, staging_id, list(df.columns), partition_filter
+        ),
+        project_id=project_id,
+        spec=spec,
+    )
+    logger.debug(
+        f"Replaced {len(spec.partitions(df))} partitions of {table_id} with {len(df)} rows."
+    )
+
+
+def push_data_to_bigquery(
+    df,
+    project_id,
+    dataset_id,
+    table_name,
+    if_exists="append",
+    client=None,
+    merge_keys=None,
+    spec=None,
+    sink=None,
+):
     """
-    Pushes a pandas DataFrame to a BigQuery table.
+    Pushes a pandas DataFrame to a BigQuery table, or to another sink.
 
     Args:
         df (pd.DataFrame): The DataFrame containing the data to be pushed.
@@ -16,7 +218,15 @@ def push_data_to_bigquery(df, project_id, dataset_id, table_name, if_exists="app
         dataset_id (str): The BigQuery dataset ID.
         table_name (str): The name of the BigQuery table.
         if_exists (str, optional): Specifies the behavior when the table already exists.
-        Options are 'fail', 'replace', 'append'. Default is 'append'.
+        Options are 'fail', 'replace', 'append', 'merge'. Default is 'append'.
+        client (google.cloud.bigquery.Client, optional): The client used for the load.
+        Default is the shared client returned by `bigquery_client`.
+        merge_keys (list, optional): The columns identifying a row, required by 'merge'.
+        spec (TableSpec, optional): The schema, partitioning and clustering the table is
+        created with. 'replace' then only replaces the partitions of the rows. Default is
+        the schema inferred by BigQuery.
+        sink (Sink, optional): Where the rows are written instead, e.g. a DuckDBSink or a
+        ParquetSink, as an Arrow table. Default is BigQuery.
 
     Returns:
         str: A message indicating if the DataFrame was empty.
@@ -28,16 +238,238 @@ def push_data_to_bigquery(df, project_id, dataset_id, table_name, if_exists="app
         table_id = f"{project_id}.{dataset_id}.{table_name}"
         logger.debug(f"Sending data to {table_id}")
 
-        # Create a BigQuery client
-        client = bigquery_client()
+        if sink is not None:
+            with stage("load", table=table_id) as record:
+                table = to_arrow(df, spec, merge_keys if if_exists == "merge" else None)
+                record["rows"] = table.num_rows
+                record["bytes"] = sink.write(
+                    table_id, table, if_exists, merge_keys=merge_keys, spec=spec
+                )
+            return
 
-        # Use the client to push data to BigQuery
-        pandas_gbq.to_gbq(
-            df,
-            table_id,
-            project_id=project_id,
-            if_exists=if_exists,
-            credentials=client._credentials,
-        )
+        # Reuse the shared BigQuery client, with its credentials and connections
+        if client is None:
+            client = bigquery_client()
+
+        with stage("load", table=table_id) as record:
+            record["rows"] = len(df)
+            if if_exists == "merge":
+                merge_into_table(
+                    client, df, table_id, merge_keys, project_id=project_id, spec=spec
+                )
+                return
+            if if_exists == "replace" and spec is not None:
+                replace_partitions(client, df, table_id, spec, project_id=project_id)
+                return
+            if spec is not None:
+                ensure_table(client, table_id, spec)
+                df = spec.prepare(df)
+
+            # Use the client to push data to BigQuery
+            job = client.load_table_from_dataframe(
+                df,
+                table_id,
+                project=project_id,
+                job_config=load_job_config(if_exists, spec),
+            )
+            job.result()  # Wait for the load to finish
     else:
         return "Empty DataFrame received and moving to next location."
+
+
+class BigQuerySink(Sink):
+    """
+    Writes the tables to BigQuery, with one Parquet load job per table and flush.
+
+    Merges and partition replacements go through a staging table, see `merge_into_table`
+    and `replace_partitions`.
+
+    Args:
+        project_id (str): The Google Cloud project ID running the jobs.
+        client (google.cloud.bigquery.Client, optional): The client used for the loads.
+        Default is the shared client returned by `bigquery_client`.
+    """
+
+    def __init__(self, project_id, client=None):
+        self.project_id = project_id
+        self.client = client
+
+    def write(self, table_id, table, if_exists="append", merge_keys=None, spec=None):
+        # Returns the size of the Parquet file sent, or 0 when going through a staging table
+        logger.debug(f"Sending {table.num_rows} rows to {table_id} in one load job.")
+        client = self.client if self.client is not None else bigquery_client()
+
+        if if_exists == "merge":
+            merge_into_table(
+                client,
+                table.to_pandas(),
+                table_id,
+                merge_keys,
+                project_id=self.project_id,
+                spec=spec,
+            )
+            return 0
+        if if_exists == "replace" and spec is not None:
+            replace_partitions(
+                client, table.to_pandas(), table_id, spec, project_id=self.project_id
+            )
+            return 0
+
+        if spec is not None:
+            ensure_table(client, table_id, spec)
+
+        # Serialize the batch once to Parquet, which keeps the column types
+        data = BytesIO()
+        pq.write_table(table, data)
+        size = data.tell()
+        data.seek(0)
+
+        job_config = load_job_config(
+            if_exists, spec, source_format=bigquery.SourceFormat.PARQUET
+        )
+        job = client.load_table_from_file(
+            data, table_id, project=self.project_id, job_config=job_config
+        )
+        job.result()  # Wait for the load to finish
+        return size
+
+
+class BatchLoader:
+    """
+    Buffers DataFrames per table and writes each buffer to the sink as a single Arrow table.
+
+    A table is flushed when its buffer reaches `max_rows` rows or `max_bytes` bytes in memory,
+    and all remaining buffers are flushed by `flush` or when leaving the `with` block.
+    With BigQuery, every flush is one Parquet load job.
+
+    Args:
+        project_id (str): The Google Cloud project ID.
+        max_rows (int, optional): Rows buffered per table before flushing it. Default is 500000.
+        max_bytes (int, optional): Bytes buffered per table before flushing it. Default is 256 MB.
+        if_exists (str, optional): Specifies the behavior when the table already exists.
+        Options are 'fail', 'replace', 'append', 'merge'. Default is 'append'.
+        client (google.cloud.bigquery.Client, optional): The client used for the loads.
+        Default is the shared client returned by `bigquery_client`.
+        sink (Sink, optional): Where the tables are written. Default is BigQuery, with `client`.
+
+    Attributes:
+        jobs (int): The number of load jobs submitted.
+        rows_loaded (int): The number of rows loaded.
+    """
+
+    def __init__(
+        self,
+        project_id,
+        max_rows=500_000,
+        max_bytes=256 * 1024 * 1024,
+        if_exists="append",
+        client=None,
+        sink=None,
+    ):
+        self.project_id = project_id
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.if_exists = if_exists
+        self.sink = sink if sink is not None else BigQuerySink(project_id, client)
+        self.jobs = 0
+        self.rows_loaded = 0
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def add(self, df, dataset_id, table_name, merge_keys=None, spec=None):
+        """
+        Buffers a DataFrame for a table, flushing the table if a threshold is reached.
+
+        A CuratedBatch stays compact in the buffer and is expanded when the table is loaded.
+
+        Args:
+            df (pd.DataFrame | CuratedBatch): The data to be pushed.
+            dataset_id (str): The BigQuery dataset ID.
+            table_name (str): The name of the BigQuery table.
+            merge_keys (list, optional): The columns identifying a row, required by 'merge'.
+            spec (TableSpec, optional): The schema, partitioning and clustering the table
+            is created with. Default is the schema inferred by BigQuery.
+
+        Raises:
+            ValueError: If the loader merges and no merge keys are given.
+        """
+        if self.if_exists == "merge" and not merge_keys:
+            raise ValueError(f"Merge keys are required to merge into {table_name}.")
+
+        if isinstance(df, CuratedBatch):
+            nbytes = df.nbytes
+        else:
+            # Shallow copy, so columns added to the caller's DataFrame are not loaded
+            df = pd.DataFrame(df).copy(deep=False)
+            nbytes = int(df.memory_usage(deep=True).sum())
+        if len(df) == 0:
+            return
+
+        table_id = f"{self.project_id}.{dataset_id}.{table_name}"
+        with self._lock:
+            buffer = self._buffers.setdefault(
+                table_id,
+                {
+                    "frames": [],
+                    "rows": 0,
+                    "bytes": 0,
+                    "merge_keys": merge_keys,
+                    "spec": spec,
+                },
+            )
+            buffer["frames"].append(df)
+            buffer["rows"] += len(df)
+            buffer["bytes"] += nbytes
+            full = buffer["rows"] >= self.max_rows or buffer["bytes"] >= self.max_bytes
+
+        if full:
+            self.flush(table_id)
+
+    def flush(self, table_id=None):
+        """
+        Loads the buffered data, of one table or of all tables.
+
+        Args:
+            table_id (str, optional): The table to flush. Default is all tables.
+        """
+        with self._lock:
+            table_ids = [table_id] if table_id is not None else list(self._buffers)
+            buffers = {
+                table_id: self._buffers.pop(table_id)
+                for table_id in table_ids
+                if table_id in self._buffers
+            }
+
+        for table_id, buffer in buffers.items():
+            with stage("load", table=table_id) as record:
+                df = pd.concat(
+                    [
+                        frame.to_frame() if isinstance(frame, CuratedBatch) else frame
+                        for frame in buffer["frames"]
+                    ],
+                    ignore_index=True,
+                )
+                record["bytes"] = self._load(
+                    table_id, df, buffer["merge_keys"], buffer["spec"]
+                )
+                record["rows"] = len(df)
+
+    def _load(self, table_id, df, merge_keys=None, spec=None):
+        merge = self.if_exists == "merge"
+        table = to_arrow(df, spec, merge_keys if merge else None)
+        size = self.sink.write(
+            table_id, table, self.if_exists, merge_keys=merge_keys, spec=spec
+        )
+
+        with self._lock:
+            self.jobs += 1
+            self.rows_loaded += table.num_rows
+        return size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Do not load partial data if the run failed
+        if exc_type is None:
+            self.flush()
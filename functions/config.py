@@ -0,0 +1,192 @@
+"""Configuration of a pipeline run, read from a TOML or YAML file"""
+
+import copy
+import os
+from functions.logger import get_logger
+
+logger = get_logger("config")
+
+# Used for every setting missing from the configuration file
+DEFAULT_CONFIG = {
+    # Addresses used for finding the earthquakes
+    "locations": {
+        "pleo_dk": "Sortedam Dossering 7 - 4th floor  2200 Copenhagen N",
+        "pleo_uk": "Techspace Shoreditch South, Pleo, 32-38 Scrutton street, Buzzer 20, 1st floor, rear unit, EC2A 4RQ",
+        "pleo_de": "Karl-Marx-Allee 3, 10178 Berlin",
+        "pleo_es": "Calle Gran Via, 39 6th floor 28013 Madrid",
+        "pleo_pt": "DP11, Rua Duque de Palmela, 11 1250-096 Lisbon",
+        "pleo_ca": "4 Place Ville Marie, 2e+3e étage",
+        "pleo_se": "Kungsgatan 49, 111 22 Stockholm, Sweden",
+    },
+    "extraction": {
+        "usgs_url": "https://earthquake.usgs.gov",
+        "file_format": "csv",  # Options are "csv", "text" and "geojson"
+        "start_time": "2020-01-01",  # Date format in ISO8601 (YYYY-MM-DD)
+        "end_time": None,  # None is today
+        "maxradiuskm": 500,
+        "limit": 20000,
+        "max_rows_per_window": 2000,
+        "stream_chunk_rows": 5000,  # Larger CSV windows are parsed while they download
+        "max_overfetch": 0.0,  # None sends one radius query per office
+        "incremental": True,
+        "skip_unchanged": True,  # Skip regions whose count is the same as at their last load
+    },
+    "concurrency": {
+        "max_workers": 4,
+        "pipeline_queue_size": 2,
+        "requests_per_second": 2,
+        "max_requests_per_host": 4,
+        "usgs_timeout": [5, 60],
+        "usgs_max_retries": 4,
+        "transform_processes": 0,  # Backfill mode: shards transformed in processes
+    },
+    "state": {
+        "state_path": "./state/watermarks.json",
+        "geocode_cache_path": "./state/geocode_cache.json",
+        "geocode_cache_ttl_days": 30,
+        "request_cache_path": "./state/request_cache.json",  # None keeps it in memory
+        "request_cache_ttl_minutes": 10,
+        "raw_cache_dir": "./state/raw",
+        "metrics_path": "./state/metrics.prom",  # None only logs the metrics
+    },
+    "sink": {
+        "type": "bigquery",  # Options are "bigquery", "duckdb" and "parquet"
+        "project_id": "project-earthquake-432716",
+        "dataset_raw": "raw_data",
+        "dataset_curated": "curated_data",
+        "load_mode": "merge",
+        "raw_merge_keys": ["id"],
+        "curated_merge_keys": ["id", "location"],
+        "load_batch_rows": 500_000,
+        "load_batch_bytes": 256 * 1024 * 1024,
+        "duckdb_path": "./state/earthquakes.duckdb",
+        "parquet_dir": "./state/parquet",
+    },
+}
+
+# Settings that can be turned off. TOML has no null, so an empty string or false is None
+NULLABLE_SETTINGS = {
+    ("extraction", "end_time"),
+    ("extraction", "max_overfetch"),
+    ("state", "request_cache_path"),
+    ("state", "metrics_path"),
+    ("sink", "dataset_raw"),
+}
+
+SINK_TYPES = ("bigquery", "duckdb", "parquet")
+
+
+def read_config_file(path):
+    """
+    Reads a configuration file, as TOML or as YAML depending on its extension.
+
+    Args:
+        path (str): The path of a `.toml`, `.yaml` or `.yml` file.
+
+    Returns:
+        dict: The content of the file.
+
+    Raises:
+        ValueError: If the extension is not supported, or YAML is read without PyYAML installed.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".toml":
+        import tomllib
+
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+
+    if extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as ex:
+            raise ValueError(
+                f"Reading {path} requires PyYAML: pip install pyyaml"
+            ) from ex
+
+        with open(path) as file:
+            return yaml.safe_load(file) or {}
+
+    raise ValueError(f"Unsupported configuration file: {path}")
+
+
+def load_config(path=None, overrides=None):
+    """
+    Builds the configuration of a run from the defaults, a file and overrides.
+
+    The locations of the file replace the default locations. Every other setting of
+    the file or the overrides replaces the default of the same section and name.
+
+    Args:
+        path (str, optional): The path of a TOML or YAML configuration file. Default is
+        only the defaults.
+        overrides (dict, optional): Settings by section, applied after the file.
+
+    Returns:
+        dict: The configuration, by section.
+
+    Raises:
+        ValueError: If a section or a setting is unknown, or a value is invalid.
+    """
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    for source in (read_config_file(path) if path else {}, overrides or {}):
+        for section, settings in source.items():
+            if section not in config:
+                raise ValueError(f"Unknown configuration section: {section}")
+            if section == "locations":
+                config["locations"] = dict(settings)
+                continue
+            for name, value in settings.items():
+                if name not in config[section]:
+                    raise ValueError(f"Unknown setting in {section}: {name}")
+                # Compared by identity, since 0 and 0.0 are equal to False
+                if (section, name) in NULLABLE_SETTINGS and (
+                    (isinstance(value, str) and value == "") or value is False
+                ):
+                    value = None
+                config[section][name] = value
+
+    if not config["locations"]:
+        raise ValueError("No locations configured.")
+    if config["sink"]["type"] not in SINK_TYPES:
+        raise ValueError(
+            f"Unsupported sink: {config['sink']['type']}. Options are {', '.join(SINK_TYPES)}."
+        )
+    # The text format has no `updated` time, so the watermarks could never move
+    if (
+        config["extraction"]["incremental"]
+        and config["extraction"]["file_format"] == "text"
+    ):
+        raise ValueError(
+            'file_format = "text" has no updated time: set incremental = false to use it.'
+        )
+    logger.debug(f"Configuration loaded from {path or 'the defaults'}.")
+    return config
+
+
+def select_locations(config, location_names):
+    """
+    Returns a copy of the configuration limited to some of its locations.
+
+    Args:
+        config (dict): The configuration returned by `load_config`.
+        location_names (list): The names of the locations to keep.
+
+    Returns:
+        dict: The configuration with only these locations.
+
+    Raises:
+        ValueError: If a name is not a configured location.
+    """
+    unknown = [name for name in location_names if name not in config["locations"]]
+    if unknown:
+        raise ValueError(
+            f"Unknown locations: {', '.join(unknown)}. Options are {', '.join(config['locations'])}."
+        )
+    config = copy.deepcopy(config)
+    config["locations"] = {
+        name: address
+        for name, address in config["locations"].items()
+        if name in location_names
+    }
+    return config
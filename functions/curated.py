@@ -0,0 +1,176 @@
+import datetime
+import numpy as np
+import pandas as pd
+from functions.logger import get_logger
+from functions.metrics import stage
+from functions.transformation import compute_hashed_id
+
+logger = get_logger("curated")
+
+# Columns of the curated dataset, in order
+CURATED_COLUMNS = [
+    "hashed_id",
+    "id",
+    "time",
+    "mag",
+    "latitude",
+    "longitude",
+    "place",
+    "location",
+    "inserted_at",
+]
+
+# Raw columns with a handful of distinct values, kept as categoricals
+CATEGORICAL_COLUMNS = ["magType", "net", "status"]
+
+# Float columns stored as float32 when all their values have at most this many decimals.
+# float32 keeps about 7 significant digits, so rounding back to these decimals restores
+# the exact float64 value up to a magnitude of 1000
+DOWNCAST_DECIMALS = {"mag": 3, "latitude": 4, "longitude": 4}
+
+
+def compact_raw(df):
+    """
+    Stores the low-cardinality string columns of raw data as categoricals.
+
+    The values, and so the `hashed_id` computed from them, do not change.
+
+    Args:
+        df (pd.DataFrame): The raw data, with the USGS schema.
+
+    Returns:
+        pd.DataFrame: A shallow copy of the data with categorical columns.
+    """
+    df = df.copy(deep=False)
+    for column in CATEGORICAL_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def downcast_float(values, decimals):
+    """
+    Converts a float64 Series to float32 if rounding back to `decimals` restores every value.
+
+    Args:
+        values (pd.Series): The float64 values.
+        decimals (int): The maximum number of decimals of the values.
+
+    Returns:
+        pd.Series: The values as float32, or unchanged if a value would not be restored.
+    """
+    array = values.to_numpy(dtype="float64", na_value=np.nan)
+    narrowed = array.astype("float32")
+    restored = np.round(narrowed.astype("float64"), decimals)
+    if np.array_equal(restored, array, equal_nan=True):
+        return pd.Series(narrowed, index=values.index, name=values.name)
+    return values
+
+
+class CuratedBatch:
+    """
+    The curated events of one location, stored compactly until they are loaded.
+
+    Only the curated columns are kept. `time` is a UTC datetime, `location` a categorical,
+    `id` and `place` Arrow strings, and `mag`, `latitude` and `longitude` are float32 where
+    DOWNCAST_DECIMALS allows it. `inserted_at` is the same for every event, so it is
+    stored once and only added to the rows by `to_frame`.
+
+    Args:
+        df (pd.DataFrame): The compact curated columns, without `inserted_at`.
+        inserted_at (datetime): When the events were transformed.
+    """
+
+    def __init__(self, df, inserted_at):
+        self.df = df
+        self.inserted_at = inserted_at
+
+    @classmethod
+    def from_raw(cls, location_name, df, inserted_at=None):
+        """
+        Builds the curated batch of a location from its raw data.
+
+        The hash is computed on the raw columns and the location, as by
+        `minor_transform_dataframe`, and the other raw columns are then dropped.
+
+        Args:
+            location_name (str): The name of the location.
+            df (pd.DataFrame): The raw data of the location. It is not modified.
+            inserted_at (datetime, optional): The insertion time. Default is now.
+
+        Returns:
+            CuratedBatch: The curated events, without duplicated 'id'.
+        """
+        logger.info(f"Transforming data for location: {location_name}")
+
+        with stage("transform", location=location_name) as record:
+            hashed = df.copy(deep=False)
+            hashed["location"] = location_name
+            with stage("hash", location=location_name) as hash_record:
+                hashed_ids = compute_hashed_id(hashed)
+                hash_record["rows"] = len(df)
+
+            # Project to the curated columns before deduplicating, so raw columns are not copied
+            keep = ~df["id"].duplicated().to_numpy()
+            curated = pd.DataFrame(
+                {
+                    "hashed_id": hashed_ids.to_numpy()[keep],
+                    "id": pd.Series(df["id"].to_numpy()[keep], dtype="string[pyarrow]"),
+                    "time": pd.to_datetime(
+                        df["time"].to_numpy()[keep], utc=True, format="ISO8601"
+                    ),
+                },
+            )
+            for column, decimals in DOWNCAST_DECIMALS.items():
+                curated[column] = downcast_float(
+                    pd.Series(df[column].to_numpy("float64", na_value=np.nan)[keep]),
+                    decimals,
+                )
+            curated["place"] = pd.Series(
+                df["place"].to_numpy()[keep], dtype="string[pyarrow]"
+            )
+            curated["location"] = pd.Categorical.from_codes(
+                np.zeros(len(curated), dtype="int8"), categories=[location_name]
+            )
+            record["rows"] = len(curated)
+
+        return cls(curated, inserted_at or datetime.datetime.now())
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def nbytes(self):
+        """int: The memory used by the events."""
+        return int(self.df.memory_usage(deep=True, index=False).sum())
+
+    def filter(self, mask):
+        """
+        Returns the events selected by a boolean mask, as a new batch.
+
+        Args:
+            mask (array-like): True for every event to keep.
+
+        Returns:
+            CuratedBatch: The selected events, with the same insertion time.
+        """
+        return CuratedBatch(
+            self.df[np.asarray(mask)].reset_index(drop=True), self.inserted_at
+        )
+
+    def to_frame(self):
+        """
+        Returns the events with plain float64 and string columns, ready to be loaded.
+
+        Returns:
+            pd.DataFrame: The curated columns, in the order of CURATED_COLUMNS.
+        """
+        df = self.df.copy(deep=False)
+        for column, decimals in DOWNCAST_DECIMALS.items():
+            if df[column].dtype == "float32":
+                df[column] = np.round(df[column].astype("float64"), decimals)
+        df["id"] = df["id"].astype(object)
+        df["place"] = df["place"].astype(object).where(df["place"].notna(), None)
+        df["location"] = df["location"].astype(object)
+        df["inserted_at"] = self.inserted_at
+        return df[CURATED_COLUMNS]
@@ -1,21 +1,32 @@
 import requests
-import pandas as pd
-import time
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
 from functions.logger import get_logger
+from functions.metrics import stage, timed
+from functions.usgs_client import get_usgs_client
 from geopy.geocoders import ArcGIS
-from functions.transformation import validate_and_transform_schema_from_csv
+from functions.formats import decode_response
+from functions.transformation import read_and_validate_csv_chunks
 
 logger = get_logger("extraction")
 
 
-def extract_data_return_df(url, location_name):
+def extract_data_return_df(
+    url,
+    location_name,
+    rate_limiter=None,
+    host_limiter=None,
+    file_format="csv",
+):
     """
     Extracts data from a given URL and returns it as a pandas DataFrame.
 
     Args:
         url (str): The URL from which to extract data.
         location_name (str): The name of the location for logging purposes.
+        rate_limiter (TokenBucket, optional): Global rate limit shared between requests.
+        host_limiter (HostConcurrencyLimiter, optional): Per-host cap on concurrent requests.
+        file_format (str, optional): The `format` requested in the URL. Options are
+        'csv', 'text', 'geojson'. Default is 'csv'.
 
     Returns:
         pandas.DataFrame: The extracted data as a DataFrame.
@@ -24,21 +35,25 @@ def extract_data_return_df(url, location_name):
         requests.HTTPError: If an HTTP error occurs.
         requests.Timeout: If the request times out.
         requests.RequestException: If a general request exception occurs.
+        ValueError: If the data does not match the expected schema.
 
     Logs:
         Logs the start of data extraction, any HTTP errors, timeouts, or other request exceptions.
     """
     try:
         logger.info(f"Extracting data for location: {location_name}")
-        response = requests.get(url)
-        response.raise_for_status()  # Check for HTTP errors
-
-        logger.debug("Sleeping for 1 second.")
-        time.sleep(1)  # Sleep for 1 second to avoid hitting rate limits
-
-        validate_and_transform_schema_from_csv(response.text)
-
-        return pd.read_csv(StringIO(response.text))
+        # Retries and timeouts are handled by the shared client
+        with stage("download", location=location_name) as record:
+            response = get_usgs_client().get(
+                url, rate_limiter=rate_limiter, host_limiter=host_limiter
+            )
+            record["bytes"] = len(response.content)
+
+        # Parse and validate the raw bytes once, without decoding a copy of the body
+        with stage("decode", location=location_name) as record:
+            df = decode_response(response.content, file_format)
+            record["rows"], record["bytes"] = len(df), len(response.content)
+        return df
 
     except requests.HTTPError as ex:
         logger.error(f"HTTP error occurred for location {location_name}: {ex}")
@@ -51,13 +66,85 @@ def extract_data_return_df(url, location_name):
         raise
 
 
-def get_total_n_earthquakes(url, location_name):
+def download_to_file(url, location_name, path, rate_limiter=None, host_limiter=None):
+    """
+    Downloads a response to a file without decoding it, for a worker process to decode.
+
+    Args:
+        url (str): The URL from which to extract data.
+        location_name (str): The name of the location for logging purposes.
+        path (str): The file the body of the response is written to.
+        rate_limiter (TokenBucket, optional): Global rate limit shared between requests.
+        host_limiter (HostConcurrencyLimiter, optional): Per-host cap on concurrent requests.
+
+    Returns:
+        int: The number of bytes written.
+
+    Raises:
+        requests.RequestException: If the request fails after its retries.
+    """
+    logger.info(f"Downloading data for location: {location_name}")
+    with stage("download", location=location_name) as record:
+        response = get_usgs_client().get(
+            url, rate_limiter=rate_limiter, host_limiter=host_limiter
+        )
+        with open(path, "wb") as file:
+            file.write(response.content)
+        record["bytes"] = len(response.content)
+    return len(response.content)
+
+
+def extract_data_chunks(
+    url, location_name, chunksize=50_000, rate_limiter=None, host_limiter=None
+):
+    """
+    Streams data from a given URL and yields it as validated pandas DataFrame chunks.
+
+    The response is read from the socket as it is parsed, so memory stays bounded by
+    the chunk size rather than the size of the response.
+
+    Args:
+        url (str): The URL from which to extract data.
+        location_name (str): The name of the location for logging purposes.
+        chunksize (int, optional): The number of rows per chunk. Default is 50000.
+        rate_limiter (TokenBucket, optional): Global rate limit shared between requests.
+        host_limiter (HostConcurrencyLimiter, optional): Per-host cap on concurrent requests.
+
+    Yields:
+        pandas.DataFrame: The extracted data, one chunk at a time.
+
+    Raises:
+        requests.RequestException: If the request fails or the stream is interrupted.
+        ValueError: If the data does not match the expected schema.
+    """
+    logger.info(f"Streaming data for location: {location_name}")
+    response = get_usgs_client().get(
+        url, rate_limiter=rate_limiter, host_limiter=host_limiter, stream=True
+    )
+    try:
+        response.raw.decode_content = True  # Decompress gzip while streaming
+        rows = 0
+        for chunk in read_and_validate_csv_chunks(response.raw, chunksize):
+            rows += len(chunk)
+            yield chunk
+        logger.debug(f"Streamed {rows} rows for location: {location_name}")
+    finally:
+        response.close()
+
+
+def get_total_n_earthquakes(
+    url, location_name, rate_limiter=None, host_limiter=None, cache=None
+):
     """
     Gets the total number of earthquakes for a given location.
 
     Args:
         url (str): The URL to fetch the data from.
         location_name (str): The name of the location.
+        rate_limiter (TokenBucket, optional): Global rate limit shared between requests.
+        host_limiter (HostConcurrencyLimiter, optional): Per-host cap on concurrent requests.
+        cache (RequestCache, optional): Cache answering repeated counts. Default is to
+        always request the count.
 
     Returns:
         dict: A dictionary with the location name as the key and the total number of earthquakes as the value.
@@ -65,14 +152,22 @@ def get_total_n_earthquakes(url, location_name):
     logger.info(
         f"Getting the total number of earthquakes for location: {location_name}"
     )
-    response = requests.get(url)
-    response.raise_for_status()
-    total_earthquakes = int(response.text.strip())
+    with stage("count", location=location_name) as record:
+        if cache is not None:
+            body = cache.get(url, rate_limiter=rate_limiter, host_limiter=host_limiter)
+        else:
+            response = get_usgs_client().get(
+                url, rate_limiter=rate_limiter, host_limiter=host_limiter
+            )
+            body = response.text
+        total_earthquakes = int(body.strip())
+        record["rows"] = total_earthquakes
     logger.info(f"{total_earthquakes} rows to be extracted from {location_name}.")
     return {location_name: total_earthquakes}
 
 
-def get_coordinates(locations):
+@timed("geocode")
+def get_coordinates(locations, cache=None, max_workers=1):
     """
     Get the geographical coordinates of the given locations.
     This function takes a dictionary of location names and their addresses,
@@ -82,18 +177,49 @@ def get_coordinates(locations):
     Args:
         locations (dict): A dictionary where keys are location names and
         values are addresses.
+        cache (GeocodeCache, optional): Cache of previously geocoded addresses.
+        Only the addresses missing from it are sent to the geocoder.
+        max_workers (int, optional): The maximum number of addresses geocoded at once. Default is 1.
 
     Returns:
         dict: A dictionary where keys are location names and values are
         lists containing latitude and longitude.
     """
     logger.info("Getting the geographical coordinates of the locations.")
-    nom = ArcGIS()  # Create an instance of the ArcGIS geocoder
     dic_addresses = {}
+    missing_locations = {}
 
     for location_name, address in locations.items():
-        coordinates = nom.geocode(address)
+        coordinates = cache.get(address) if cache is not None else None
         if coordinates:
-            dic_addresses[location_name] = [coordinates.latitude, coordinates.longitude]
-
-    return dic_addresses
+            dic_addresses[location_name] = coordinates
+        else:
+            missing_locations[location_name] = address
+
+    if missing_locations:
+        nom = ArcGIS()  # Create an instance of the ArcGIS geocoder
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(nom.geocode, missing_locations.values())
+
+            for location_name, coordinates in zip(missing_locations, results):
+                if coordinates:
+                    dic_addresses[location_name] = [
+                        coordinates.latitude,
+                        coordinates.longitude,
+                    ]
+                    if cache is not None:
+                        cache.set(
+                            missing_locations[location_name],
+                            dic_addresses[location_name],
+                        )
+
+    if cache is not None:
+        logger.info(f"Geocode cache: {cache.hits} hits, {cache.misses} misses.")
+        cache.save()
+
+    # Keep the order of the locations as given
+    return {
+        location_name: dic_addresses[location_name]
+        for location_name in locations
+        if location_name in dic_addresses
+    }
@@ -0,0 +1,133 @@
+"""Local stand-in for the BigQuery client, used to run the loaders offline"""
+
+import sqlite3
+import threading
+import time
+import pandas as pd
+from functions.logger import get_logger
+
+logger = get_logger("fake-bigquery")
+
+# SQLite types of the BigQuery types. Timestamps are kept as ISO text, as pandas writes them
+SQLITE_TYPES = {
+    "STRING": "TEXT",
+    "INT64": "INTEGER",
+    "FLOAT64": "REAL",
+    "TIMESTAMP": "TEXT",
+}
+
+
+class FakeJob:
+    """Completed load or query job returned by FakeBigQueryClient."""
+
+    def __init__(self, table_id=None, rows=0):
+        self.table_id = table_id
+        self.output_rows = rows
+
+    def result(self):
+        return self
+
+
+class FakeBigQueryClient:
+    """
+    Keeps loaded tables in a SQLite database and records every load job and query.
+
+    Table IDs such as "project.dataset.table" are used as SQLite table names, and
+    queries are run on SQLite as they are, so they must stick to SQL both engines accept.
+
+    Args:
+        job_latency (float, optional): Seconds every load job takes, to mimic the
+        startup latency of real jobs. Default is 0.
+        database (str, optional): The SQLite database. Default is in memory.
+
+    Attributes:
+        jobs (list): The (table ID, number of rows, source format) of every load job.
+        queries (list): The SQL of every query.
+        ddl (list): The BigQuery DDL of every table created by `create_table`.
+    """
+
+    def __init__(self, job_latency=0.0, database=":memory:"):
+        self.job_latency = job_latency
+        self.jobs = []
+        self.queries = []
+        self.ddl = []
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    @property
+    def tables(self):
+        """dict: The content of every table, as a DataFrame, keyed by table ID."""
+        with self._lock:
+            names = [
+                row[0]
+                for row in self._connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            ]
+            return {
+                name: pd.read_sql(f'SELECT * FROM "{name}"', self._connection)
+                for name in names
+            }
+
+    def _load(self, df, table_id, job_config, source_format):
+        time.sleep(self.job_latency)
+        write_disposition = getattr(job_config, "write_disposition", None)
+        if_exists = "replace" if write_disposition == "WRITE_TRUNCATE" else "append"
+
+        with self._lock:
+            df.to_sql(table_id, self._connection, if_exists=if_exists, index=False)
+            self.jobs.append((table_id, len(df), source_format))
+
+        logger.debug(f"Loaded {len(df)} rows into {table_id}.")
+        return FakeJob(table_id, len(df))
+
+    def load_table_from_dataframe(
+        self, dataframe, destination, job_config=None, **kwargs
+    ):
+        return self._load(dataframe, destination, job_config, "DATAFRAME")
+
+    def load_table_from_file(self, file_obj, destination, job_config=None, **kwargs):
+        return self._load(
+            pd.read_parquet(file_obj), destination, job_config, job_config.source_format
+        )
+
+    def create_table(self, table, exists_ok=False, **kwargs):
+        table_id = f"{table.project}.{table.dataset_id}.{table.table_id}"
+        columns = ", ".join(
+            f"`{field.name}` {field.field_type}" for field in table.schema
+        )
+        ddl = f"CREATE TABLE `{table_id}` ({columns})"
+        if table.time_partitioning is not None:
+            ddl += f"\nPARTITION BY TIMESTAMP_TRUNC(`{table.time_partitioning.field}`, {table.time_partitioning.type_})"
+        if table.clustering_fields:
+            ddl += f"\nCLUSTER BY {', '.join(table.clustering_fields)}"
+
+        with self._lock:
+            exists = self._connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (table_id,),
+            ).fetchone()
+            if exists:
+                if not exists_ok:
+                    raise ValueError(f"Already exists: {table_id}")
+                return table
+
+            sqlite_columns = ", ".join(
+                f'"{field.name}" {SQLITE_TYPES.get(field.field_type, "TEXT")}'
+                for field in table.schema
+            )
+            self._connection.execute(f'CREATE TABLE "{table_id}" ({sqlite_columns})')
+            self.ddl.append(ddl)
+
+        logger.debug(f"Created {table_id}.")
+        return table
+
+    def query(self, query, **kwargs):
+        with self._lock:
+            self._connection.executescript(query)
+            self.queries.append(query)
+        return FakeJob()
+
+    def delete_table(self, table, not_found_ok=False, **kwargs):
+        with self._lock:
+            self._connection.execute(f'DROP TABLE IF EXISTS "{table}"')
@@ -0,0 +1,186 @@
+from io import BytesIO
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pa_json
+from functions.logger import get_logger
+from functions.transformation import (
+    USGS_SCHEMA,
+    read_and_validate_csv,
+    validate_dataframe_schema,
+)
+
+logger = get_logger("formats")
+
+# Columns of the pipe-delimited `format=text` response, mapped to the CSV schema
+TEXT_COLUMNS = {
+    "#EventID": "id",
+    "Time": "time",
+    "Latitude": "latitude",
+    "Longitude": "longitude",
+    "Depth/km": "depth",
+    "Author": "locationSource",
+    "Catalog": "net",
+    "Contributor": None,
+    "ContributorID": None,
+    "MagType": "magType",
+    "Magnitude": "mag",
+    "MagAuthor": "magSource",
+    "EventLocationName": "place",
+    "EventType": "type",
+}
+
+# Properties of the `format=geojson` features kept in the CSV schema, with their Arrow
+# types. Times are epoch milliseconds in this format
+GEOJSON_PROPERTIES = {
+    "mag": pa.float64(),
+    "place": pa.string(),
+    "time": pa.int64(),
+    "updated": pa.int64(),
+    "status": pa.string(),
+    "net": pa.string(),
+    "nst": pa.float64(),
+    "dmin": pa.float64(),
+    "rms": pa.float64(),
+    "gap": pa.float64(),
+    "magType": pa.string(),
+    "type": pa.string(),
+}
+
+# Arrow schema of a `format=geojson` body, read as one row holding the list of features
+GEOJSON_FEATURE = pa.struct(
+    [
+        ("properties", pa.struct(list(GEOJSON_PROPERTIES.items()))),
+        ("geometry", pa.struct([("coordinates", pa.list_(pa.float64()))])),
+        ("id", pa.string()),
+    ]
+)
+GEOJSON_SCHEMA = pa.schema([("features", pa.list_(GEOJSON_FEATURE))])
+
+
+def decode_csv(content):
+    """Decodes a `format=csv` response. See `read_and_validate_csv`."""
+    return read_and_validate_csv(content)
+
+
+def decode_text(content):
+    """
+    Decodes a `format=text` response, the pipe-delimited FDSN text format.
+
+    Args:
+        content (bytes): The body of the response.
+
+    Returns:
+        pd.DataFrame: The events, with the columns of the USGS CSV schema.
+    """
+    dtypes = {
+        column: "float64" if USGS_SCHEMA[name] != "string" else str
+        for column, name in TEXT_COLUMNS.items()
+        if name is not None
+    }
+    df = pd.read_csv(
+        BytesIO(content),
+        sep="|",
+        dtype=dtypes,
+        usecols=list(dtypes),
+    ).rename(columns=TEXT_COLUMNS)
+
+    # Times have no time zone designator in this format, though they are in UTC
+    df["time"] = df["time"] + "Z"
+    return _conform_to_schema(df)
+
+
+def decode_geojson(content):
+    """
+    Decodes a `format=geojson` response into typed columns.
+
+    The body is parsed by `pyarrow.json` straight into Arrow columns of GEOJSON_SCHEMA,
+    one column per property, without a Python dict per feature.
+
+    Args:
+        content (bytes): The body of the response.
+
+    Returns:
+        pd.DataFrame: The events, with the columns of the USGS CSV schema.
+    """
+    # The whole FeatureCollection is one JSON object, so one row read in a single block
+    body = pa_json.read_json(
+        BytesIO(content),
+        read_options=pa_json.ReadOptions(block_size=len(content) + 1),
+        parse_options=pa_json.ParseOptions(
+            explicit_schema=GEOJSON_SCHEMA,
+            unexpected_field_behavior="ignore",
+            newlines_in_values=True,
+        ),
+    )
+    features = body.column("features").combine_chunks().flatten()
+    properties = features.field("properties")
+    coordinates = (
+        features.field("geometry")
+        .field("coordinates")
+        .flatten()
+        .to_numpy(zero_copy_only=False)
+        .reshape(-1, 3)
+    )
+
+    columns = {
+        name: properties.field(name).to_numpy(zero_copy_only=False)
+        for name in GEOJSON_PROPERTIES
+    }
+    columns["id"] = features.field("id").to_numpy(zero_copy_only=False)
+    columns["longitude"] = coordinates[:, 0]
+    columns["latitude"] = coordinates[:, 1]
+    columns["depth"] = coordinates[:, 2]
+
+    for name in ("time", "updated"):
+        times = pd.to_datetime(np.array(columns[name], dtype="float64"), unit="ms")
+        columns[name] = times.strftime("%Y-%m-%dT%H:%M:%S.%f").str[:-3] + "Z"
+
+    df = pd.DataFrame(columns)
+    for column, expected_dtype in USGS_SCHEMA.items():
+        if column in df.columns and expected_dtype != "string":
+            df[column] = df[column].astype("float64")
+    return _conform_to_schema(df)
+
+
+def _conform_to_schema(df):
+    # Columns the format does not provide are left empty, with the dtype of their type
+    missing_columns = [column for column in USGS_SCHEMA if column not in df.columns]
+    df = df.reindex(columns=list(USGS_SCHEMA))
+    for column in missing_columns:
+        if USGS_SCHEMA[column] == "string":
+            df[column] = df[column].astype(object)
+
+    validate_dataframe_schema(df)
+    return df
+
+
+# Decoders of the formats supported by the `format` parameter of the USGS API. The text
+# format has no `updated` time, so `load_config` rejects it for incremental runs
+DECODERS = {
+    "csv": decode_csv,
+    "text": decode_text,
+    "geojson": decode_geojson,
+}
+
+
+def decode_response(content, file_format="csv"):
+    """
+    Decodes the body of a USGS response into a DataFrame with the USGS CSV schema.
+
+    Args:
+        content (bytes): The body of the response.
+        file_format (str, optional): The `format` requested from USGS. Options are
+        'csv', 'text', 'geojson'. Default is 'csv'.
+
+    Returns:
+        pd.DataFrame: The decoded events.
+
+    Raises:
+        ValueError: If the format is not supported or the data fails validation.
+    """
+    if file_format not in DECODERS:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+    logger.debug(f"Decoding {len(content)} bytes of {file_format}.")
+    return DECODERS[file_format](content)
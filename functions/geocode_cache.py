@@ -0,0 +1,100 @@
+import json
+import os
+import re
+import threading
+import time
+from functions.logger import get_logger
+
+logger = get_logger("geocode-cache")
+
+# Bump to invalidate every cached coordinate, e.g. when changing the geocoder
+GEOCODER_VERSION = "arcgis-1"
+
+
+def normalize_address(address):
+    """
+    Normalizes an address so that trivial differences do not cause a cache miss.
+
+    Args:
+        address (str): The address as written in the locations.
+
+    Returns:
+        str: The address in lower case, with whitespace collapsed.
+    """
+    return re.sub(r"\s+", " ", address).strip().lower()
+
+
+class GeocodeCache:
+    """
+    On-disk cache of geocoded addresses, kept in a JSON file.
+
+    Args:
+        path (str): The path of the JSON file. It is created on the first save.
+        ttl (timedelta, optional): How long coordinates stay valid. Default is no expiry.
+        version (str, optional): Entries saved with another version are discarded.
+        Default is GEOCODER_VERSION.
+
+    Attributes:
+        hits (int): The number of lookups answered by the cache.
+        misses (int): The number of lookups not found in the cache, or expired.
+    """
+
+    def __init__(self, path, ttl=None, version=GEOCODER_VERSION):
+        self.path = path
+        self.ttl = ttl
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as file:
+            content = json.load(file)
+        if content.get("version") != self.version:
+            logger.info(
+                f"Geocode cache version changed to {self.version}, discarding entries."
+            )
+            return {}
+        return content["entries"]
+
+    def get(self, address):
+        """Returns the cached [latitude, longitude] of an address, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(normalize_address(address))
+            expired = (
+                entry is not None
+                and self.ttl is not None
+                and time.time() - entry["cached_at"] > self.ttl.total_seconds()
+            )
+            if entry is None or expired:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["coordinates"]
+
+    def set(self, address, coordinates):
+        """Caches the [latitude, longitude] of an address."""
+        with self._lock:
+            self._entries[normalize_address(address)] = {
+                "coordinates": coordinates,
+                "cached_at": time.time(),
+            }
+
+    def save(self):
+        """Writes the cache to disk atomically."""
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(
+                    {"version": self.version, "entries": self._entries},
+                    file,
+                    indent=2,
+                    sort_keys=True,
+                )
+            os.replace(temporary_path, self.path)
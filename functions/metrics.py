@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from functions.logger import get_logger
+
+logger = get_logger("metrics")
+
+# Prefix of the metrics written in the Prometheus text format
+METRIC_PREFIX = "earthquake_stage"
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+class StageMetrics:
+    """
+    Collects the wall time, CPU time, rows and bytes of every pipeline stage.
+
+    Stages are timed with `StageMetrics.stage`, or the `stage` and `timed` helpers of
+    this module, and aggregated by stage name and labels, e.g. the location. Every
+    completed stage is logged as JSON at the DEBUG level, and the totals can be logged
+    or written to a file at the end of the run.
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """
+        Times the enclosed block as one run of a stage.
+
+        Args:
+            name (str): The name of the stage, e.g. "download".
+            **labels: Labels of the run, e.g. `location="pleo_dk"`.
+
+        Yields:
+            dict: A record where the block can set the `rows` and `bytes` it processed.
+        """
+        record = {"rows": 0, "bytes": 0}
+        wall_start = time.perf_counter()
+        # CPU time of the current thread, as stages run on thread pools
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall_start
+            record["cpu_seconds"] = time.thread_time() - cpu_start
+            self._add(name, labels, record)
+
+    def _add(self, name, labels, record):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            totals = self._totals.setdefault(
+                key,
+                {
+                    "count": 0,
+                    "wall_seconds": 0.0,
+                    "cpu_seconds": 0.0,
+                    "rows": 0,
+                    "bytes": 0,
+                },
+            )
+            totals["count"] += 1
+            for field in ("wall_seconds", "cpu_seconds", "rows", "bytes"):
+                totals[field] += record[field]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({"stage": name, **labels, **record}))
+
+    def summary(self):
+        """
+        Returns the totals of every stage and set of labels.
+
+        Returns:
+            list: One dictionary per stage and labels, with the `count` of runs and the
+            total `wall_seconds`, `cpu_seconds`, `rows` and `bytes`.
+        """
+        with self._lock:
+            return [
+                {"stage": name, **dict(labels), **totals}
+                for (name, labels), totals in sorted(self._totals.items())
+            ]
+
+    def log_summary(self):
+        """Logs the totals of every stage as one JSON line each."""
+        for totals in self.summary():
+            logger.info(json.dumps(totals))
+
+    def write(self, path):
+        """
+        Writes the totals to a file, in the Prometheus text format if the path ends with
+        '.prom', in JSON otherwise.
+
+        Args:
+            path (str): The path of the file. Its directory is created if needed.
+        """
+        summary = self.summary()
+        if path.endswith(".prom"):
+            content = _to_prometheus(summary)
+        else:
+            content = json.dumps(summary, indent=2)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+        logger.info(f"Metrics written to {path}.")
+
+
+def _to_prometheus(summary):
+    fields = {
+        "count": ("runs_total", "Number of runs of the stage."),
+        "wall_seconds": ("wall_seconds_total", "Wall time spent in the stage."),
+        "cpu_seconds": ("cpu_seconds_total", "CPU time spent in the stage."),
+        "rows": ("rows_total", "Rows processed by the stage."),
+        "bytes": ("bytes_total", "Bytes processed by the stage."),
+    }
+    lines = []
+    for field, (suffix, description) in fields.items():
+        metric = f"{METRIC_PREFIX}_{suffix}"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} counter")
+        for totals in summary:
+            labels = ",".join(
+                f'{key}="{_escape(value)}"'
+                for key, value in totals.items()
+                if key not in fields
+            )
+            lines.append(f"{metric}{{{labels}}} {totals[field]}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def stage(name, **labels):
+    """Times a block as a run of a stage in the shared metrics. See `StageMetrics.stage`."""
+    return get_metrics().stage(name, **labels)
+
+
+def timed(name, **labels):
+    """
+    Decorator timing every call of a function as a run of a stage in the shared metrics.
+
+    The `location_name` argument of the function, if passed by keyword, is used as the
+    location label. Rows are counted from results with a length, e.g. DataFrames.
+
+    Args:
+        name (str): The name of the stage.
+        **labels: Labels of every run.
+
+    Returns:
+        callable: The decorator.
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            call_labels = dict(labels)
+            if "location_name" in kwargs:
+                call_labels["location"] = kwargs["location_name"]
+            with stage(name, **call_labels) as record:
+                result = function(*args, **kwargs)
+                if hasattr(result, "__len__") and not isinstance(result, str):
+                    record["rows"] = len(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def get_metrics():
+    """
+    Returns the metrics shared by the whole process, creating them on first use.
+
+    Returns:
+        StageMetrics: The shared metrics.
+    """
+    global _metrics
+
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = StageMetrics()
+        return _metrics
+
+
+def set_metrics(metrics):
+    """
+    Replaces the shared metrics, e.g. to collect the stages of a test on their own.
+
+    Args:
+        metrics (StageMetrics): The metrics returned by `get_metrics` from now on. Pass
+        None to create new metrics on the next call.
+    """
+    global _metrics
+
+    with _metrics_lock:
+        _metrics = metrics
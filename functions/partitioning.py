@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+from functions.logger import get_logger
+from functions.transformation import USGS_SCHEMA
+
+logger = get_logger("partitioning")
+
+# Format of the window boundaries sent to USGS (ISO8601)
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def plan_time_windows(
+    count_window, start_time, end_time, max_rows, min_window=timedelta(minutes=1)
+):
+    """
+    Splits a time range into windows that each hold at most `max_rows` earthquakes.
+
+    The range is bisected recursively, using `count_window` to check every half,
+    until all windows are under the row budget.
+
+    Args:
+        count_window (callable): Function taking the start and end of a window as
+        ISO8601 strings and returning the number of earthquakes in it.
+        start_time (str): The start of the range in ISO8601.
+        end_time (str): The end of the range in ISO8601.
+        max_rows (int): The maximum number of earthquakes per window.
+        min_window (timedelta, optional): Windows are not split below this duration,
+        even if they exceed `max_rows`. Default is one minute.
+
+    Returns:
+        list: The (start, end, count) of every window, in chronological order.
+    """
+    start = datetime.fromisoformat(start_time)
+    end = datetime.fromisoformat(end_time)
+    windows = []
+    pending = [(start, end, count_window(start_time, end_time))]
+
+    while pending:
+        window_start, window_end, count = pending.pop()
+
+        if count <= max_rows:
+            windows.append((window_start, window_end, count))
+            continue
+
+        if window_end - window_start <= min_window:
+            logger.warning(
+                f"Window {window_start} to {window_end} holds {count} earthquakes, "
+                f"above the budget of {max_rows}, but cannot be split further."
+            )
+            windows.append((window_start, window_end, count))
+            continue
+
+        middle = window_start + (window_end - window_start) / 2
+        middle = middle.replace(microsecond=0)
+        for half_start, half_end in ((middle, window_end), (window_start, middle)):
+            half_count = count_window(
+                half_start.strftime(TIME_FORMAT), half_end.strftime(TIME_FORMAT)
+            )
+            pending.append((half_start, half_end, half_count))
+
+    logger.info(
+        f"Planned {len(windows)} windows of at most {max_rows} earthquakes "
+        f"between {start_time} and {end_time}."
+    )
+    return [
+        (window_start.strftime(TIME_FORMAT), window_end.strftime(TIME_FORMAT), count)
+        for window_start, window_end, count in windows
+    ]
+
+
+def extract_time_windows(extract_window, windows, max_workers=4):
+    """
+    Extracts the planned windows in parallel and merges them into one DataFrame.
+
+    Windows without earthquakes are skipped, and earthquakes found in two adjacent
+    windows are deduplicated on their `id`.
+
+    Args:
+        extract_window (callable): Function taking the start and end of a window as
+        ISO8601 strings and returning its data as a DataFrame.
+        windows (list): The (start, end, count) of every window, as returned by `plan_time_windows`.
+        max_workers (int, optional): The maximum number of windows extracted at once. Default is 4.
+
+    Returns:
+        pd.DataFrame: The merged data of all windows.
+    """
+    windows = [(start, end) for start, end, count in windows if count > 0]
+    if not windows:
+        return pd.DataFrame(columns=list(USGS_SCHEMA))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(lambda window: extract_window(*window), windows))
+
+    return pd.concat(frames, ignore_index=True).drop_duplicates(
+        subset=["id"], ignore_index=True
+    )
@@ -0,0 +1,140 @@
+import queue
+import threading
+from functions.logger import get_logger
+
+logger = get_logger("pipeline")
+
+# Marks the end of the items sent to a stage
+_DONE = object()
+
+# Seconds between two checks of the stop flag while waiting on a queue
+_POLL_INTERVAL = 0.1
+
+
+class Stage:
+    """
+    One step of a pipeline, run by its own worker threads.
+
+    Args:
+        name (str): The name of the stage, for logging purposes.
+        function (callable): Function taking one item and returning the item sent to the
+        next stage. Items for which it returns None are not sent further.
+        workers (int, optional): The number of threads running the stage. Default is 1.
+        fan_out (bool, optional): The function returns an iterable of items instead, e.g.
+        a generator, and every item is sent to the next stage as soon as it is produced.
+        The iterable is then paused while the next queue is full. Default is False.
+    """
+
+    def __init__(self, name, function, workers=1, fan_out=False):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.fan_out = fan_out
+
+
+def run_stages(items, stages, queue_size=2):
+    """
+    Runs items through stages connected by bounded queues, every stage on its own threads.
+
+    While one item is transformed or loaded, the next ones are already extracted, so the
+    run takes about as long as its slowest stage rather than the sum of all stages. A
+    stage blocks when the queue to the next stage is full, which caps the number of
+    items held in memory at `queue_size` per queue plus one per worker. This holds for
+    the items of fan-out stages too, however many items their iterables produce.
+
+    Args:
+        items (iterable): The items sent to the first stage.
+        stages (list): The stages, in order.
+        queue_size (int, optional): The maximum number of items waiting between two stages. Default is 2.
+
+    Returns:
+        list: The results of the last stage, in order of completion.
+
+    Raises:
+        Exception: The first exception raised by a stage. The other stages are stopped.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    results = []
+    errors = []
+    stop = threading.Event()
+    lock = threading.Lock()
+    remaining = {index: stage.workers for index, stage in enumerate(stages)}
+
+    def put(target, item):
+        # Wait for room in the queue, unless another stage failed
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def finish(index):
+        with lock:
+            remaining[index] -= 1
+            last_worker = remaining[index] == 0
+        if not last_worker:
+            return
+        if index + 1 < len(stages):
+            for _ in range(stages[index + 1].workers):
+                put(queues[index + 1], _DONE)
+
+    def send(index, result):
+        # Sends a result to the next stage, or keeps it if the stage is the last one
+        if result is None:
+            return True
+        if index + 1 < len(stages):
+            return put(queues[index + 1], result)
+        with lock:
+            results.append(result)
+        return True
+
+    def work(index, stage):
+        while not stop.is_set():
+            try:
+                item = queues[index].get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            try:
+                result = stage.function(item)
+                # The items of a fan-out stage are produced while the next stage runs
+                for output in result if stage.fan_out else (result,):
+                    if not send(index, output):
+                        break
+            except Exception as ex:
+                logger.error(f"Stage {stage.name} failed: {ex}")
+                with lock:
+                    errors.append(ex)
+                stop.set()
+                break
+        finish(index)
+
+    threads = [
+        threading.Thread(
+            target=work, args=(index, stage), name=f"{stage.name}-{worker}", daemon=True
+        )
+        for index, stage in enumerate(stages)
+        for worker in range(stage.workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for item in items:
+            if not put(queues[0], item):
+                break
+        for _ in range(stages[0].workers):
+            put(queues[0], _DONE)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,89 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlsplit
+from functions.logger import get_logger
+
+logger = get_logger("rate-limit")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the global rate of requests.
+
+    Tokens are refilled continuously at `rate` per second, up to `capacity`.
+    Every request takes one token, blocking until one is available.
+
+    Args:
+        rate (float): The number of requests allowed per second.
+        capacity (int, optional): The maximum burst of requests. Default is 1.
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("The rate must be greater than 0.")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+
+            logger.debug(f"Rate limit reached, waiting {wait:.2f} seconds.")
+            time.sleep(wait)
+
+
+class HostConcurrencyLimiter:
+    """
+    Caps the number of requests in flight to the same host.
+
+    Args:
+        max_per_host (int): The maximum number of concurrent requests per host.
+    """
+
+    def __init__(self, max_per_host):
+        self.max_per_host = max_per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, url):
+        """Holds one of the slots of the host of `url` for the duration of the block."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(
+                host, threading.BoundedSemaphore(self.max_per_host)
+            )
+        with semaphore:
+            yield
+
+
+@contextmanager
+def throttle(url, rate_limiter=None, host_limiter=None):
+    """
+    Applies the optional host concurrency cap and global rate limit to a request.
+
+    Args:
+        url (str): The URL about to be requested.
+        rate_limiter (TokenBucket, optional): The global rate limit.
+        host_limiter (HostConcurrencyLimiter, optional): The per-host concurrency cap.
+    """
+    slot = host_limiter.limit(url) if host_limiter is not None else nullcontext()
+    with slot:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        yield
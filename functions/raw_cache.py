@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+import pyarrow.parquet as pq
+from functions.logger import get_logger
+from functions.metrics import stage
+from functions.transformation import minor_transform_dataframe
+
+logger = get_logger("raw-cache")
+
+
+class RawCache:
+    """
+    Local copy of every extracted response, kept as Parquet partitioned by location and date.
+
+    Files are written to `<root>/location=<name>/date=<YYYY-MM-DD>/`, and a manifest at
+    `<root>/manifest.json` lists every file with its location, date and number of rows.
+
+    Args:
+        root (str): The directory of the cache. It can be a mounted volume.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+
+    def manifest(self):
+        """Returns the entries of the manifest, oldest first."""
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path) as file:
+            return json.load(file)
+
+    def write(self, location_name, df, extracted_at=None):
+        """
+        Writes the data extracted for a location to a new Parquet file.
+
+        Args:
+            location_name (str): The name of the location.
+            df (pd.DataFrame): The raw data, as extracted.
+            extracted_at (datetime, optional): When the data was extracted. Default is now.
+
+        Returns:
+            str: The path of the file, relative to the root of the cache.
+        """
+        extracted_at = extracted_at or datetime.now(timezone.utc)
+        date = extracted_at.strftime("%Y-%m-%d")
+        path = os.path.join(
+            f"location={location_name}",
+            f"date={date}",
+            f"part-{extracted_at.strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet",
+        )
+        os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+        with stage("cache", location=location_name) as record:
+            df.to_parquet(os.path.join(self.root, path), index=False)
+            record["rows"] = len(df)
+            record["bytes"] = os.path.getsize(os.path.join(self.root, path))
+
+        with self._lock:
+            entries = self.manifest()
+            entries.append(
+                {
+                    "location": location_name,
+                    "date": date,
+                    "path": path,
+                    "rows": len(df),
+                    "extracted_at": extracted_at.isoformat(),
+                }
+            )
+            temporary_path = f"{self.manifest_path}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(entries, file, indent=2)
+            os.replace(temporary_path, self.manifest_path)
+
+        logger.debug(f"Cached {len(df)} raw rows of {location_name} in {path}.")
+        return path
+
+    def read(self, locations=None, start_date=None, end_date=None):
+        """
+        Reads the cached files through memory-mapped Arrow reads, in the order they were written.
+
+        Args:
+            locations (list, optional): Only read these locations. Default is all.
+            start_date (str, optional): Only read files extracted on or after this date (YYYY-MM-DD).
+            end_date (str, optional): Only read files extracted on or before this date (YYYY-MM-DD).
+
+        Yields:
+            tuple: The location name and its raw data as a DataFrame.
+        """
+        for entry in self.manifest():
+            if locations is not None and entry["location"] not in locations:
+                continue
+            if start_date is not None and entry["date"] < start_date:
+                continue
+            if end_date is not None and entry["date"] > end_date:
+                continue
+
+            table = pq.read_table(
+                os.path.join(self.root, entry["path"]), memory_map=True
+            )
+            yield entry["location"], table.to_pandas()
+
+
+def replay(
+    cache,
+    loader,
+    dataset_raw,
+    dataset_curated,
+    columns_to_keep,
+    raw_merge_keys=None,
+    curated_merge_keys=None,
+    locations=None,
+    start_date=None,
+    end_date=None,
+    raw_spec=None,
+    curated_spec=None,
+):
+    """
+    Re-runs the transform and load steps from the raw cache, without any request to USGS.
+
+    Args:
+        cache (RawCache): The raw cache to replay.
+        loader (BatchLoader): The loader receiving the raw and curated data.
+        dataset_raw (str): The BigQuery dataset of the raw tables, or None to only reload curated data.
+        dataset_curated (str): The BigQuery dataset of the curated table.
+        columns_to_keep (list): List of columns to keep in the curated table.
+        raw_merge_keys (list, optional): Merge keys of the raw tables, if the loader merges.
+        curated_merge_keys (list, optional): Merge keys of the curated table, if the loader merges.
+        locations (list, optional): Only replay these locations. Default is all.
+        start_date (str, optional): Only replay files extracted on or after this date (YYYY-MM-DD).
+        end_date (str, optional): Only replay files extracted on or before this date (YYYY-MM-DD).
+        raw_spec (TableSpec, optional): The definition of the raw tables.
+        curated_spec (TableSpec, optional): The definition of the curated table.
+
+    Returns:
+        int: The number of curated rows replayed.
+    """
+    total_rows = 0
+    for location_name, raw_df in cache.read(locations, start_date, end_date):
+        if dataset_raw is not None:
+            loader.add(
+                raw_df, dataset_raw, location_name, raw_merge_keys, spec=raw_spec
+            )
+
+        curated_df = minor_transform_dataframe(location_name, raw_df)
+        loader.add(
+            curated_df[columns_to_keep],
+            dataset_curated,
+            "earthquakes",
+            curated_merge_keys,
+            spec=curated_spec,
+        )
+        total_rows += len(curated_df)
+
+    loader.flush()
+    logger.info(f"Replayed {total_rows} rows from {cache.root}.")
+    return total_rows
@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from functions.logger import get_logger
+from functions.usgs_client import get_usgs_client
+
+logger = get_logger("request-cache")
+
+# Query parameters rounded to COORDINATE_DECIMALS in the cache keys
+COORDINATE_PARAMETERS = {
+    "latitude",
+    "longitude",
+    "minlatitude",
+    "maxlatitude",
+    "minlongitude",
+    "maxlongitude",
+}
+# About 11 m, so coordinates geocoded again with a small jitter share their entries
+COORDINATE_DECIMALS = 4
+TIME_PARAMETERS = {"starttime", "endtime", "updatedafter"}
+
+# Bump to invalidate every cached response, e.g. when changing the key
+CACHE_VERSION = "1"
+
+# Entries and loaded counts are dropped on save once older than this. Incremental queries
+# change with the watermark, so most keys are not requested again
+MAX_AGE = timedelta(days=7)
+
+
+def canonical_key(url):
+    """
+    Returns the cache key of a URL, from its endpoint and canonical query parameters.
+
+    Parameters are sorted, coordinates rounded to COORDINATE_DECIMALS, numbers written
+    without trailing zeros and times in ISO8601 to the millisecond, so equivalent queries
+    share one key.
+
+    Args:
+        url (str): The URL of the request.
+
+    Returns:
+        str: The key of the request.
+    """
+    parts = urlsplit(url)
+    parameters = []
+    for name, value in parse_qsl(parts.query, keep_blank_values=True):
+        name = name.lower()
+        try:
+            if name in COORDINATE_PARAMETERS:
+                value = f"{float(value):.{COORDINATE_DECIMALS}f}"
+            elif name in TIME_PARAMETERS:
+                value = datetime.fromisoformat(value).isoformat(timespec="milliseconds")
+            elif name == "maxradiuskm":
+                value = f"{float(value):g}"
+        except ValueError:
+            pass  # Not a number or a time, keep the value as it was sent
+        parameters.append((name, value))
+    return f"{parts.netloc}{parts.path}?{urlencode(sorted(parameters))}"
+
+
+class RequestCache:
+    """
+    Cache of the small USGS responses, such as counts, in front of the shared client.
+
+    Fresh entries are returned without a request. Expired entries sent with an `ETag` or
+    a `Last-Modified` header are revalidated with a conditional request, so an unchanged
+    response costs a 304 without a body. Identical requests in flight at the same time
+    are coalesced into one.
+
+    The cache also keeps the count of every query at its last successful load, so a
+    region whose count has not changed can be skipped.
+
+    Args:
+        path (str, optional): The path of the JSON file. Default is to keep the cache in memory.
+        ttl (timedelta, optional): How long a response is returned without a request.
+        Default is to always revalidate.
+
+    Attributes:
+        hits (int): Requests answered by a fresh entry.
+        revalidated (int): Requests answered by an entry the server reported as not modified.
+        coalesced (int): Requests answered by an identical request in flight.
+        misses (int): Requests answered by a full response.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.coalesced = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._entries, self._loaded = self._load()
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return {}, {}
+        with open(self.path) as file:
+            content = json.load(file)
+        if content.get("version") != CACHE_VERSION:
+            logger.info(
+                f"Request cache version changed to {CACHE_VERSION}, discarding entries."
+            )
+            return {}, {}
+        return content["entries"], content["loaded"]
+
+    def get(self, url, rate_limiter=None, host_limiter=None):
+        """
+        Returns the body of a response, from the cache or from USGS.
+
+        Args:
+            url (str): The URL to request.
+            rate_limiter (TokenBucket, optional): Global rate limit applied to the request.
+            host_limiter (HostConcurrencyLimiter, optional): Per-host cap applied to the request.
+
+        Returns:
+            str: The body of the response.
+
+        Raises:
+            requests.RequestException: If the request fails after its retries.
+        """
+        key = canonical_key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry):
+                self.hits += 1
+                return entry["body"]
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                self.coalesced += 1
+            else:
+                self._in_flight[key] = Future()
+
+        if in_flight is not None:
+            return in_flight.result()
+
+        try:
+            body = self._fetch(key, url, entry, rate_limiter, host_limiter)
+        except BaseException as ex:
+            with self._lock:
+                self._in_flight.pop(key).set_exception(ex)
+            raise
+        with self._lock:
+            self._in_flight.pop(key).set_result(body)
+        return body
+
+    def _is_fresh(self, entry):
+        return (
+            self.ttl is not None
+            and time.time() - entry["cached_at"] <= self.ttl.total_seconds()
+        )
+
+    def _fetch(self, key, url, entry, rate_limiter, host_limiter):
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = get_usgs_client().get(
+            url, rate_limiter=rate_limiter, host_limiter=host_limiter, headers=headers
+        )
+        with self._lock:
+            if response.status_code == 304 and entry is not None:
+                self.revalidated += 1
+                entry["cached_at"] = time.time()
+                return entry["body"]
+
+            self.misses += 1
+            self._entries[key] = {
+                "body": response.text,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "cached_at": time.time(),
+            }
+            return response.text
+
+    @property
+    def hit_ratio(self):
+        """float: The share of requests answered without a full response."""
+        answered = self.hits + self.revalidated + self.coalesced
+        total = answered + self.misses
+        return answered / total if total else 0.0
+
+    def get_loaded(self, url):
+        """Returns the count of a query at its last successful load, or None."""
+        with self._lock:
+            loaded = self._loaded.get(canonical_key(url))
+            return loaded["count"] if loaded is not None else None
+
+    def set_loaded(self, counts):
+        """
+        Records the counts of queries whose data was loaded successfully.
+
+        Args:
+            counts (dict): The count of every query, keyed on its URL.
+        """
+        with self._lock:
+            for url, count in counts.items():
+                self._loaded[canonical_key(url)] = {
+                    "count": count,
+                    "loaded_at": time.time(),
+                }
+
+    def log_summary(self):
+        """Logs the hits, misses and hit ratio of the cache."""
+        logger.info(
+            f"Request cache: {self.hits} hits, {self.revalidated} revalidated, "
+            f"{self.coalesced} coalesced, {self.misses} misses "
+            f"({self.hit_ratio:.0%} hit ratio)."
+        )
+
+    def save(self):
+        """Writes the cache to disk atomically, if it has a path, without the old entries."""
+        if self.path is None:
+            return
+        with self._lock:
+            oldest = time.time() - MAX_AGE.total_seconds()
+            self._entries = {
+                key: entry
+                for key, entry in self._entries.items()
+                if entry["cached_at"] >= oldest
+            }
+            self._loaded = {
+                key: loaded
+                for key, loaded in self._loaded.items()
+                if loaded["loaded_at"] >= oldest
+            }
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(
+                    {
+                        "version": CACHE_VERSION,
+                        "entries": self._entries,
+                        "loaded": self._loaded,
+                    },
+                    file,
+                    indent=2,
+                    sort_keys=True,
+                )
+            os.replace(temporary_path, self.path)
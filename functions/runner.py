@@ -0,0 +1,542 @@
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from functions.logger import get_logger
+
+logger = get_logger("runner")
+
+# Define the URL templates, relative to the `usgs_url` of the configuration
+URL_TEMPLATE = "{usgs_url}/fdsnws/event/1/query?format={file_format}&starttime={start_time}&endtime={end_time}&{area}&limit={limit}"
+COUNT_TEMPLATE = (
+    "{usgs_url}/fdsnws/event/1/count?starttime={start_time}&endtime={end_time}&{area}"
+)
+
+
+def plan_dry_run(config):
+    """
+    Logs the queries a run would send, without any request to USGS, the geocoder or BigQuery.
+
+    Only the geocode cache is read, so the regions are planned when every address
+    has been geocoded by a previous run.
+
+    Args:
+        config (dict): The configuration returned by `load_config`.
+
+    Returns:
+        dict: The planned regions, as returned by `plan_regions`, or an empty dictionary
+        when some addresses are not cached.
+    """
+    from functions.geocode_cache import GeocodeCache
+
+    extraction, state = config["extraction"], config["state"]
+    end_time = extraction["end_time"] or datetime.now().strftime("%Y-%m-%d")
+    logger.info(
+        f"Dry run: {len(config['locations'])} locations from {extraction['start_time']} "
+        f"to {end_time}, within {extraction['maxradiuskm']} km, loaded to "
+        f"{config['sink']['type']} project {config['sink']['project_id']}."
+    )
+
+    cache = GeocodeCache(
+        state["geocode_cache_path"],
+        ttl=timedelta(days=state["geocode_cache_ttl_days"]),
+    )
+    coordinates = {
+        location_name: cache.get(address)
+        for location_name, address in config["locations"].items()
+    }
+    missing = [name for name, value in coordinates.items() if value is None]
+    if missing:
+        logger.info(f"Dry run: {', '.join(missing)} would be geocoded first.")
+        return {}
+
+    from functions.spatial import plan_regions
+
+    regions = plan_regions(
+        coordinates,
+        extraction["maxradiuskm"],
+        max_overfetch=extraction["max_overfetch"],
+    )
+    for region_name, region in regions.items():
+        url_counts = COUNT_TEMPLATE.format(
+            usgs_url=extraction["usgs_url"],
+            start_time=extraction["start_time"],
+            end_time=end_time,
+            area=urlencode(region["query"]),
+        )
+        logger.info(f"Dry run: {region_name} would be counted with {url_counts}")
+    return regions
+
+
+def run_pipeline(config, dry_run=False):
+    """
+    Extracts the earthquakes around every configured location, transforms them and loads them.
+
+    The modules using pandas, geopy and the BigQuery client are only imported here, so
+    that a dry run or importing this module stays fast.
+
+    Args:
+        config (dict): The configuration returned by `load_config`.
+        dry_run (bool, optional): Only log the planned queries. Default is False.
+
+    Returns:
+        int: The number of curated rows loaded, or 0 for a dry run.
+    """
+    if dry_run:
+        plan_dry_run(config)
+        return 0
+
+    from functions.backfill import read_batch, transform_pool, transform_shard
+    from functions.curated import CuratedBatch, compact_raw
+    from functions.extraction import (
+        download_to_file,
+        extract_data_chunks,
+        extract_data_return_df,
+        get_coordinates,
+        get_total_n_earthquakes,
+    )
+    from functions.bigquery_functions import BatchLoader
+    from functions.sinks import make_sink
+    from functions.pipeline import Stage, run_stages
+    from functions.partitioning import extract_time_windows, plan_time_windows
+    from functions.rate_limit import HostConcurrencyLimiter, TokenBucket
+    from functions.geocode_cache import GeocodeCache
+    from functions.request_cache import RequestCache
+    from functions.usgs_client import USGSClient, set_usgs_client
+    from functions.state import WatermarkStore, compute_watermark
+    from functions.raw_cache import RawCache
+    from functions.spatial import assign_to_offices, plan_regions
+    from functions.metrics import get_metrics, stage
+    from functions.tables import CURATED_TABLE, RAW_TABLE
+
+    extraction = config["extraction"]
+    concurrency = config["concurrency"]
+    state = config["state"]
+    sink = config["sink"]
+    start_time = extraction["start_time"]
+    end_time = extraction["end_time"] or datetime.now().strftime("%Y-%m-%d")
+    maxradiuskm = extraction["maxradiuskm"]
+    max_workers = concurrency["max_workers"]
+
+    # Initialize variables
+    new_watermarks = {}
+    # The ids loaded for every location, as a location can span several items
+    seen_ids = {}
+    region_counts = {}  # The count URL of the whole range and the count of every region
+    skipped_regions = []
+    set_usgs_client(
+        USGSClient(
+            timeout=tuple(concurrency["usgs_timeout"]),
+            max_retries=concurrency["usgs_max_retries"],
+        )
+    )
+    rate_limiter = TokenBucket(rate=concurrency["requests_per_second"])
+    host_limiter = HostConcurrencyLimiter(
+        max_per_host=concurrency["max_requests_per_host"]
+    )
+    watermark_store = WatermarkStore(state["state_path"])
+    loader = BatchLoader(
+        project_id=sink["project_id"],
+        max_rows=sink["load_batch_rows"],
+        max_bytes=sink["load_batch_bytes"],
+        if_exists=sink["load_mode"],
+        sink=make_sink(sink),
+    )
+    geocode_cache = GeocodeCache(
+        state["geocode_cache_path"],
+        ttl=timedelta(days=state["geocode_cache_ttl_days"]),
+    )
+    raw_cache = RawCache(state["raw_cache_dir"])
+    request_cache = RequestCache(
+        state["request_cache_path"],
+        ttl=timedelta(minutes=state["request_cache_ttl_minutes"]),
+    )
+
+    logger.info("Starting the extraction process.")
+
+    # Get coordinates for the specified locations
+    dic_addresses = get_coordinates(
+        config["locations"], cache=geocode_cache, max_workers=max_workers
+    )
+    logger.info(f"Total number of locations to extract data: {len(dic_addresses)}.")
+
+    # Group nearby offices, so overlapping areas are only requested once
+    regions = plan_regions(
+        dic_addresses, maxradiuskm, max_overfetch=extraction["max_overfetch"]
+    )
+
+    # The area and `updatedafter` parameters of the queries of every region
+    region_filters = {}
+    for region_name, region in regions.items():
+        # Only request the events updated since the oldest load of the region's locations
+        watermarks = [
+            watermark_store.get(location_name) if extraction["incremental"] else None
+            for location_name in region["locations"]
+        ]
+        watermark = None if None in watermarks else min(watermarks)
+        if watermark:
+            logger.info(
+                f"Extracting events updated after {watermark} for {region_name}."
+            )
+        updated_after = f"&updatedafter={watermark}" if watermark else ""
+        region_filters[region_name] = (urlencode(region["query"]), updated_after)
+
+    def plan_region(region_name):
+        """
+        Splits the extraction of a region in time windows holding less than max_rows_per_window rows.
+
+        Returns:
+            list: The (start, end, count) of every window, as returned by `plan_time_windows`.
+        """
+
+        def count_window(window_start, window_end):
+            # Get the total number of earthquakes for the region
+            dic_number_earthquakes = get_total_n_earthquakes(
+                url=count_url(region_name, window_start, window_end),
+                location_name=region_name,
+                rate_limiter=rate_limiter,
+                host_limiter=host_limiter,
+                cache=request_cache,
+            )
+            return dic_number_earthquakes[region_name]
+
+        return plan_time_windows(
+            count_window,
+            start_time,
+            end_time,
+            max_rows=extraction["max_rows_per_window"],
+        )
+
+    def count_url(region_name, window_start, window_end):
+        # Format the URL to verify the number of extractions to be done
+        area, updated_after = region_filters[region_name]
+        url_counts = COUNT_TEMPLATE.format(
+            usgs_url=extraction["usgs_url"],
+            start_time=window_start,
+            end_time=window_end,
+            area=area,
+        )
+        return url_counts + updated_after
+
+    def skip_region(region_name, windows):
+        """
+        Decides if a region can be skipped, as it has no events or the same count as at its last load.
+
+        Args:
+            region_name (str): The name of the region.
+            windows (list): The (start, end, count) of every window of the region.
+
+        Returns:
+            bool: True if the region needs no download nor transform.
+        """
+        url = count_url(region_name, start_time, end_time)
+        count = sum(window_count for _, _, window_count in windows)
+        region_counts[region_name] = (url, count)
+        if count == 0:
+            logger.info(f"No events to extract for {region_name}, skipping it.")
+        elif extraction["skip_unchanged"] and request_cache.get_loaded(url) == count:
+            logger.info(
+                f"{count} events for {region_name}, as at its last load, skipping it."
+            )
+        else:
+            return False
+        skipped_regions.append(region_name)
+        return True
+
+    def window_url(region_name, window_start, window_end):
+        # Format the URL to extract data
+        area, updated_after = region_filters[region_name]
+        url_earthquakes = URL_TEMPLATE.format(
+            usgs_url=extraction["usgs_url"],
+            file_format=extraction["file_format"],
+            start_time=window_start,
+            end_time=window_end,
+            area=area,
+            limit=extraction["limit"],
+        )
+        return url_earthquakes + updated_after
+
+    def keep_raw_data(location_name, extracted_data):
+        # Keep a local copy of the raw data, so it can be reprocessed without USGS
+        raw_cache.write(location_name, extracted_data)
+
+        watermark = compute_watermark(
+            extracted_data,
+            previous_watermark=watermark_store.get(location_name),
+            end_time=end_time,
+        )
+        # A location can be kept in several batches, of which the latest one wins
+        new_watermarks[location_name] = max(
+            filter(None, (watermark, new_watermarks.get(location_name))), default=None
+        )
+
+    def load_location(location_name, extracted_data, curated):
+        if sink["dataset_raw"]:
+            loader.add(
+                df=extracted_data,
+                dataset_id=sink["dataset_raw"],
+                table_name=location_name,
+                merge_keys=sink["raw_merge_keys"],
+                spec=RAW_TABLE,
+            )
+        # Curated data is buffered per location and combined once by the loader
+        loader.add(
+            df=curated,
+            dataset_id=sink["dataset_curated"],
+            table_name="earthquakes",
+            merge_keys=sink["curated_merge_keys"],
+            spec=CURATED_TABLE,
+        )
+        return len(curated)
+
+    def extract_region(item):
+        """
+        Extracts the raw data of one region, split into time windows under the row budget.
+
+        Windows of at most `stream_chunk_rows` events are downloaded in parallel and sent
+        as one DataFrame. Larger CSV windows are streamed, and sent in chunks of that many
+        rows while they download, so they are never held whole.
+
+        Args:
+            item (tuple): The name of the region, and the locations it covers with its query parameters.
+
+        Yields:
+            tuple: The name of the region and a part of its extracted data. Nothing is
+            yielded if the region is skipped.
+        """
+        region_name, _ = item
+        windows = plan_region(region_name)
+        if skip_region(region_name, windows):
+            return
+
+        chunk_rows = extraction["stream_chunk_rows"]
+        streamed = [
+            window
+            for window in windows
+            if chunk_rows
+            and extraction["file_format"] == "csv"
+            and window[2] > chunk_rows
+        ]
+        downloaded = [window for window in windows if window not in streamed]
+
+        def extract_window(window_start, window_end):
+            # Extract raw data from source
+            return extract_data_return_df(
+                url=window_url(region_name, window_start, window_end),
+                location_name=region_name,
+                rate_limiter=rate_limiter,
+                host_limiter=host_limiter,
+                file_format=extraction["file_format"],
+            )
+
+        if any(count for _, _, count in downloaded):
+            yield region_name, extract_time_windows(
+                extract_window, downloaded, max_workers=max_workers
+            )
+
+        for window_start, window_end, _ in streamed:
+            chunks = extract_data_chunks(
+                window_url(region_name, window_start, window_end),
+                region_name,
+                chunk_rows,
+                rate_limiter,
+                host_limiter,
+            )
+            while True:
+                # Only time the download of a chunk, not the wait for room in the next stage
+                with stage("download", location=region_name) as record:
+                    chunk = next(chunks, None)
+                    record["rows"] = 0 if chunk is None else len(chunk)
+                if chunk is None:
+                    break
+                yield region_name, chunk
+
+    def transform_region(item):
+        """
+        Splits the data of a region by location, keeps a local copy and transforms it.
+
+        Args:
+            item (tuple): The name of the region and a part of its extracted data.
+
+        Returns:
+            list: The name, raw data and CuratedBatch of every location in the region.
+        """
+        region_name, region_data = item
+        locations_in_region = regions[region_name]["locations"]
+        if len(locations_in_region) == 1:
+            located_data = {region_name: region_data}
+        else:
+            # Keep the events within maxradiuskm of each office, as its radius query would
+            located_data = assign_to_offices(
+                region_data,
+                {name: dic_addresses[name] for name in locations_in_region},
+                maxradiuskm,
+            )
+
+        transformed = []
+        for location_name, extracted_data in located_data.items():
+            # Events on the boundary of two windows are returned by both, maybe in two items
+            seen = seen_ids.setdefault(location_name, set())
+            extracted_data = extracted_data[~extracted_data["id"].isin(seen).to_numpy()]
+            seen.update(extracted_data["id"])
+
+            extracted_data = compact_raw(extracted_data)
+            keep_raw_data(location_name, extracted_data)
+            curated = CuratedBatch.from_raw(location_name, extracted_data)
+            transformed.append((location_name, extracted_data, curated))
+        return transformed
+
+    def load_region(transformed):
+        """
+        Buffers the raw and curated data of every location in a region for BigQuery.
+
+        Args:
+            transformed (list): The name, raw data and CuratedBatch of every location.
+
+        Returns:
+            int: The number of curated rows buffered.
+        """
+        return sum(load_location(*location) for location in transformed)
+
+    def extract_shard(shard):
+        """
+        Downloads the response of one region and time window to a file of the spool directory.
+
+        Args:
+            shard (tuple): The name of the region, and the start and end of the window.
+
+        Returns:
+            dict: The work of the shard, as expected by `transform_shard`.
+        """
+        region_name, window_start, window_end = shard
+        response_path = os.path.join(spool_dir, f"response-{uuid.uuid4().hex}")
+        download_to_file(
+            window_url(region_name, window_start, window_end),
+            region_name,
+            response_path,
+            rate_limiter=rate_limiter,
+            host_limiter=host_limiter,
+        )
+        return {
+            "region_name": region_name,
+            "response_path": response_path,
+            "file_format": extraction["file_format"],
+            "locations": {
+                name: dic_addresses[name] for name in regions[region_name]["locations"]
+            },
+            "maxradiuskm": maxradiuskm,
+            "output_dir": spool_dir,
+        }
+
+    def transform_in_process(shard):
+        # Wait for a worker process, so the queues keep their back-pressure
+        with stage("transform", location=shard["region_name"]) as record:
+            try:
+                batches = pool.submit(transform_shard, shard).result()
+            finally:
+                os.remove(shard["response_path"])
+            record["rows"] = sum(batch["rows"] for batch in batches)
+        return batches
+
+    def load_batches(batches):
+        rows = 0
+        for batch in batches:
+            location_name = batch["location_name"]
+            extracted_data = read_batch(batch["raw_path"])
+            curated = CuratedBatch(
+                read_batch(batch["curated_path"]), batch["inserted_at"]
+            )
+
+            # Events on the boundary of two windows are returned by both. The raw rows
+            # are unique on id and aligned with the curated ones, so one mask filters both
+            seen = seen_ids.setdefault(location_name, set())
+            new = ~extracted_data["id"].isin(seen).to_numpy()
+            extracted_data = extracted_data[new]
+            curated = curated.filter(new)
+            seen.update(extracted_data["id"])
+
+            keep_raw_data(location_name, extracted_data)
+            rows += load_location(location_name, extracted_data, curated)
+        return rows
+
+    if concurrency["transform_processes"]:
+        # Shard the backfill by region and time window, and decode and transform the
+        # shards in worker processes, which are not limited by the GIL
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            shards = [
+                (region_name, window_start, window_end)
+                for region_name, windows in zip(
+                    regions, executor.map(plan_region, regions)
+                )
+                if not skip_region(region_name, windows)
+                for window_start, window_end, count in windows
+                if count > 0
+            ]
+        logger.info(
+            f"Transforming {len(shards)} shards in "
+            f"{concurrency['transform_processes']} processes."
+        )
+
+        with tempfile.TemporaryDirectory(prefix="backfill-") as spool_dir:
+            with transform_pool(concurrency["transform_processes"]) as pool:
+                total_rows = sum(
+                    run_stages(
+                        shards,
+                        [
+                            Stage("extract", extract_shard, workers=max_workers),
+                            Stage(
+                                "transform",
+                                transform_in_process,
+                                workers=concurrency["transform_processes"],
+                            ),
+                            Stage("load", load_batches),
+                        ],
+                        queue_size=concurrency["pipeline_queue_size"],
+                    )
+                )
+    else:
+        # Extract, transform and load on their own threads, so downloads continue during uploads
+        total_rows = sum(
+            run_stages(
+                regions.items(),
+                [
+                    Stage("extract", extract_region, workers=max_workers, fan_out=True),
+                    Stage("transform", transform_region),
+                    Stage("load", load_region),
+                ],
+                queue_size=concurrency["pipeline_queue_size"],
+            )
+        )
+
+    logger.info(
+        "Pushing combined data to BigQuery, containing the curated dataset with the location."
+    )
+
+    # Load the remaining curated and raw data to BigQuery
+    loader.flush()
+    loader.sink.close()
+    logger.info(f"Loaded {loader.rows_loaded} rows in {loader.jobs} load jobs.")
+
+    # Only move the watermarks once all the data has been loaded
+    if extraction["incremental"]:
+        watermark_store.update(
+            {name: value for name, value in new_watermarks.items() if value is not None}
+        )
+    # Also once all the data has been loaded, so a failed region is not skipped next time
+    request_cache.set_loaded(dict(region_counts.values()))
+    request_cache.save()
+
+    # Report the time, rows and bytes of every stage
+    get_metrics().log_summary()
+    request_cache.log_summary()
+    logger.info(
+        f"Skipped {len(skipped_regions)} of {len(regions)} regions without new events."
+    )
+    if state["metrics_path"]:
+        get_metrics().write(state["metrics_path"])
+
+    logger.debug(f"Total rows extracted: {total_rows}.\nExtraction process finished.")
+    logger.info("Extraction process finished.")
+    return total_rows
@@ -0,0 +1,141 @@
+from functools import lru_cache
+import pandas as pd
+from functions.logger import get_logger
+
+logger = get_logger("schema")
+
+# Rows read to infer the type of every column
+INFERENCE_SAMPLE_SIZE = 1000
+
+
+class CompiledSchema:
+    """
+    An expected schema prepared once for the vectorized inference and coercion of columns.
+
+    Use `compile_schema` to get the cached instance of a schema.
+
+    Args:
+        expected_schema (dict): The expected type of every column, 'int64', 'float64' or 'string'.
+
+    Attributes:
+        columns (tuple): The expected columns, in order.
+        numeric_columns (tuple): The columns expected as 'int64' or 'float64'.
+        integer_columns (tuple): The columns expected as 'int64'.
+        csv_dtypes (dict): The dtypes used to parse the columns with `pd.read_csv`.
+    """
+
+    def __init__(self, expected_schema):
+        self.expected_schema = dict(expected_schema)
+        self.columns = tuple(self.expected_schema)
+        self.numeric_columns = tuple(
+            column
+            for column, dtype in self.expected_schema.items()
+            if dtype != "string"
+        )
+        self.integer_columns = tuple(
+            column for column, dtype in self.expected_schema.items() if dtype == "int64"
+        )
+        # Integer columns are parsed as float64, since the feed leaves them empty when unknown
+        self.csv_dtypes = {
+            column: "float64" if column in self.numeric_columns else str
+            for column in self.columns
+        }
+
+    def infer(self, sample):
+        """
+        Infers the type of every column from a sample of the rows.
+
+        Args:
+            sample (pd.DataFrame): The first rows of the data, parsed by `pd.read_csv`
+            with its own type inference.
+
+        Returns:
+            dict: The inferred type of every column, 'int64', 'float64' or 'string'.
+            Float columns holding only whole numbers are 'int64', as integer columns with
+            empty values are parsed as floats.
+        """
+        inferred_schema = {}
+        for column in sample.columns:
+            values = sample[column]
+            if pd.api.types.is_integer_dtype(values):
+                inferred_schema[column] = "int64"
+            elif pd.api.types.is_float_dtype(values) and values.notna().any():
+                whole = (values.dropna() % 1 == 0).all()
+                inferred_schema[column] = "int64" if whole else "float64"
+            else:
+                inferred_schema[column] = "string"
+        return inferred_schema
+
+    def coerce(self, df):
+        """
+        Converts whole columns to their expected types and reports the values that fail.
+
+        Integer columns always become the nullable Int64 dtype, and their non-integral
+        values are reported as failures.
+
+        Args:
+            df (pd.DataFrame): The data, with numeric columns as numbers or strings and
+            nulls for empty values.
+
+        Returns:
+            tuple: The converted DataFrame, and a DataFrame of the failing values with
+            their `row` position, `column` and `value`.
+
+        Raises:
+            ValueError: If an expected column is missing.
+        """
+        missing_columns = [
+            column for column in self.columns if column not in df.columns
+        ]
+        if missing_columns:
+            logger.error(f"Missing column in extracted data: {missing_columns[0]}")
+            raise ValueError(f"Missing column in extracted data: {missing_columns[0]}")
+
+        df = df.copy(deep=False)
+        failures = []
+        for column in self.numeric_columns:
+            values = df[column]
+            numbers = pd.to_numeric(values, errors="coerce")
+            failed = numbers.isna() & values.notna()
+            if column in self.integer_columns:
+                failed |= numbers.notna() & (numbers % 1 != 0)
+            if failed.any():
+                failures.append(
+                    pd.DataFrame(
+                        {
+                            "row": failed.to_numpy().nonzero()[0],
+                            "column": column,
+                            "value": values[failed].astype(object).to_numpy(),
+                        }
+                    )
+                )
+
+            if column in self.integer_columns:
+                numbers = numbers.mask(failed).astype("Int64")
+            df[column] = numbers
+
+        if failures:
+            failures = pd.concat(failures, ignore_index=True)
+        else:
+            failures = pd.DataFrame(
+                {"row": pd.Series(dtype="int64"), "column": [], "value": []}
+            )
+        return df, failures
+
+
+@lru_cache(maxsize=None)
+def _compile_schema(items):
+    return CompiledSchema(dict(items))
+
+
+def compile_schema(expected_schema):
+    """
+    Returns the compiled version of a schema, compiling it only on the first call.
+
+    Args:
+        expected_schema (dict): The expected type of every column.
+
+    Returns:
+        CompiledSchema: The compiled schema, shared by all calls with the same schema.
+    """
+    return _compile_schema(tuple(expected_schema.items()))
@@ -0,0 +1,308 @@
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from functions.logger import get_logger
+from functions.tables import PARTITION_MARGIN
+
+logger = get_logger("sinks")
+
+# Directory of the rows without a partition time, as named by Hive
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def to_arrow(df, spec=None, merge_keys=None):
+    """
+    Converts the rows of a load to the Arrow table written by the sinks.
+
+    Args:
+        df (pd.DataFrame): The rows to load.
+        spec (TableSpec, optional): The definition of the target table. The columns are
+        then projected and parsed as by `TableSpec.prepare`, and converted to its types.
+        merge_keys (list, optional): Only keep the last row of every key, as a merge does.
+
+    Returns:
+        pyarrow.Table: The rows, without the index.
+    """
+    if merge_keys:
+        df = df.drop_duplicates(subset=merge_keys, keep="last")
+    if spec is None:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    return pa.Table.from_pandas(
+        spec.prepare(df), schema=spec.arrow_schema, preserve_index=False
+    )
+
+
+def split_table_id(table_id):
+    """Returns the dataset and the table name of a "project.dataset.table" ID."""
+    dataset_id, table_name = table_id.split(".")[-2:]
+    return dataset_id, table_name
+
+
+class Sink(ABC):
+    """
+    Destination of the loads, receiving one Arrow table per table and flush.
+
+    Subclasses must implement `write` for every `if_exists` option: 'fail', 'replace',
+    'append' and 'merge'. With a table definition, 'replace' only replaces the day
+    partitions of the rows.
+    """
+
+    @abstractmethod
+    def write(self, table_id, table, if_exists="append", merge_keys=None, spec=None):
+        """
+        Writes the rows of a table.
+
+        Args:
+            table_id (str): The table, as "project.dataset.table".
+            table (pyarrow.Table): The rows, as returned by `to_arrow`.
+            if_exists (str, optional): Options are 'fail', 'replace', 'append', 'merge'.
+            Default is 'append'.
+            merge_keys (list, optional): The columns identifying a row, required by 'merge'.
+            spec (TableSpec, optional): The definition of the table.
+
+        Returns:
+            int: The number of bytes written, or 0 if unknown.
+        """
+
+    def close(self):
+        """Releases the resources of the sink, once all the tables are written."""
+
+
+class DuckDBSink(Sink):
+    """
+    Writes the tables to a local DuckDB database, one schema per dataset.
+
+    Requires the optional `duckdb` package of `requirements-optional.txt`. Timestamps are compared in UTC, so the
+    partitions replaced are the days of BigQuery.
+
+    Args:
+        path (str): The path of the database file. Its directory is created if needed.
+
+    Raises:
+        ValueError: If DuckDB is not installed.
+    """
+
+    def __init__(self, path):
+        try:
+            import duckdb
+        except ImportError as ex:
+            raise ValueError(
+                "The duckdb sink requires the optional duckdb package: "
+                "pip install -r requirements-optional.txt"
+            ) from ex
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = duckdb.connect(path)
+        self.connection.execute("SET TimeZone = 'UTC'")
+        self._lock = threading.Lock()
+
+    def write(self, table_id, table, if_exists="append", merge_keys=None, spec=None):
+        dataset_id, table_name = split_table_id(table_id)
+        name = f'"{dataset_id}"."{table_name}"'
+        columns = ", ".join(f'"{column}"' for column in table.column_names)
+        order_by = ""
+        if spec is not None and spec.clustering_fields:
+            # Sorted rows keep the min/max statistics of the clustering columns selective
+            order_by = " ORDER BY " + ", ".join(
+                f'"{field}"' for field in spec.clustering_fields
+            )
+
+        with self._lock:
+            connection = self.connection
+            connection.register("batch", table)
+            connection.execute("BEGIN TRANSACTION")
+            try:
+                connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{dataset_id}"')
+                if if_exists == "replace" and spec is None:
+                    connection.execute(f"DROP TABLE IF EXISTS {name}")
+                connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM batch LIMIT 0"
+                )
+
+                if if_exists == "fail":
+                    if connection.execute(f"SELECT 1 FROM {name} LIMIT 1").fetchone():
+                        raise ValueError(f"Table {table_id} already holds rows.")
+                elif if_exists == "merge":
+                    key_condition = " AND ".join(
+                        f'batch."{key}" = target."{key}"' for key in merge_keys
+                    )
+                    connection.execute(
+                        f"DELETE FROM {name} AS target "
+                        f"WHERE EXISTS (SELECT 1 FROM batch WHERE {key_condition})"
+                    )
+                elif if_exists == "replace" and spec is not None:
+                    field = f'"{spec.partition_field}"'
+                    connection.execute(
+                        f"DELETE FROM {name} WHERE CAST({field} AS DATE) IN "
+                        f"(SELECT DISTINCT CAST({field} AS DATE) FROM batch)"
+                    )
+
+                connection.execute(
+                    f"INSERT INTO {name} ({columns}) SELECT {columns} FROM batch{order_by}"
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            finally:
+                connection.unregister("batch")
+
+        logger.debug(f"Wrote {table.num_rows} rows to {name} in {self.path}.")
+        return table.nbytes
+
+    def close(self):
+        """Closes the database."""
+        self.connection.close()
+
+
+class ParquetSink(Sink):
+    """
+    Writes the tables as Parquet files, partitioned by day as the BigQuery tables.
+
+    A table is the directory `<root>/<dataset>/<table>`. With a table definition, its
+    rows are split in `date=<YYYY-MM-DD>` directories on the partition field, in UTC,
+    and sorted on the clustering fields. The directories can be read as one dataset,
+    e.g. with `pyarrow.dataset.dataset(path, partitioning="hive")` or DuckDB's
+    `read_parquet('<path>/**/*.parquet', hive_partitioning = true)`.
+
+    A merge rewrites the partitions holding a key of the rows, within PARTITION_MARGIN
+    of their days, and adds the rows as new files.
+
+    Args:
+        root (str): The directory of the datasets. It is created if needed.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def write(self, table_id, table, if_exists="append", merge_keys=None, spec=None):
+        directory = os.path.join(self.root, *split_table_id(table_id))
+        if spec is not None and spec.clustering_fields:
+            table = table.sort_by(
+                [(field, "ascending") for field in spec.clustering_fields]
+            )
+        partitions = self._split(table, spec)
+
+        with self._lock:
+            if if_exists == "fail" and self._files(directory):
+                raise ValueError(f"Table {table_id} already holds rows.")
+            if if_exists == "replace" and spec is None:
+                shutil.rmtree(directory, ignore_errors=True)
+            elif if_exists == "replace":
+                for partition in partitions:
+                    shutil.rmtree(
+                        os.path.join(directory, partition), ignore_errors=True
+                    )
+            elif if_exists == "merge":
+                self._remove_keys(directory, table, merge_keys, partitions)
+
+            size = 0
+            for partition, rows in partitions.items():
+                size += self._write_file(os.path.join(directory, partition), rows)
+
+        logger.debug(
+            f"Wrote {table.num_rows} rows to {len(partitions)} partitions of {directory}."
+        )
+        return size
+
+    def _split(self, table, spec):
+        # The rows of every partition directory, relative to the table directory
+        if spec is None:
+            return {"": table}
+        days = pc.cast(table[spec.partition_field], pa.date32())
+        partitions = {}
+        for day in pc.unique(days).to_pylist():
+            if day is None:
+                partitions[f"date={NULL_PARTITION}"] = table.filter(pc.is_null(days))
+            else:
+                partitions[f"date={day:%Y-%m-%d}"] = table.filter(
+                    pc.equal(days, pa.scalar(day, pa.date32()))
+                )
+        return partitions
+
+    def _files(self, directory):
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            os.path.join(path, name)
+            for path, _, names in os.walk(directory)
+            for name in names
+            if name.endswith(".parquet")
+        )
+
+    def _write_file(self, directory, table):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+        # Written under another name first, so readers never see a partial file
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        return os.path.getsize(path)
+
+    def _remove_keys(self, directory, table, merge_keys, partitions):
+        # Rewrites the partitions holding a row whose key is in `table`, without that row
+        days = [
+            pd.Timestamp(partition.split("=", 1)[1]).date()
+            for partition in partitions
+            if partition.startswith("date=") and NULL_PARTITION not in partition
+        ]
+        candidates = [os.path.join(directory, partition) for partition in partitions]
+        if days:
+            day = min(days) - PARTITION_MARGIN
+            while day <= max(days) + PARTITION_MARGIN:
+                candidates.append(os.path.join(directory, f"date={day:%Y-%m-%d}"))
+                day += timedelta(days=1)
+
+        if len(merge_keys) == 1:
+            keys = table[merge_keys[0]].unique()
+        else:
+            keys = pd.MultiIndex.from_frame(table.select(merge_keys).to_pandas())
+        for partition_directory in sorted(set(candidates)):
+            files = self._files(partition_directory)
+            if not files:
+                continue
+            existing = pa.concat_tables(pq.read_table(path) for path in files)
+            if len(merge_keys) == 1:
+                matched = pc.is_in(existing[merge_keys[0]], value_set=keys)
+            else:
+                existing_keys = pd.MultiIndex.from_frame(
+                    existing.select(merge_keys).to_pandas()
+                )
+                matched = pa.array(existing_keys.isin(keys))
+            if not pc.any(matched).as_py():
+                continue
+            kept = existing.filter(pc.invert(matched))
+            if kept.num_rows:
+                self._write_file(partition_directory, kept)
+            for path in files:
+                os.remove(path)
+
+
+def make_sink(config):
+    """
+    Creates the sink of the `sink` section of the configuration.
+
+    Args:
+        config (dict): The `sink` section, as returned by `load_config`.
+
+    Returns:
+        Sink: The BigQuery, DuckDB or Parquet sink.
+    """
+    if config["type"] == "duckdb":
+        return DuckDBSink(config["duckdb_path"])
+    if config["type"] == "parquet":
+        return ParquetSink(config["parquet_dir"])
+
+    from functions.bigquery_functions import BigQuerySink
+
+    return BigQuerySink(config["project_id"])
@@ -0,0 +1,173 @@
+import itertools
+import numpy as np
+from functions.logger import get_logger
+
+logger = get_logger("spatial")
+
+# Mean radius of the Earth in kilometers
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(latitude, longitude, other_latitude, other_longitude):
+    """
+    Computes the great-circle distance between points, vectorized over NumPy arrays.
+
+    Args:
+        latitude (array-like): Latitudes of the first points, in degrees.
+        longitude (array-like): Longitudes of the first points, in degrees.
+        other_latitude (array-like): Latitudes of the second points, in degrees.
+        other_longitude (array-like): Longitudes of the second points, in degrees.
+
+    Returns:
+        np.ndarray: The distances in kilometers.
+    """
+    phi = np.radians(latitude)
+    other_phi = np.radians(other_latitude)
+    delta_phi = other_phi - phi
+    delta_lambda = np.radians(np.asarray(other_longitude) - np.asarray(longitude))
+    a = (
+        np.sin(delta_phi / 2) ** 2
+        + np.cos(phi) * np.cos(other_phi) * np.sin(delta_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(coordinates, radius_km):
+    """
+    Computes the latitude and longitude bounds covering a circle around every point.
+
+    Args:
+        coordinates (list): The (latitude, longitude) of the points.
+        radius_km (float): The radius of the circles in kilometers.
+
+    Returns:
+        dict: The `minlatitude`, `maxlatitude`, `minlongitude` and `maxlongitude`
+        parameters of a USGS query.
+    """
+    latitudes = np.array([point[0] for point in coordinates], dtype="float64")
+    longitudes = np.array([point[1] for point in coordinates], dtype="float64")
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    min_latitude = latitudes.min() - np.degrees(angular_radius)
+    max_latitude = latitudes.max() + np.degrees(angular_radius)
+
+    # Circles reaching a pole cover every longitude
+    if min_latitude <= -90 or max_latitude >= 90:
+        min_longitude, max_longitude = -180.0, 180.0
+    else:
+        # The widest point of a circle on the sphere is poleward of its center
+        delta_longitude = np.degrees(
+            np.arcsin(np.sin(angular_radius) / np.cos(np.radians(latitudes)))
+        )
+        min_longitude = (longitudes - delta_longitude).min()
+        max_longitude = (longitudes + delta_longitude).max()
+
+    # Rounded outwards, so the box still covers the circles
+    return {
+        "minlatitude": max(float(np.floor(min_latitude * 1e4) / 1e4), -90.0),
+        "maxlatitude": min(float(np.ceil(max_latitude * 1e4) / 1e4), 90.0),
+        "minlongitude": float(np.floor(min_longitude * 1e4) / 1e4),
+        "maxlongitude": float(np.ceil(max_longitude * 1e4) / 1e4),
+    }
+
+
+def _box_area_km2(box):
+    return (
+        EARTH_RADIUS_KM**2
+        * np.radians(box["maxlongitude"] - box["minlongitude"])
+        * (
+            np.sin(np.radians(box["maxlatitude"]))
+            - np.sin(np.radians(box["minlatitude"]))
+        )
+    )
+
+
+def plan_regions(coordinates, radius_km, max_overfetch=0.0):
+    """
+    Groups offices into regions, each extracted with a single USGS query.
+
+    Offices are merged greedily into bounding-box queries, as long as a box covers at
+    most `1 + max_overfetch` times the area of the radius queries it replaces. Merged
+    offices share one request, and events in overlapping circles are only downloaded
+    once. Offices left on their own keep their radius query.
+
+    Args:
+        coordinates (dict): The (latitude, longitude) of every office, by name.
+        radius_km (float): The radius around every office in kilometers.
+        max_overfetch (float, optional): Extra area a merged query may cover, relative
+        to the radius queries it replaces. Default is 0.0. None keeps one query per office.
+
+    Returns:
+        dict: The regions by name, each with the `locations` it covers and the `query`
+        parameters selecting its area.
+    """
+    circle_area = (
+        2 * np.pi * EARTH_RADIUS_KM**2 * (1 - np.cos(radius_km / EARTH_RADIUS_KM))
+    )
+    groups = [[name] for name in coordinates]
+
+    while max_overfetch is not None and len(groups) > 1:
+        best = None
+        for first, second in itertools.combinations(range(len(groups)), 2):
+            members = groups[first] + groups[second]
+            box = bounding_box([coordinates[name] for name in members], radius_km)
+            ratio = _box_area_km2(box) / (len(members) * circle_area)
+            if ratio <= 1 + max_overfetch and (best is None or ratio < best[0]):
+                best = (ratio, first, second)
+        if best is None:
+            break
+        _, first, second = best
+        groups[first] = groups[first] + groups.pop(second)
+
+    regions = {}
+    for members in groups:
+        if len(members) == 1:
+            latitude, longitude = coordinates[members[0]]
+            query = {
+                "latitude": latitude,
+                "longitude": longitude,
+                "maxradiuskm": radius_km,
+            }
+        else:
+            query = bounding_box([coordinates[name] for name in members], radius_km)
+        regions["+".join(members)] = {"locations": members, "query": query}
+
+    logger.info(
+        f"Planned {len(regions)} queries for {len(coordinates)} locations: {list(regions)}."
+    )
+    return regions
+
+
+def assign_to_offices(df, coordinates, radius_km):
+    """
+    Assigns every event to each office within `radius_km` of it.
+
+    Events are indexed by latitude, so only those in the latitude band of an office
+    are compared with it, using the haversine distance.
+
+    Args:
+        df (pd.DataFrame): The events, with `latitude` and `longitude` columns.
+        coordinates (dict): The (latitude, longitude) of every office, by name.
+        radius_km (float): The radius around every office in kilometers.
+
+    Returns:
+        dict: The events within the radius of every office, by office name. An event
+        close to several offices is returned for each of them.
+    """
+    latitudes = df["latitude"].to_numpy(dtype="float64")
+    longitudes = df["longitude"].to_numpy(dtype="float64")
+    order = np.argsort(latitudes, kind="stable")
+    sorted_latitudes = latitudes[order]
+    delta_latitude = np.degrees(radius_km / EARTH_RADIUS_KM)
+
+    assigned = {}
+    for name, (latitude, longitude) in coordinates.items():
+        start = np.searchsorted(sorted_latitudes, latitude - delta_latitude, "left")
+        end = np.searchsorted(sorted_latitudes, latitude + delta_latitude, "right")
+        candidates = order[start:end]
+        distances = haversine_km(
+            latitude, longitude, latitudes[candidates], longitudes[candidates]
+        )
+        rows = np.sort(candidates[distances <= radius_km])
+        assigned[name] = df.iloc[rows].reset_index(drop=True)
+
+    return assigned
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import pandas as pd
+from functions.logger import get_logger
+
+logger = get_logger("state")
+
+
+class WatermarkStore:
+    """
+    Keeps the high-watermark of every location in a local JSON file.
+
+    The watermark is the latest `updated` time loaded for a location, so the next run
+    only needs to request events updated after it.
+
+    Args:
+        path (str): The path of the JSON file. It is created on the first save.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._watermarks = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            logger.info(f"No watermarks found at {self.path}, running a full backfill.")
+            return {}
+        with open(self.path) as file:
+            return json.load(file)
+
+    def get(self, location_name):
+        """Returns the watermark of a location, or None if it was never loaded."""
+        with self._lock:
+            return self._watermarks.get(location_name)
+
+    def update(self, watermarks):
+        """
+        Sets the watermarks of several locations and writes them to disk atomically.
+
+        Args:
+            watermarks (dict): A dictionary where keys are location names and values are watermarks.
+        """
+        with self._lock:
+            self._watermarks.update(watermarks)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # Write to a temporary file first, so a failed run never leaves a corrupt state
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(self._watermarks, file, indent=2, sort_keys=True)
+            os.replace(temporary_path, self.path)
+
+        logger.debug(f"Saved watermarks for {len(watermarks)} locations.")
+
+
+def compute_watermark(df, previous_watermark=None, end_time=None):
+    """
+    Computes the new watermark of a location from the `updated` column of its data.
+
+    Args:
+        df (pd.DataFrame): The data extracted for the location.
+        previous_watermark (str, optional): The current watermark, kept when `df` has no
+        `updated` time, e.g. when it is empty or decoded from the `text` format.
+        end_time (str, optional): The end of the extracted time window, in UTC. The
+        watermark is capped at it: events after it were not requested, so an earlier
+        event revised after it must not move the watermark past them.
+
+    Returns:
+        str or None: The latest `updated` time in ISO8601 (UTC, millisecond precision).
+    """
+    if df is None or df.empty:
+        return previous_watermark
+
+    latest = pd.to_datetime(df["updated"], utc=True).max()
+    if pd.isna(latest):
+        logger.warning(
+            "No 'updated' times in the data, keeping the previous watermark."
+        )
+        return previous_watermark
+    if end_time is not None:
+        latest = min(latest, pd.Timestamp(end_time, tz="UTC"))
+    return latest.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
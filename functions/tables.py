@@ -0,0 +1,209 @@
+from datetime import datetime, timedelta
+from google.cloud import bigquery
+import pandas as pd
+import pyarrow as pa
+from functions.logger import get_logger
+
+logger = get_logger("tables")
+
+# Arrow types of the BigQuery types, with the microsecond precision of BigQuery timestamps
+ARROW_TYPES = {
+    "INT64": pa.int64(),
+    "FLOAT64": pa.float64(),
+    "STRING": pa.string(),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+# Rows of the target whose time moved by less than this are still replaced by a merge,
+# e.g. when USGS revises the origin time of an event across midnight
+PARTITION_MARGIN = timedelta(days=1)
+
+
+class TableSpec:
+    """
+    Explicit schema, day partitioning and clustering of a BigQuery table.
+
+    Args:
+        schema (dict): The BigQuery type of every column, in order, e.g. {"time": "TIMESTAMP"}.
+        partition_field (str): The TIMESTAMP column the table is partitioned on by day.
+        clustering_fields (list, optional): The columns the table is clustered on, at most four.
+    """
+
+    def __init__(self, schema, partition_field, clustering_fields=None):
+        self.schema = dict(schema)
+        self.partition_field = partition_field
+        self.clustering_fields = list(clustering_fields or [])
+
+    @property
+    def bigquery_schema(self):
+        """list: The schema as BigQuery schema fields."""
+        return [
+            bigquery.SchemaField(name, field_type)
+            for name, field_type in self.schema.items()
+        ]
+
+    @property
+    def arrow_schema(self):
+        """pyarrow.Schema: The schema as Arrow types, so every batch of a table has the same types."""
+        return pa.schema(
+            [
+                (name, ARROW_TYPES[field_type])
+                for name, field_type in self.schema.items()
+            ]
+        )
+
+    def table(self, table_id):
+        """
+        Returns the definition of the table, to be created with `client.create_table`.
+
+        Args:
+            table_id (str): The table, as "project.dataset.table".
+
+        Returns:
+            google.cloud.bigquery.Table: The table with its schema, partitioning and clustering.
+        """
+        table = bigquery.Table(table_id, schema=self.bigquery_schema)
+        table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY, field=self.partition_field
+        )
+        table.clustering_fields = self.clustering_fields or None
+        return table
+
+    def prepare(self, df):
+        """
+        Orders the columns as the schema and parses the TIMESTAMP columns to UTC datetimes.
+
+        Naive datetimes, such as `inserted_at`, are taken as local time.
+
+        Args:
+            df (pd.DataFrame): The rows to load.
+
+        Returns:
+            pd.DataFrame: The rows with the columns of the schema only.
+
+        Raises:
+            ValueError: If a column of the schema is missing.
+        """
+        missing_columns = [column for column in self.schema if column not in df]
+        if missing_columns:
+            raise ValueError(f"Missing column for the table: {missing_columns[0]}")
+
+        df = df[list(self.schema)].copy(deep=False)
+        for column, field_type in self.schema.items():
+            if field_type != "TIMESTAMP":
+                continue
+            values = df[column]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                if values.dt.tz is None:
+                    values = values.dt.tz_localize(datetime.now().astimezone().tzinfo)
+                df[column] = values.dt.tz_convert("UTC")
+            else:
+                df[column] = pd.to_datetime(values, utc=True, format="ISO8601")
+        return df
+
+    def partitions(self, df):
+        """
+        Returns the day partitions holding the rows, once prepared.
+
+        Args:
+            df (pd.DataFrame): The rows returned by `prepare`.
+
+        Returns:
+            list: The days, as `datetime.date`, in order.
+        """
+        return sorted(df[self.partition_field].dropna().dt.date.unique())
+
+    def partition_filter(self, df, alias, margin=PARTITION_MARGIN):
+        """
+        Builds the SQL condition limiting a query to the partitions of the rows.
+
+        BigQuery then only scans these partitions of the target instead of the whole table.
+        The string literals are compared as timestamps by BigQuery, and as text by SQLite.
+
+        Args:
+            df (pd.DataFrame): The rows returned by `prepare`.
+            alias (str): The alias of the partitioned table in the query.
+            margin (timedelta, optional): Added before the first and after the last
+            partition. Default is PARTITION_MARGIN.
+
+        Returns:
+            str: The condition, or None if no row has a partition time.
+        """
+        days = self.partitions(df)
+        if not days:
+            return None
+        start = datetime.combine(days[0], datetime.min.time()) - margin
+        end = datetime.combine(days[-1], datetime.min.time()) + margin
+        end += timedelta(days=1)
+        column = f"{alias}.`{self.partition_field}`"
+        return (
+            f"{column} >= '{start:%Y-%m-%d %H:%M:%S}+00:00' "
+            f"AND {column} < '{end:%Y-%m-%d %H:%M:%S}+00:00'"
+        )
+
+
+def ensure_table(client, table_id, spec):
+    """
+    Creates a table with its schema, partitioning and clustering, unless it exists.
+
+    Tables created before, e.g. by `to_gbq` without partitioning, are left as they are.
+
+    Args:
+        client (google.cloud.bigquery.Client): The client creating the table.
+        table_id (str): The table, as "project.dataset.table".
+        spec (TableSpec): The definition of the table.
+    """
+    client.create_table(spec.table(table_id), exists_ok=True)
+    logger.debug(
+        f"Ensured {table_id}, partitioned on {spec.partition_field} by day "
+        f"and clustered on {spec.clustering_fields}."
+    )
+
+
+# Raw tables hold one location each, so they are clustered on the merge key instead.
+# The columns are those of USGS_SCHEMA. `gap` has decimals and the station counts are
+# empty when unknown, so they are FLOAT64 like the other numbers
+RAW_TABLE = TableSpec(
+    {
+        "time": "TIMESTAMP",
+        "latitude": "FLOAT64",
+        "longitude": "FLOAT64",
+        "depth": "FLOAT64",
+        "mag": "FLOAT64",
+        "magType": "STRING",
+        "nst": "FLOAT64",
+        "gap": "FLOAT64",
+        "dmin": "FLOAT64",
+        "rms": "FLOAT64",
+        "net": "STRING",
+        "id": "STRING",
+        "updated": "TIMESTAMP",
+        "place": "STRING",
+        "type": "STRING",
+        "horizontalError": "FLOAT64",
+        "depthError": "FLOAT64",
+        "magError": "FLOAT64",
+        "magNst": "FLOAT64",
+        "status": "STRING",
+        "locationSource": "STRING",
+        "magSource": "STRING",
+    },
+    partition_field="time",
+    clustering_fields=["id"],
+)
+
+CURATED_TABLE = TableSpec(
+    {
+        "hashed_id": "INT64",
+        "id": "STRING",
+        "time": "TIMESTAMP",
+        "mag": "FLOAT64",
+        "latitude": "FLOAT64",
+        "longitude": "FLOAT64",
+        "place": "STRING",
+        "location": "STRING",
+        "inserted_at": "TIMESTAMP",
+    },
+    partition_field="time",
+    clustering_fields=["location"],
+)
@@ -1,11 +1,42 @@
 import datetime
 import pandas as pd
 from functions.logger import get_logger
-import csv
-from io import StringIO
+from functions.metrics import stage
+from functions.schema import INFERENCE_SAMPLE_SIZE, compile_schema
+from io import BytesIO, StringIO
 
 logger = get_logger("transformation")
 
+# Expected schema of the USGS CSV feed. `gap` is a decimal, and the station counts are
+# left empty when unknown, so they are all float64 whatever the values of a batch are
+USGS_SCHEMA = {
+    "time": "string",
+    "latitude": "float64",
+    "longitude": "float64",
+    "depth": "float64",
+    "mag": "float64",
+    "magType": "string",
+    "nst": "float64",
+    "gap": "float64",
+    "dmin": "float64",
+    "rms": "float64",
+    "net": "string",
+    "id": "string",
+    "updated": "string",
+    "place": "string",
+    "type": "string",
+    "horizontalError": "float64",
+    "depthError": "float64",
+    "magError": "float64",
+    "magNst": "float64",
+    "status": "string",
+    "locationSource": "string",
+    "magSource": "string",
+}
+
+# Columns that must be filled for every event
+USGS_REQUIRED_COLUMNS = ["id", "time"]
+
 
 def minor_transform_and_append_dataframe(
     location_name, df, columns_to_keep, end_combined_df
@@ -26,18 +57,8 @@ def minor_transform_and_append_dataframe(
     str: A message indicating an empty response if the input DataFrame is None.
     """
 
-    logger.info(f"Combining and transforming data for location: {location_name}")
-
     if df is not None:
-        df["location"] = location_name  # Add a column for the location name
-        df["inserted_at"] = datetime.datetime.now()  # Add a timestamp
-
-        # Create a hash column
-        df["hashed_id"] = df.apply(
-            lambda x: hash(tuple(x[col] for col in df.columns if col != "id")),
-            axis=1,
-        )
-        df.drop_duplicates(subset=["id"])  # Remove duplicates based on 'id' column
+        df = minor_transform_dataframe(location_name, df)
 
         if end_combined_df is None:
             return df
@@ -48,6 +69,74 @@ def minor_transform_and_append_dataframe(
         return f"Empty response received for location: {location_name}.\n"
 
 
+def minor_transform_dataframe(location_name, df):
+    """
+    Transforms the DataFrame of one location by adding location, timestamp, and hash ID columns.
+
+    Unlike `minor_transform_and_append_dataframe`, nothing is concatenated, so the frames
+    of all locations can be collected and combined once, or loaded one by one.
+
+    Args:
+        location_name (str): The name of the location to be added as a column.
+        df (pd.DataFrame): The DataFrame to be transformed.
+
+    Returns:
+        pd.DataFrame: The transformed DataFrame, without duplicated 'id'.
+    """
+    logger.info(f"Transforming data for location: {location_name}")
+
+    with stage("transform", location=location_name) as record:
+        df["location"] = location_name  # Add a column for the location name
+        df["inserted_at"] = datetime.datetime.now()  # Add a timestamp
+
+        # Create a hash column
+        with stage("hash", location=location_name) as hash_record:
+            df["hashed_id"] = compute_hashed_id(df)
+            hash_record["rows"] = len(df)
+
+        df = df.drop_duplicates(subset=["id"])  # Remove duplicates based on 'id' column
+        record["rows"] = len(df)
+    return df
+
+
+def combine_dataframes(frames, columns_to_keep):
+    """
+    Combines the transformed DataFrames of all locations with a single concatenation.
+
+    Args:
+        frames (list): The transformed DataFrames.
+        columns_to_keep (list): List of columns to keep in the final DataFrame.
+
+    Returns:
+        pd.DataFrame: The combined DataFrame.
+    """
+    if not frames:
+        return pd.DataFrame(columns=columns_to_keep)
+    return pd.concat([df[columns_to_keep] for df in frames], ignore_index=True)
+
+
+def compute_hashed_id(df, exclude_columns=("id", "inserted_at")):
+    """
+    Computes a deterministic 64-bit hash per row over whole columns at once.
+
+    Unlike Python's built-in `hash()`, which is salted per process, the result is stable
+    across runs and machines, so it can be used as a deduplication key downstream.
+    The `inserted_at` column is excluded by default, since it changes on every run.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to hash.
+        exclude_columns (tuple, optional): Columns left out of the hash. Default is ("id", "inserted_at").
+
+    Returns:
+        pd.Series: The signed 64-bit hash of each row, aligned with the index of `df`.
+    """
+    columns = [col for col in df.columns if col not in exclude_columns]
+    hashes = pd.util.hash_pandas_object(df[columns], index=False)
+
+    # BigQuery only supports signed 64-bit integers, so reinterpret the unsigned bits
+    return pd.Series(hashes.to_numpy().view("int64"), index=df.index)
+
+
 def determine_type(value):
     """
     Determines the type of a given value.
@@ -141,72 +230,175 @@ def validate_and_transform_schema(extracted_schema, expected_schema, data_rows):
             extracted_schema[column] = expected_dtype
 
 
-def validate_and_transform_schema_from_csv(data_text):
+def validate_and_transform_schema_from_csv(data_text, expected_schema=USGS_SCHEMA):
     """
-    Note: This function is for testing purposes only and therefore has no test coverage.
+    Note: This function is for testing purposes only.
 
     Tests the schema of the extracted data against the expected schema and transforms the data if necessary.
 
+    Column types are inferred from a sample of the rows, and whole columns are converted
+    to the expected types at once. Every value that cannot be converted is reported.
+
     Args:
         data_text (str): The CSV data as a string.
+        expected_schema (dict, optional): The expected schema. Default is USGS_SCHEMA.
 
     Returns:
-        list: The transformed data as a list of dictionaries.
+        pd.DataFrame: The transformed data, with nulls for empty values.
 
     Raises:
         ValueError: If the schema does not match the expected schema and cannot be transformed.
     """
-    # Load the expected schema from the JSON file
-    expected_schema = {
-        "time": "string",
-        "latitude": "float64",
-        "longitude": "float64",
-        "depth": "float64",
-        "mag": "float64",
-        "magType": "string",
-        "nst": "float64",
-        "gap": "int64",
-        "dmin": "float64",
-        "rms": "float64",
-        "net": "string",
-        "id": "string",
-        "updated": "string",
-        "place": "string",
-        "type": "string",
-        "horizontalError": "float64",
-        "depthError": "float64",
-        "magError": "float64",
-        "magNst": "int64",
-        "status": "string",
-        "locationSource": "string",
-        "magSource": "string",
-    }
-
-    # Parse the CSV data
-    csv_reader = csv.reader(StringIO(data_text))
-    headers = next(csv_reader)  # Get the headers from the first row
-
-    # Extract the schema from the CSV data
-    extracted_schema = {}
-    for header in headers:
-        extracted_schema[header] = None  # Initialize with None
-
-    data_rows = []
-    for row in csv_reader:
-        row_dict = {}
-        for header, value in zip(headers, row):
-            if extracted_schema[header] is None and value:
-                extracted_schema[header] = determine_type(value)
-            row_dict[header] = value
-        data_rows.append(row_dict)
-
-    # Handle columns that remain None (i.e., all values were null)
-    for header in headers:
-        if extracted_schema[header] is None:
-            extracted_schema[header] = "string"  # Default to string for null columns
+    schema = compile_schema(expected_schema)
+
+    # Compare the types of a sample with the expected schema
+    sample = pd.read_csv(
+        StringIO(data_text),
+        keep_default_na=False,
+        na_values=[""],
+        nrows=INFERENCE_SAMPLE_SIZE,
+    )
+    extracted_schema = schema.infer(sample)
+    for column, expected_dtype in expected_schema.items():
+        extracted_dtype = extracted_schema.get(column)
+        if extracted_dtype not in (None, expected_dtype) and not (
+            extracted_dtype == "int64" and expected_dtype == "float64"
+        ):
+            logger.warning(
+                f"Data type mismatch for column {column}: expected {expected_dtype}, got {extracted_dtype}. Converting to {expected_dtype}."
+            )
+
+    # Parse the numeric columns directly, and only keep them as text to find invalid values
+    try:
+        df = pd.read_csv(StringIO(data_text), dtype=schema.csv_dtypes)
+    except ValueError:
+        df = pd.read_csv(
+            StringIO(data_text), dtype=str, keep_default_na=False, na_values=[""]
+        )
 
     # Validate and transform the schema
-    validate_and_transform_schema(extracted_schema, expected_schema, data_rows)
+    df, failures = schema.coerce(df)
+    raise_conversion_failures(failures, expected_schema)
+
+    logger.debug("Schema validation and transformation passed.")
+    return df
+
+
+def raise_conversion_failures(failures, expected_schema):
+    """
+    Logs the values `CompiledSchema.coerce` failed to convert and raises on the first one.
+
+    Args:
+        failures (pd.DataFrame): The failures returned by `CompiledSchema.coerce`.
+        expected_schema (dict): The expected schema of the data.
+
+    Raises:
+        ValueError: If there is any failure.
+    """
+    if failures.empty:
+        return
+    logger.error(
+        f"Failed to convert {len(failures)} values:\n{failures.head(10).to_string(index=False)}"
+    )
+    first = failures.iloc[0]
+    raise ValueError(
+        f"Data type mismatch for column {first['column']}: expected {expected_schema[first['column']]}, "
+        f"got {first['value']!r} in row {first['row']} and {len(failures) - 1} other values"
+    )
+
+
+def read_and_validate_csv(data, expected_schema=USGS_SCHEMA):
+    """
+    Parses CSV data once with the expected dtypes and validates the resulting columns.
+
+    Integer columns are parsed as float64, since the feed leaves them empty when unknown,
+    and are always converted to the nullable Int64 dtype.
+
+    Args:
+        data (bytes or str): The CSV data, including the header row.
+        expected_schema (dict, optional): The expected schema. Default is USGS_SCHEMA.
+
+    Returns:
+        pd.DataFrame: The parsed and validated data.
+
+    Raises:
+        ValueError: If the data cannot be parsed with the expected schema or fails validation.
+    """
+    buffer = BytesIO(data) if isinstance(data, bytes) else StringIO(data)
+
+    try:
+        df = pd.read_csv(buffer, dtype=compile_schema(expected_schema).csv_dtypes)
+    except ValueError as ex:
+        logger.error(f"Failed to parse data with the expected schema: {ex}")
+        raise ValueError(f"Failed to parse data with the expected schema: {ex}")
+
+    validate_dataframe_schema(df, expected_schema)
 
     logger.debug("Schema validation and transformation passed.")
-    return data_rows
+    return df
+
+
+def read_and_validate_csv_chunks(file_obj, chunksize, expected_schema=USGS_SCHEMA):
+    """
+    Parses CSV data from a file-like object in chunks, validating each chunk as it is read.
+
+    Only one chunk is held in memory at a time, however large the data is.
+
+    Args:
+        file_obj (file-like): The CSV data, including the header row, e.g. a streamed HTTP response.
+        chunksize (int): The number of rows per chunk.
+        expected_schema (dict, optional): The expected schema. Default is USGS_SCHEMA.
+
+    Yields:
+        pd.DataFrame: The parsed and validated chunks.
+
+    Raises:
+        ValueError: If a chunk cannot be parsed with the expected schema or fails validation.
+    """
+    with pd.read_csv(
+        file_obj, dtype=compile_schema(expected_schema).csv_dtypes, chunksize=chunksize
+    ) as reader:
+        while True:
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            except ValueError as ex:
+                logger.error(f"Failed to parse data with the expected schema: {ex}")
+                raise ValueError(f"Failed to parse data with the expected schema: {ex}")
+
+            validate_dataframe_schema(chunk, expected_schema)
+            yield chunk
+
+
+def validate_dataframe_schema(
+    df, expected_schema=USGS_SCHEMA, required_columns=USGS_REQUIRED_COLUMNS
+):
+    """
+    Validates the columns of a DataFrame against the expected schema, in place.
+
+    The numeric columns are converted by `CompiledSchema.coerce`, so integer columns
+    always become the nullable Int64 dtype, whatever the values of the batch are.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to validate.
+        expected_schema (dict, optional): The expected schema. Default is USGS_SCHEMA.
+        required_columns (list, optional): Columns that must not contain nulls.
+        Default is USGS_REQUIRED_COLUMNS.
+
+    Raises:
+        ValueError: If a column is missing, a numeric column has values that cannot be
+        converted, an integer column has non-integral values or a required column has nulls.
+    """
+    schema = compile_schema(expected_schema)
+    coerced, failures = schema.coerce(df)
+    raise_conversion_failures(failures, expected_schema)
+
+    # The dtype never depends on the values, so every batch hashes the same way
+    for column in schema.numeric_columns:
+        df[column] = coerced[column]
+
+    for column in required_columns:
+        if column in df.columns and df[column].isna().any():
+            logger.error(f"Null values found in required column: {column}")
+            raise ValueError(f"Null values found in required column: {column}")
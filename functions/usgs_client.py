@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from functions.logger import get_logger
+from functions.rate_limit import throttle
+
+logger = get_logger("usgs-client")
+
+# Responses worth another attempt, as the failure is on the server side or temporary
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class USGSClient:
+    """
+    HTTP client for the USGS API, with pooled connections, timeouts and retries.
+
+    Failed requests are retried with jittered exponential backoff. Responses 429 and 503
+    carrying a `Retry-After` header wait for the time requested by the server instead.
+
+    Args:
+        timeout (tuple, optional): The connect and read timeouts in seconds. Default is (5, 60).
+        max_retries (int, optional): Attempts made after the first failure. Default is 4.
+        backoff_factor (float, optional): Base of the backoff in seconds. Default is 0.5.
+        max_backoff (float, optional): Longest wait between two attempts. Default is 30.
+        pool_maxsize (int, optional): Connections kept open per host. Default is 10.
+    """
+
+    def __init__(
+        self,
+        timeout=(5, 60),
+        max_retries=4,
+        backoff_factor=0.5,
+        max_backoff=30,
+        pool_maxsize=10,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip"
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, rate_limiter=None, host_limiter=None, **kwargs):
+        """
+        Sends a GET request, retrying temporary failures.
+
+        Args:
+            url (str): The URL to request.
+            rate_limiter (TokenBucket, optional): Global rate limit applied to every attempt.
+            host_limiter (HostConcurrencyLimiter, optional): Per-host cap applied to every attempt.
+            **kwargs: Further arguments for `requests.Session.get`, e.g. `stream=True`.
+
+        Returns:
+            requests.Response: The successful response.
+
+        Raises:
+            requests.HTTPError: If the response is still an error after all retries.
+            requests.RequestException: If the request still fails after all retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                with throttle(url, rate_limiter, host_limiter):
+                    response = self.session.get(url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                if last_attempt:
+                    raise
+                wait = self._backoff(attempt)
+                logger.warning(f"Request failed ({ex}), retrying in {wait:.1f}s.")
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    response.raise_for_status()
+                    return response
+                wait = self._retry_after(response)
+                if wait is None:
+                    wait = self._backoff(attempt)
+                response.close()
+                logger.warning(
+                    f"Received HTTP {response.status_code}, retrying in {wait:.1f}s."
+                )
+            time.sleep(wait)
+
+    def _backoff(self, attempt):
+        # Full jitter, so concurrent workers do not retry at the same time
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff_factor * 2**attempt)
+        )
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if response.status_code not in (429, 503) or value is None:
+            return None
+        try:
+            wait = float(value)
+        except ValueError:
+            try:
+                wait = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self.max_backoff, max(0.0, wait))
+
+
+def get_usgs_client():
+    """
+    Returns the USGS client shared by the whole process, creating it on first use.
+
+    Returns:
+        USGSClient: The shared client.
+    """
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            logger.debug("Create USGS client.")
+            _client = USGSClient()
+        return _client
+
+
+def set_usgs_client(client):
+    """
+    Replaces the shared USGS client, e.g. to change its timeouts or retries.
+
+    Args:
+        client (USGSClient): The client returned by `get_usgs_client` from now on. Pass None
+        to create a default client on the next call.
+    """
+    global _client
+
+    with _client_lock:
+        _client = client
@@ -0,0 +1,136 @@
+"""Transforms and loads the raw cache again, without any request to USGS.
+
+Run from the root directory with:
+    python replay.py
+    python replay.py --config config.toml --locations pleo_dk --start-date 2024-01-01
+    python replay.py --with-raw
+"""
+
+import argparse
+import os
+import sys
+from functions.config import load_config, select_locations
+from functions.logger import get_logger
+
+logger = get_logger("replay")
+
+# Read when present and no --config is given, otherwise the defaults are used
+DEFAULT_CONFIG_PATH = "config.toml"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--config",
+        help=f"TOML or YAML configuration file. Default is {DEFAULT_CONFIG_PATH} when it exists.",
+    )
+    parser.add_argument(
+        "--locations",
+        nargs="+",
+        help="Only replay these configured locations. Default is every cached location.",
+    )
+    parser.add_argument(
+        "--start-date",
+        help="Only replay files extracted on or after this date (YYYY-MM-DD).",
+    )
+    parser.add_argument(
+        "--end-date",
+        help="Only replay files extracted on or before this date (YYYY-MM-DD).",
+    )
+    parser.add_argument(
+        "--with-raw",
+        action="store_true",
+        help="Reload the raw tables to sink.dataset_raw too. Default is only the curated table.",
+    )
+    return parser.parse_args(argv)
+
+
+def run_replay(config, locations=None, start_date=None, end_date=None, with_raw=False):
+    """
+    Replays the raw cache of the configuration to its sink.
+
+    Args:
+        config (dict): The configuration returned by `load_config`.
+        locations (list, optional): Only replay these locations. Default is all.
+        start_date (str, optional): Only replay files extracted on or after this date.
+        end_date (str, optional): Only replay files extracted on or before this date.
+        with_raw (bool, optional): Reload the raw tables too. Default is False.
+
+    Returns:
+        int: The number of curated rows replayed.
+    """
+    # Imported here, so that --help and configuration errors do not load pandas and the sinks
+    from functions.bigquery_functions import BatchLoader
+    from functions.curated import CURATED_COLUMNS
+    from functions.metrics import get_metrics
+    from functions.raw_cache import RawCache, replay
+    from functions.sinks import make_sink
+    from functions.tables import CURATED_TABLE, RAW_TABLE
+
+    state = config["state"]
+    sink = config["sink"]
+
+    raw_cache = RawCache(state["raw_cache_dir"])
+    loader = BatchLoader(
+        project_id=sink["project_id"],
+        max_rows=sink["load_batch_rows"],
+        max_bytes=sink["load_batch_bytes"],
+        if_exists=sink["load_mode"],
+        sink=make_sink(sink),
+    )
+
+    logger.info(
+        f"Replaying {len(raw_cache.manifest())} cached files from {state['raw_cache_dir']}."
+    )
+
+    # Transform and load the cached raw data again, without any request to USGS
+    total_rows = replay(
+        cache=raw_cache,
+        loader=loader,
+        dataset_raw=sink["dataset_raw"] if with_raw else None,
+        dataset_curated=sink["dataset_curated"],
+        columns_to_keep=CURATED_COLUMNS,
+        raw_merge_keys=sink["raw_merge_keys"],
+        curated_merge_keys=sink["curated_merge_keys"],
+        locations=locations,
+        start_date=start_date,
+        end_date=end_date,
+        raw_spec=RAW_TABLE,
+        curated_spec=CURATED_TABLE,
+    )
+
+    loader.sink.close()
+    logger.info(f"Loaded {loader.rows_loaded} rows in {loader.jobs} load jobs.")
+    get_metrics().log_summary()
+    logger.info("Replay process finished.")
+    return total_rows
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    path = args.config
+    if path is None and os.path.exists(DEFAULT_CONFIG_PATH):
+        path = DEFAULT_CONFIG_PATH
+
+    try:
+        config = load_config(path)
+        if args.locations:
+            config = select_locations(config, args.locations)
+        if args.with_raw and not config["sink"]["dataset_raw"]:
+            raise ValueError("--with-raw requires sink.dataset_raw.")
+    except ValueError as ex:
+        logger.error(f"Invalid configuration: {ex}")
+        return 2
+
+    run_replay(
+        config,
+        locations=args.locations,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        with_raw=args.with_raw,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Local stand-in for the USGS API, used by the tests that need real HTTP requests"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubUSGSServer:
+    """
+    Serves USGS-like `/count` and `/query` responses from a local thread.
+
+    Args:
+        csv_body (str, optional): The body returned by the `/query` endpoint.
+        count (int, optional): The number returned by the `/count` endpoint.
+        delay (float, optional): Seconds to wait before answering every request.
+
+    Attributes:
+        url (str): The base URL of the server, e.g. "http://127.0.0.1:1234".
+        requests (list): The (monotonic time, path) of every request received.
+        request_headers (list): The headers of every request received.
+        max_in_flight (int): The highest number of requests handled at the same time.
+        failures (list): (status, headers) responses returned, in order, before the normal ones.
+        etag (str): If set, the `ETag` of the `/count` responses. Requests sending it in
+        `If-None-Match` are answered with a 304.
+    """
+
+    def __init__(self, csv_body="", count=0, delay=0.0):
+        self.csv_body = csv_body
+        self.count = count
+        self.delay = delay
+        self.requests = []
+        self.request_headers = []
+        self.failures = []
+        self.etag = None
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def body_for(self, path):
+        """Returns the body served for `path`. Override to vary responses per request."""
+        if path.startswith("/fdsnws/event/1/count"):
+            return str(self.count)
+        return self.csv_body
+
+    def stream_for(self, path):
+        """Returns an iterator of bytes streamed for `path`, or None to serve `body_for`."""
+        return None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests.append((time.monotonic(), self.path))
+                    stub.request_headers.append(dict(self.headers))
+                    stub._in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub._in_flight)
+                    failure = stub.failures.pop(0) if stub.failures else None
+                try:
+                    time.sleep(stub.delay)
+                    if failure is not None:
+                        status, headers = failure
+                        self.send_response(status)
+                        for name, value in headers.items():
+                            self.send_header(name, value)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+
+                    if stub.etag and self.path.startswith("/fdsnws/event/1/count"):
+                        if self.headers.get("If-None-Match") == stub.etag:
+                            self.send_response(304)
+                            self.send_header("ETag", stub.etag)
+                            self.end_headers()
+                            return
+
+                    chunks = stub.stream_for(self.path)
+                    if chunks is not None:
+                        # Without Content-Length, the end of the body is the closed connection
+                        self.send_response(200)
+                        self.send_header("Content-Type", "text/plain")
+                        self.end_headers()
+                        for chunk in chunks:
+                            self.wfile.write(chunk)
+                        return
+
+                    body = stub.body_for(self.path).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(body)))
+                    if stub.etag and self.path.startswith("/fdsnws/event/1/count"):
+                        self.send_header("ETag", stub.etag)
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up, e.g. after a timeout
+                finally:
+                    with stub._lock:
+                        stub._in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,164 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pandas.testing import assert_frame_equal
+from benchmarks.fixtures import make_usgs_csv
+from functions.backfill import read_batch, transform_shard, write_batch
+from functions.bigquery_client import set_bigquery_client
+from functions.config import load_config
+from functions.curated import CuratedBatch
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.formats import decode_response
+from functions.geocode_cache import GEOCODER_VERSION, normalize_address
+from functions.runner import run_pipeline
+from functions.transformation import minor_transform_dataframe
+from functions.usgs_client import set_usgs_client
+from tests.stub_usgs_server import StubUSGSServer
+
+LOCATIONS = {
+    "pleo_dk": "Sortedam Dossering 7 - 4th floor  2200 Copenhagen N",
+    "pleo_es": "Calle Gran Via, 39 6th floor 28013 Madrid",
+}
+COORDINATES = {"pleo_dk": [55.69, 12.57], "pleo_es": [40.42, -3.70]}
+
+
+class BackfillTests(unittest.TestCase):
+    """
+    Unit tests for the multi-process backfill.
+
+    Test Cases:
+        - test_write_and_read_batch: Verify that Arrow IPC batches keep the column types, compact ones included.
+        - test_transform_shard: Verify that a shard is transformed as in the threaded pipeline.
+        - test_transform_shard_splits_regions: Verify that a merged region is split by location.
+        - test_run_pipeline_in_processes: Verify that a backfill in worker processes loads the same rows as the threaded pipeline.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.csv = make_usgs_csv(50, null_fraction=0.3)
+
+    def make_shard(self, locations):
+        response_path = os.path.join(self.directory.name, "response")
+        with open(response_path, "w") as file:
+            file.write(self.csv)
+        return {
+            "region_name": "+".join(locations),
+            "response_path": response_path,
+            "file_format": "csv",
+            "locations": locations,
+            "maxradiuskm": 500,
+            "output_dir": self.directory.name,
+        }
+
+    def test_write_and_read_batch(self):
+        df = minor_transform_dataframe("pleo_dk", decode_response(self.csv.encode()))
+        curated = CuratedBatch.from_raw("pleo_dk", decode_response(self.csv.encode()))
+
+        for frame in [df, curated.df]:
+            path = write_batch(frame, self.directory.name)
+
+            assert_frame_equal(read_batch(path), frame.reset_index(drop=True))
+            self.assertFalse(os.path.exists(path))
+
+    def test_transform_shard(self):
+        batches = transform_shard(self.make_shard({"pleo_dk": COORDINATES["pleo_dk"]}))
+
+        self.assertEqual(
+            [(batch["location_name"], batch["rows"]) for batch in batches],
+            [("pleo_dk", 50)],
+        )
+        expected = minor_transform_dataframe(
+            "pleo_dk", decode_response(self.csv.encode())
+        )
+        raw_df = read_batch(batches[0]["raw_path"])
+        curated_df = read_batch(batches[0]["curated_path"])
+        self.assertEqual(list(raw_df["id"]), list(expected["id"]))
+        self.assertEqual(list(curated_df["hashed_id"]), list(expected["hashed_id"]))
+        self.assertEqual(str(raw_df["gap"].dtype), "float64")
+
+    def test_transform_shard_splits_regions(self):
+        batches = transform_shard(self.make_shard(COORDINATES))
+
+        self.assertEqual(
+            [batch["location_name"] for batch in batches], ["pleo_dk", "pleo_es"]
+        )
+        for batch in batches:
+            raw_df = read_batch(batch["raw_path"])
+            curated_df = read_batch(batch["curated_path"])
+            self.assertEqual(len(raw_df), batch["rows"])
+            self.assertEqual(len(curated_df), batch["rows"])
+            self.assertEqual(set(curated_df["location"]), {batch["location_name"]})
+        self.assertLess(sum(batch["rows"] for batch in batches), 100)
+
+    def run_pipeline(self, transform_processes):
+        directory = tempfile.mkdtemp(dir=self.directory.name)
+        with open(os.path.join(directory, "geocode_cache.json"), "w") as file:
+            json.dump(
+                {
+                    "version": GEOCODER_VERSION,
+                    "entries": {
+                        normalize_address(LOCATIONS[name]): {
+                            "coordinates": coordinates,
+                            "cached_at": time.time(),
+                        }
+                        for name, coordinates in COORDINATES.items()
+                    },
+                },
+                file,
+            )
+
+        client = FakeBigQueryClient()
+        set_bigquery_client(client)
+        self.addCleanup(set_bigquery_client, None)
+        self.addCleanup(set_usgs_client, None)
+
+        with StubUSGSServer(csv_body=self.csv, count=50) as server:
+            config = load_config(
+                overrides={
+                    "locations": LOCATIONS,
+                    "extraction": {"usgs_url": server.url, "end_time": "2024-02-01"},
+                    "concurrency": {
+                        "requests_per_second": 100,
+                        "transform_processes": transform_processes,
+                    },
+                    "state": {
+                        "state_path": os.path.join(directory, "watermarks.json"),
+                        "geocode_cache_path": os.path.join(
+                            directory, "geocode_cache.json"
+                        ),
+                        "request_cache_path": os.path.join(
+                            directory, "request_cache.json"
+                        ),
+                        "raw_cache_dir": os.path.join(directory, "raw"),
+                        "metrics_path": None,
+                    },
+                    "sink": {"project_id": "project"},
+                }
+            )
+            total_rows = run_pipeline(config)
+
+        with open(os.path.join(directory, "watermarks.json")) as file:
+            watermarks = json.load(file)
+        return total_rows, client.tables, watermarks
+
+    def test_run_pipeline_in_processes(self):
+        threaded_rows, threaded_tables, threaded_watermarks = self.run_pipeline(0)
+        rows, tables, watermarks = self.run_pipeline(2)
+
+        self.assertEqual(rows, threaded_rows)
+        self.assertEqual(watermarks, threaded_watermarks)
+        self.assertEqual(set(tables), set(threaded_tables))
+        for table_id, table in tables.items():
+            columns = [column for column in table.columns if column != "inserted_at"]
+            key = "hashed_id" if "hashed_id" in columns else "id"
+            assert_frame_equal(
+                table[columns].sort_values(key, ignore_index=True),
+                threaded_tables[table_id][columns].sort_values(key, ignore_index=True),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
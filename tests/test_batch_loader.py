@@ -0,0 +1,76 @@
+import unittest
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from functions.bigquery_functions import BatchLoader
+from functions.fake_bigquery import FakeBigQueryClient
+
+
+class BatchLoaderTests(unittest.TestCase):
+    """
+    Unit tests for the BatchLoader class, against the local fake BigQuery client.
+
+    Test Cases:
+        - test_batch_loader_one_job_per_table: Verify that buffered frames are loaded with one Parquet job per table.
+        - test_batch_loader_flushes_on_max_rows: Verify that a table is flushed when it reaches max_rows.
+        - test_batch_loader_flushes_on_max_bytes: Verify that a table is flushed when it reaches max_bytes.
+        - test_batch_loader_keeps_caller_columns_out: Verify that columns added after buffering are not loaded.
+        - test_batch_loader_does_not_flush_on_error: Verify that nothing is loaded if the run fails.
+    """
+
+    def setUp(self):
+        self.client = FakeBigQueryClient()
+        self.df = pd.DataFrame({"id": ["us1", "us2"], "mag": [1.5, 2.0]})
+
+    def test_batch_loader_one_job_per_table(self):
+        with BatchLoader("project", client=self.client) as loader:
+            for _ in range(3):
+                loader.add(self.df, "raw_data", "pleo_dk")
+            loader.add(self.df, "curated_data", "earthquakes")
+            loader.add(pd.DataFrame(), "raw_data", "pleo_de")
+            self.assertEqual(self.client.jobs, [])
+
+        self.assertEqual(
+            sorted(self.client.jobs),
+            [
+                ("project.curated_data.earthquakes", 2, "PARQUET"),
+                ("project.raw_data.pleo_dk", 6, "PARQUET"),
+            ],
+        )
+        assert_frame_equal(
+            self.client.tables["project.raw_data.pleo_dk"],
+            pd.concat([self.df] * 3, ignore_index=True),
+        )
+        self.assertEqual((loader.jobs, loader.rows_loaded), (2, 8))
+
+    def test_batch_loader_flushes_on_max_rows(self):
+        loader = BatchLoader("project", max_rows=4, client=self.client)
+        loader.add(self.df, "raw_data", "pleo_dk")
+        self.assertEqual(self.client.jobs, [])
+        loader.add(self.df, "raw_data", "pleo_dk")
+        self.assertEqual(self.client.jobs, [("project.raw_data.pleo_dk", 4, "PARQUET")])
+
+    def test_batch_loader_flushes_on_max_bytes(self):
+        loader = BatchLoader("project", max_bytes=1, client=self.client)
+        loader.add(self.df, "raw_data", "pleo_dk")
+        self.assertEqual(len(self.client.jobs), 1)
+
+    def test_batch_loader_keeps_caller_columns_out(self):
+        with BatchLoader("project", client=self.client) as loader:
+            loader.add(self.df, "raw_data", "pleo_dk")
+            self.df["location"] = "pleo_dk"
+
+        self.assertEqual(
+            list(self.client.tables["project.raw_data.pleo_dk"].columns), ["id", "mag"]
+        )
+
+    def test_batch_loader_does_not_flush_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with BatchLoader("project", client=self.client) as loader:
+                loader.add(self.df, "raw_data", "pleo_dk")
+                raise RuntimeError("Extraction failed")
+
+        self.assertEqual(self.client.jobs, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
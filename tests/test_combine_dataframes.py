@@ -0,0 +1,45 @@
+import unittest
+import pandas as pd
+from functions.transformation import combine_dataframes, minor_transform_dataframe
+
+
+class CombineDataframes(unittest.TestCase):
+    """
+    Unit tests for the minor_transform_dataframe and combine_dataframes functions.
+
+    Test Cases:
+        - test_minor_transform_dataframe: Verify that the location, timestamp and hash columns are added and duplicates removed.
+        - test_combine_dataframes: Verify that all locations are combined with only the columns to keep.
+        - test_combine_dataframes_empty: Verify that no frames give an empty DataFrame with the columns to keep.
+    """
+
+    def setUp(self):
+        self.columns_to_keep = ["hashed_id", "id", "location"]
+        self.df1 = pd.DataFrame({"id": ["1", "2", "2"], "value": ["a", "b", "b"]})
+        self.df2 = pd.DataFrame({"id": ["3"], "value": ["c"]})
+
+    def test_minor_transform_dataframe(self):
+        result = minor_transform_dataframe("Location1", self.df1)
+        self.assertEqual(result["id"].tolist(), ["1", "2"])
+        self.assertEqual(set(result["location"]), {"Location1"})
+        self.assertIn("inserted_at", result.columns)
+        self.assertEqual(result["hashed_id"].dtype, "int64")
+
+    def test_combine_dataframes(self):
+        frames = [
+            minor_transform_dataframe("Location1", self.df1),
+            minor_transform_dataframe("Location2", self.df2),
+        ]
+        result = combine_dataframes(frames, self.columns_to_keep)
+        self.assertEqual(list(result.columns), self.columns_to_keep)
+        self.assertEqual(result["id"].tolist(), ["1", "2", "3"])
+        self.assertEqual(result.index.tolist(), [0, 1, 2])
+
+    def test_combine_dataframes_empty(self):
+        result = combine_dataframes([], self.columns_to_keep)
+        self.assertTrue(result.empty)
+        self.assertEqual(list(result.columns), self.columns_to_keep)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import subprocess
+import sys
+import unittest
+import pandas as pd
+from functions.transformation import compute_hashed_id
+
+
+class ComputeHashedId(unittest.TestCase):
+    """
+    Unit tests for the compute_hashed_id function.
+
+    Test Cases:
+        - test_compute_hashed_id_is_deterministic: Verify that the same rows always produce the same hashes.
+        - test_compute_hashed_id_is_stable_across_processes: Verify that the hashes do not depend on the process hash seed.
+        - test_compute_hashed_id_ignores_excluded_columns: Verify that 'id' and 'inserted_at' do not change the hash.
+        - test_compute_hashed_id_differs_per_row: Verify that different rows produce different hashes.
+    """
+
+    def setUp(self):
+        self.df = pd.DataFrame(
+            {
+                "id": ["us1", "us2", "us3"],
+                "mag": [1.5, 2.0, None],
+                "place": ["Berlin", "Madrid", "Lisbon"],
+            }
+        )
+
+    def test_compute_hashed_id_is_deterministic(self):
+        result = compute_hashed_id(self.df)
+        self.assertEqual(result.dtype, "int64")
+        self.assertTrue(result.equals(compute_hashed_id(self.df.copy())))
+
+    def test_compute_hashed_id_is_stable_across_processes(self):
+        code = (
+            "import pandas as pd\n"
+            "from functions.transformation import compute_hashed_id\n"
+            "df = pd.DataFrame({'id': ['us1'], 'mag': [1.5], 'place': ['Berlin']})\n"
+            "print(compute_hashed_id(df).iloc[0])\n"
+        )
+        outputs = {
+            subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                text=True,
+                env={"PYTHONHASHSEED": seed},
+                check=True,
+            ).stdout
+            for seed in ("1", "2")
+        }
+        self.assertEqual(outputs, {f"{compute_hashed_id(self.df).iloc[0]}\n"})
+
+    def test_compute_hashed_id_ignores_excluded_columns(self):
+        other = self.df.copy()
+        other["id"] = ["a", "b", "c"]
+        other["inserted_at"] = pd.Timestamp.now()
+        self.assertTrue(compute_hashed_id(self.df).equals(compute_hashed_id(other)))
+
+    def test_compute_hashed_id_differs_per_row(self):
+        self.assertEqual(compute_hashed_id(self.df).nunique(), len(self.df))
+
+
+if __name__ == "__main__":
+    unittest.main()
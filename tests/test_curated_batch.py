@@ -0,0 +1,103 @@
+import unittest
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal, assert_series_equal
+from functions.bigquery_functions import BatchLoader
+from functions.curated import CURATED_COLUMNS, CuratedBatch, compact_raw
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.transformation import compute_hashed_id, minor_transform_dataframe
+from benchmarks.fixtures import make_usgs_dataframe
+
+
+class CuratedBatchTests(unittest.TestCase):
+    """
+    Unit tests for the compact curated batches.
+
+    Test Cases:
+        - test_from_raw_matches_minor_transform: Verify that the batch holds the rows and hashes of `minor_transform_dataframe`.
+        - test_from_raw_compact_types: Verify the column types of the batch and that it uses less memory.
+        - test_downcast_only_when_exact: Verify that floats with more decimals than allowed stay float64.
+        - test_compact_raw_keeps_hashes: Verify that categorical raw columns hash as strings do.
+        - test_batch_loader_loads_batches: Verify that the loader buffers batches and loads them with plain types.
+    """
+
+    def setUp(self):
+        self.df = make_usgs_dataframe(200, null_fraction=0.3)
+        self.df.loc[3, "mag"] = np.nan
+        self.df.loc[5, "place"] = None
+        # Same id returned twice, as by two overlapping windows
+        self.df = pd.concat([self.df, self.df.iloc[[7]]], ignore_index=True)
+        self.inserted_at = datetime(2024, 1, 2, 3, 4, 5)
+
+    def test_from_raw_matches_minor_transform(self):
+        batch = CuratedBatch.from_raw("pleo_dk", self.df, self.inserted_at)
+        expected = minor_transform_dataframe("pleo_dk", self.df.copy())
+        expected["inserted_at"] = self.inserted_at
+
+        self.assertEqual(len(batch), 200)
+        self.assertNotIn("location", self.df)
+        actual = batch.to_frame()
+        self.assertEqual(list(actual.columns), CURATED_COLUMNS)
+        expected = expected[CURATED_COLUMNS].reset_index(drop=True)
+        expected["time"] = pd.to_datetime(expected["time"], utc=True)
+        assert_frame_equal(actual, expected)
+
+    def test_from_raw_compact_types(self):
+        batch = CuratedBatch.from_raw("pleo_dk", self.df, self.inserted_at)
+
+        self.assertEqual(str(batch.df["time"].dtype), "datetime64[ns, UTC]")
+        self.assertEqual(str(batch.df["location"].dtype), "category")
+        self.assertEqual(batch.df["place"].dtype, pd.StringDtype("pyarrow"))
+        for column in ["mag", "latitude", "longitude"]:
+            self.assertEqual(batch.df[column].dtype, np.float32)
+        self.assertNotIn("inserted_at", batch.df)
+
+        plain = minor_transform_dataframe("pleo_dk", self.df.copy())[CURATED_COLUMNS]
+        self.assertLess(batch.nbytes, plain.memory_usage(deep=True, index=False).sum())
+
+    def test_downcast_only_when_exact(self):
+        self.df["latitude"] = self.df["latitude"] + 1e-7
+        self.df.loc[0, "longitude"] = 179.9999
+
+        batch = CuratedBatch.from_raw("pleo_dk", self.df, self.inserted_at)
+
+        self.assertEqual(batch.df["latitude"].dtype, np.float64)
+        self.assertEqual(batch.df["longitude"].dtype, np.float32)
+        restored = batch.to_frame()
+        assert_series_equal(
+            restored["longitude"],
+            self.df["longitude"].iloc[:200],
+            check_names=False,
+        )
+
+    def test_compact_raw_keeps_hashes(self):
+        compact = compact_raw(self.df)
+
+        self.assertEqual(str(compact["net"].dtype), "category")
+        self.assertEqual(self.df["net"].dtype, object)
+        assert_series_equal(compute_hashed_id(compact), compute_hashed_id(self.df))
+
+    def test_batch_loader_loads_batches(self):
+        client = FakeBigQueryClient()
+        loader = BatchLoader(project_id="project", if_exists="append", client=client)
+        batches = [
+            CuratedBatch.from_raw(name, self.df, self.inserted_at)
+            for name in ["pleo_dk", "pleo_es"]
+        ]
+
+        for batch in batches:
+            loader.add(batch, "curated_data", "earthquakes")
+        loader.flush()
+
+        table = client.tables["project.curated_data.earthquakes"]
+        self.assertEqual(len(table), 400)
+        self.assertEqual(set(table["location"]), {"pleo_dk", "pleo_es"})
+        self.assertEqual(
+            sorted(table["mag"].dropna()),
+            sorted(pd.concat([batch.to_frame()["mag"] for batch in batches]).dropna()),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
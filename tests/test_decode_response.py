@@ -0,0 +1,70 @@
+import json
+import unittest
+from pandas.testing import assert_frame_equal
+from benchmarks.fixtures import make_usgs_csv, make_usgs_geojson, make_usgs_text
+from functions.formats import decode_response
+from functions.transformation import USGS_SCHEMA
+
+
+class DecodeResponse(unittest.TestCase):
+    """
+    Unit tests for the decode_response function.
+
+    Test Cases:
+        - test_decode_response_same_curated_columns: Verify that every format gives the same curated columns.
+        - test_decode_response_schema: Verify that every format gives all the columns of the CSV schema.
+        - test_decode_response_empty_geojson: Verify that a GeoJSON response without features is decoded.
+        - test_decode_response_indented_geojson: Verify that indented GeoJSON with other fields and integral magnitudes is decoded.
+        - test_decode_response_unsupported_format: Verify that an unknown format raises a ValueError.
+    """
+
+    def setUp(self):
+        self.bodies = {
+            "csv": make_usgs_csv(20).encode(),
+            "text": make_usgs_text(20).encode(),
+            "geojson": make_usgs_geojson(20).encode(),
+        }
+        self.curated_columns = ["id", "time", "mag", "latitude", "longitude", "place"]
+
+    def test_decode_response_same_curated_columns(self):
+        expected = decode_response(self.bodies["csv"], "csv")[self.curated_columns]
+        for file_format in ("text", "geojson"):
+            result = decode_response(self.bodies[file_format], file_format)
+            assert_frame_equal(result[self.curated_columns], expected)
+
+    def test_decode_response_schema(self):
+        for file_format, content in self.bodies.items():
+            result = decode_response(content, file_format)
+            self.assertEqual(list(result.columns), list(USGS_SCHEMA))
+            self.assertEqual(result["latitude"].dtype, "float64")
+
+    def test_decode_response_empty_geojson(self):
+        result = decode_response(
+            b'{"type": "FeatureCollection", "features": []}', "geojson"
+        )
+        self.assertTrue(result.empty)
+        self.assertEqual(list(result.columns), list(USGS_SCHEMA))
+
+    def test_decode_response_indented_geojson(self):
+        body = json.loads(self.bodies["geojson"])
+        body["metadata"] = {"count": 20}
+        body["features"][0]["properties"]["mag"] = 2
+        body["features"][0]["properties"]["tsunami"] = 0
+        body["features"][1]["properties"]["mag"] = None
+
+        result = decode_response(json.dumps(body, indent=2).encode(), "geojson")
+        expected = decode_response(self.bodies["geojson"], "geojson")
+
+        self.assertEqual(result["mag"].tolist()[0], 2.0)
+        self.assertTrue(result["mag"].isna().iloc[1])
+        assert_frame_equal(
+            result.drop(columns="mag").iloc[2:], expected.drop(columns="mag").iloc[2:]
+        )
+
+    def test_decode_response_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            decode_response(b"", "quakeml")
+
+
+if __name__ == "__main__":
+    unittest.main()
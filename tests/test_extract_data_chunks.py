@@ -0,0 +1,84 @@
+import os
+import unittest
+from benchmarks.fixtures import make_usgs_csv
+from functions.extraction import extract_data_chunks
+from tests.stub_usgs_server import StubUSGSServer
+
+
+class StreamingUSGSServer(StubUSGSServer):
+    """Stub server streaming a synthetic feed of `n_rows` events, generated on the fly."""
+
+    def __init__(self, n_rows):
+        super().__init__()
+        self.n_rows = n_rows
+        header, self.row = make_usgs_csv(1).splitlines()
+        self.header = f"{header}\n".encode()
+
+    def stream_for(self, path):
+        event_id = self.row.split(",")[11]
+
+        def generate(block_size=10_000):
+            yield self.header
+            for start in range(0, self.n_rows, block_size):
+                rows = range(start, min(start + block_size, self.n_rows))
+                yield "".join(
+                    f"{self.row.replace(event_id, f'us{i}')}\n" for i in rows
+                ).encode()
+
+        return generate()
+
+
+def current_rss():
+    """Returns the resident set size of the process in bytes (Linux only)."""
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class ExtractDataChunks(unittest.TestCase):
+    """
+    Unit tests for the extract_data_chunks function, against a local streaming server.
+
+    Test Cases:
+        - test_extract_data_chunks_yields_validated_chunks: Verify that all rows arrive in chunks of the given size.
+        - test_extract_data_chunks_memory_is_flat: Verify that peak RSS grows far less than the size of a million-row feed.
+        - test_extract_data_chunks_invalid_data: Verify that a feed with a missing column raises a ValueError.
+    """
+
+    def test_extract_data_chunks_yields_validated_chunks(self):
+        with StreamingUSGSServer(n_rows=25_000) as server:
+            chunks = list(
+                extract_data_chunks(
+                    f"{server.url}/fdsnws/event/1/query", "pleo_dk", chunksize=10_000
+                )
+            )
+
+        self.assertEqual([len(chunk) for chunk in chunks], [10_000, 10_000, 5_000])
+        self.assertEqual(chunks[-1]["id"].iloc[-1], "us24999")
+        self.assertEqual(chunks[0]["magNst"].dtype, "float64")
+
+    @unittest.skipUnless(os.path.exists("/proc/self/statm"), "Requires Linux")
+    def test_extract_data_chunks_memory_is_flat(self):
+        n_rows = 1_000_000
+        with StreamingUSGSServer(n_rows=n_rows) as server:
+            payload_bytes = len(server.header) + n_rows * (len(server.row) + 1)
+            baseline = peak = current_rss()
+            rows = 0
+            for chunk in extract_data_chunks(
+                f"{server.url}/fdsnws/event/1/query", "pleo_dk", chunksize=20_000
+            ):
+                rows += len(chunk)
+                peak = max(peak, current_rss())
+
+        self.assertEqual(rows, n_rows)
+        self.assertLess(peak - baseline, payload_bytes / 4)
+
+    def test_extract_data_chunks_invalid_data(self):
+        with StubUSGSServer(csv_body="time,id\n2024-01-01,us1\n") as server:
+            with self.assertRaises(ValueError):
+                list(
+                    extract_data_chunks(f"{server.url}/fdsnws/event/1/query", "pleo_dk")
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
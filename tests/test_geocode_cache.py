@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest.mock import patch, MagicMock
+from functions.extraction import get_coordinates
+from functions.geocode_cache import GeocodeCache
+
+
+class GeocodeCacheTests(unittest.TestCase):
+    """
+    Unit tests for the GeocodeCache class and its use in get_coordinates.
+
+    Test Cases:
+        - test_geocode_cache_normalizes_address: Verify that case and whitespace do not cause a miss.
+        - test_geocode_cache_ttl: Verify that expired entries are treated as misses.
+        - test_geocode_cache_version: Verify that entries saved with another version are discarded.
+        - test_get_coordinates_only_geocodes_misses: Verify that cached addresses are not sent to the geocoder.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "geocode_cache.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_geocode_cache_normalizes_address(self):
+        cache = GeocodeCache(self.path)
+        cache.set("Karl-Marx-Allee 3,  10178 Berlin", [52.5, 13.4])
+        cache.save()
+
+        cache = GeocodeCache(self.path)
+        self.assertEqual(cache.get(" karl-marx-allee 3, 10178 BERLIN"), [52.5, 13.4])
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_geocode_cache_ttl(self):
+        cache = GeocodeCache(self.path, ttl=timedelta(seconds=0))
+        cache.set("Berlin", [52.5, 13.4])
+        self.assertIsNone(cache.get("Berlin"))
+        self.assertEqual(cache.misses, 1)
+
+    def test_geocode_cache_version(self):
+        cache = GeocodeCache(self.path, version="1")
+        cache.set("Berlin", [52.5, 13.4])
+        cache.save()
+
+        self.assertIsNone(GeocodeCache(self.path, version="2").get("Berlin"))
+
+    @patch("functions.extraction.ArcGIS")
+    def test_get_coordinates_only_geocodes_misses(self, MockArcGIS):
+        mock_geocode = MagicMock(
+            return_value=MagicMock(latitude=40.7128, longitude=-74.0060)
+        )
+        MockArcGIS.return_value.geocode = mock_geocode
+        cache = GeocodeCache(self.path)
+        cache.set("Los Angeles, CA", [34.0522, -118.2437])
+
+        locations = {"Los Angeles": "Los Angeles, CA", "New York": "New York, NY"}
+        result = get_coordinates(locations, cache=cache)
+
+        self.assertEqual(
+            result,
+            {"Los Angeles": [34.0522, -118.2437], "New York": [40.7128, -74.0060]},
+        )
+        mock_geocode.assert_called_once_with("New York, NY")
+
+        # The new address is now cached on disk as well
+        mock_geocode.reset_mock()
+        self.assertEqual(
+            get_coordinates(locations, cache=GeocodeCache(self.path)), result
+        )
+        mock_geocode.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+from functions.bigquery_functions import BatchLoader, push_data_to_bigquery
+from functions.config import DEFAULT_CONFIG
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.transformation import (
+    minor_transform_and_append_dataframe,
+    read_and_validate_csv,
+)
+from benchmarks.fixtures import make_usgs_csv, make_usgs_dataframe
+
+
+class MergeIntoTable(unittest.TestCase):
+    """
+    Unit tests for the 'merge' load mode, against the SQLite-backed fake BigQuery client.
+
+    Test Cases:
+        - test_merge_pipeline_twice_is_idempotent: Verify that loading the same run twice does not grow the tables.
+        - test_merge_updates_changed_events: Verify that an updated event replaces its previous version.
+        - test_merge_revised_event_keeps_curated_rows: Verify that a revised event, with a new hashed_id, replaces its curated row.
+        - test_merge_deduplicates_batch: Verify that duplicated keys within a batch are loaded once.
+        - test_merge_requires_keys: Verify that merging without keys raises a ValueError.
+    """
+
+    def setUp(self):
+        self.client = FakeBigQueryClient()
+        self.columns_to_keep = ["hashed_id", "id", "time", "mag", "place", "location"]
+
+    def run_pipeline(self, data):
+        with BatchLoader("project", if_exists="merge", client=self.client) as loader:
+            combined_df = None
+            for location_name in ("pleo_dk", "pleo_de"):
+                extracted_data = read_and_validate_csv(data)
+                loader.add(extracted_data, "raw_data", location_name, ["id"])
+                combined_df = minor_transform_and_append_dataframe(
+                    location_name, extracted_data, self.columns_to_keep, combined_df
+                )
+            loader.add(
+                combined_df,
+                "curated_data",
+                "earthquakes",
+                DEFAULT_CONFIG["sink"]["curated_merge_keys"],
+            )
+
+        return {name: len(df) for name, df in self.client.tables.items()}
+
+    def test_merge_pipeline_twice_is_idempotent(self):
+        data = make_usgs_csv(50)
+        first_run = self.run_pipeline(data)
+        second_run = self.run_pipeline(data)
+
+        self.assertEqual(
+            first_run,
+            {
+                "project.raw_data.pleo_dk": 50,
+                "project.raw_data.pleo_de": 50,
+                "project.curated_data.earthquakes": 100,
+            },
+        )
+        self.assertEqual(second_run, first_run)
+
+    def test_merge_revised_event_keeps_curated_rows(self):
+        df = make_usgs_dataframe(10)
+        self.run_pipeline(df.to_csv(index=False))
+        # USGS revises the magnitude of an event, which changes its hashed_id
+        df.loc[0, "mag"] = 9.9
+        df.loc[0, "updated"] = "2030-01-01T00:00:00.000Z"
+        tables = self.run_pipeline(df.to_csv(index=False))
+
+        self.assertEqual(tables["project.raw_data.pleo_dk"], 10)
+        self.assertEqual(tables["project.curated_data.earthquakes"], 20)
+        curated = self.client.tables["project.curated_data.earthquakes"]
+        revised = curated[curated["id"] == df.loc[0, "id"]]
+        self.assertEqual(revised["mag"].tolist(), [9.9, 9.9])
+
+    def test_merge_updates_changed_events(self):
+        df = make_usgs_dataframe(5)
+        push_data_to_bigquery(
+            df, "project", "raw_data", "pleo_dk", "merge", self.client, ["id"]
+        )
+        df.loc[0, "mag"] = 9.9
+        push_data_to_bigquery(
+            df.iloc[:1], "project", "raw_data", "pleo_dk", "merge", self.client, ["id"]
+        )
+
+        table = self.client.tables["project.raw_data.pleo_dk"].set_index("id")
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table.loc[df.loc[0, "id"], "mag"], 9.9)
+
+    def test_merge_deduplicates_batch(self):
+        df = make_usgs_dataframe(3)
+        push_data_to_bigquery(
+            df.iloc[[0, 0, 1]],
+            "project",
+            "raw_data",
+            "pleo_dk",
+            "merge",
+            self.client,
+            ["id"],
+        )
+        self.assertEqual(len(self.client.tables["project.raw_data.pleo_dk"]), 2)
+
+    def test_merge_requires_keys(self):
+        loader = BatchLoader("project", if_exists="merge", client=self.client)
+        with self.assertRaises(ValueError):
+            loader.add(make_usgs_dataframe(3), "raw_data", "pleo_dk")
+
+
+if __name__ == "__main__":
+    unittest.main()
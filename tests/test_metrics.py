@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from benchmarks.fixtures import make_usgs_csv
+from functions.extraction import extract_data_return_df
+from functions.metrics import StageMetrics, get_metrics, set_metrics, stage, timed
+from tests.stub_usgs_server import StubUSGSServer
+
+CSV_BODY = make_usgs_csv(2)
+
+
+class StageMetricsTests(unittest.TestCase):
+    """
+    Unit tests for the StageMetrics class and the stage helpers.
+
+    Test Cases:
+        - test_stage_aggregates_runs: Verify that runs are summed by stage and labels.
+        - test_stage_records_failed_runs: Verify that a stage raising an exception is still timed.
+        - test_timed_uses_location_name: Verify that the decorator labels runs with the location and counts rows.
+        - test_write_prometheus_and_json: Verify the content of the metrics files.
+        - test_extraction_is_instrumented: Verify that downloads and decoding report rows and bytes.
+        - test_stage_overhead: Verify that timing a stage costs little compared with the stages themselves.
+    """
+
+    def setUp(self):
+        self.metrics = StageMetrics()
+        set_metrics(self.metrics)
+
+    def tearDown(self):
+        set_metrics(None)
+
+    def test_stage_aggregates_runs(self):
+        for rows in (2, 3):
+            with self.metrics.stage("download", location="pleo_dk") as record:
+                record["rows"], record["bytes"] = rows, 100
+        with stage("download", location="pleo_de"):
+            time.sleep(0.01)
+
+        [pleo_de, pleo_dk] = self.metrics.summary()
+        self.assertEqual(
+            {
+                key: pleo_dk[key]
+                for key in ("stage", "location", "count", "rows", "bytes")
+            },
+            {
+                "stage": "download",
+                "location": "pleo_dk",
+                "count": 2,
+                "rows": 5,
+                "bytes": 200,
+            },
+        )
+        self.assertGreaterEqual(pleo_de["wall_seconds"], 0.01)
+        self.assertLess(pleo_de["cpu_seconds"], pleo_de["wall_seconds"])
+
+    def test_stage_records_failed_runs(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.stage("decode"):
+                raise ValueError("Invalid data")
+        self.assertEqual(self.metrics.summary()[0]["count"], 1)
+
+    def test_timed_uses_location_name(self):
+        @timed("transform")
+        def transform(location_name, rows):
+            return list(range(rows))
+
+        transform(location_name="pleo_dk", rows=3)
+        [totals] = get_metrics().summary()
+        self.assertEqual(
+            (totals["stage"], totals["location"], totals["rows"]),
+            ("transform", "pleo_dk", 3),
+        )
+
+    def test_write_prometheus_and_json(self):
+        with self.metrics.stage("load", table="project.raw_data.pleo_dk") as record:
+            record["rows"] = 7
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.metrics.write(os.path.join(directory, "metrics.prom"))
+            self.metrics.write(os.path.join(directory, "metrics.json"))
+            with open(os.path.join(directory, "metrics.prom")) as file:
+                prometheus = file.read()
+            with open(os.path.join(directory, "metrics.json")) as file:
+                summary = json.load(file)
+
+        self.assertIn("# TYPE earthquake_stage_rows_total counter", prometheus)
+        self.assertIn(
+            'earthquake_stage_rows_total{stage="load",table="project.raw_data.pleo_dk"} 7',
+            prometheus,
+        )
+        self.assertEqual(summary[0]["rows"], 7)
+
+    def test_extraction_is_instrumented(self):
+        with StubUSGSServer(csv_body=CSV_BODY) as server:
+            extract_data_return_df(f"{server.url}/fdsnws/event/1/query", "pleo_dk")
+
+        totals = {row["stage"]: row for row in self.metrics.summary()}
+        self.assertEqual(totals["download"]["bytes"], len(CSV_BODY))
+        self.assertEqual(totals["decode"]["rows"], 2)
+        self.assertEqual(totals["decode"]["location"], "pleo_dk")
+
+    def test_stage_overhead(self):
+        start = time.perf_counter()
+        for _ in range(10_000):
+            with self.metrics.stage("count", location="pleo_dk"):
+                pass
+        per_stage = (time.perf_counter() - start) / 10_000
+        self.assertLess(per_stage, 1e-4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from datetime import datetime
+import pandas as pd
+from functions.partitioning import extract_time_windows, plan_time_windows
+
+
+class PlanTimeWindows(unittest.TestCase):
+    """
+    Unit tests for the plan_time_windows and extract_time_windows functions.
+
+    Test Cases:
+        - test_plan_time_windows_under_budget: Verify that a range under the budget is kept as one window.
+        - test_plan_time_windows_splits_busy_range: Verify that every window is under the budget and the windows cover the range.
+        - test_plan_time_windows_min_window: Verify that windows are not split below the minimum duration.
+        - test_extract_time_windows_deduplicates: Verify that windows are merged, deduplicated on 'id' and empty windows skipped.
+    """
+
+    def setUp(self):
+        # One earthquake per hour during January, and a busy day on the 20th
+        self.times = list(pd.date_range("2024-01-01", "2024-01-31", freq="h"))
+        self.times += list(pd.date_range("2024-01-20", periods=500, freq="min"))
+
+    def count_window(self, window_start, window_end):
+        start = datetime.fromisoformat(window_start)
+        end = datetime.fromisoformat(window_end)
+        return sum(start <= time <= end for time in self.times)
+
+    def test_plan_time_windows_under_budget(self):
+        windows = plan_time_windows(
+            self.count_window, "2024-01-01", "2024-02-01", max_rows=2000
+        )
+        self.assertEqual(
+            windows, [("2024-01-01T00:00:00", "2024-02-01T00:00:00", 1221)]
+        )
+
+    def test_plan_time_windows_splits_busy_range(self):
+        windows = plan_time_windows(
+            self.count_window, "2024-01-01", "2024-02-01", max_rows=100
+        )
+        self.assertGreater(len(windows), 1)
+        self.assertTrue(all(count <= 100 for _, _, count in windows))
+        self.assertEqual(windows[0][0], "2024-01-01T00:00:00")
+        self.assertEqual(windows[-1][1], "2024-02-01T00:00:00")
+        for (_, end, _), (start, _, _) in zip(windows, windows[1:]):
+            self.assertEqual(end, start)
+
+    def test_plan_time_windows_min_window(self):
+        windows = plan_time_windows(
+            lambda window_start, window_end: 10,
+            "2024-01-01",
+            "2024-01-01T00:04:00",
+            max_rows=5,
+        )
+        self.assertEqual(len(windows), 4)
+
+    def test_extract_time_windows_deduplicates(self):
+        windows = [
+            ("2024-01-01T00:00:00", "2024-01-02T00:00:00", 2),
+            ("2024-01-02T00:00:00", "2024-01-03T00:00:00", 0),
+            ("2024-01-03T00:00:00", "2024-01-04T00:00:00", 2),
+        ]
+        extracted = []
+
+        def extract_window(window_start, window_end):
+            extracted.append(window_start)
+            ids = ["a", "b"] if window_start.startswith("2024-01-01") else ["b", "c"]
+            return pd.DataFrame({"id": ids, "mag": [1.0, 2.0]})
+
+        result = extract_time_windows(extract_window, windows)
+
+        self.assertEqual(sorted(result["id"]), ["a", "b", "c"])
+        self.assertEqual(len(extracted), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
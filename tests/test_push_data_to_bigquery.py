@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import pandas as pd
+from google.cloud import bigquery
+from functions.bigquery_client import bigquery_client, set_bigquery_client
+from functions.bigquery_functions import push_data_to_bigquery
+
+
+class PushDataToBigQuery(unittest.TestCase):
+    """
+    Unit tests for the shared BigQuery client and the push_data_to_bigquery function.
+
+    Test Cases:
+        - test_bigquery_client_is_created_once: Verify that the client is created lazily and reused.
+        - test_push_data_to_bigquery_uses_shared_client: Verify that loads go through the injected client.
+        - test_push_data_to_bigquery_replace: Verify that 'replace' truncates the table.
+        - test_push_data_to_bigquery_empty_df: Verify that an empty DataFrame is not loaded.
+    """
+
+    def setUp(self):
+        self.fake_client = MagicMock()
+        set_bigquery_client(self.fake_client)
+        self.df = pd.DataFrame({"id": ["us1"], "mag": [1.5]})
+
+    def tearDown(self):
+        set_bigquery_client(None)
+
+    @patch("functions.bigquery_client.bigquery.Client")
+    def test_bigquery_client_is_created_once(self, MockClient):
+        set_bigquery_client(None)
+        self.assertIs(bigquery_client(), bigquery_client())
+        MockClient.assert_called_once_with()
+
+    def test_push_data_to_bigquery_uses_shared_client(self):
+        for table_name in ("pleo_dk", "pleo_de"):
+            push_data_to_bigquery(self.df, "project", "raw_data", table_name)
+
+        self.assertEqual(self.fake_client.load_table_from_dataframe.call_count, 2)
+        args, kwargs = self.fake_client.load_table_from_dataframe.call_args
+        self.assertEqual(args[1], "project.raw_data.pleo_de")
+        self.assertEqual(
+            kwargs["job_config"].write_disposition,
+            bigquery.WriteDisposition.WRITE_APPEND,
+        )
+
+    def test_push_data_to_bigquery_replace(self):
+        push_data_to_bigquery(
+            self.df, "project", "raw_data", "pleo_dk", if_exists="replace"
+        )
+        _, kwargs = self.fake_client.load_table_from_dataframe.call_args
+        self.assertEqual(
+            kwargs["job_config"].write_disposition,
+            bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+
+    def test_push_data_to_bigquery_empty_df(self):
+        result = push_data_to_bigquery(pd.DataFrame(), "project", "raw_data", "pleo_dk")
+        self.assertEqual(
+            result, "Empty DataFrame received and moving to next location."
+        )
+        self.fake_client.load_table_from_dataframe.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow.dataset as ds
+from pandas.testing import assert_frame_equal
+from benchmarks.fixtures import make_usgs_dataframe
+from functions.bigquery_functions import BatchLoader
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.raw_cache import RawCache, replay
+import replay as replay_script
+
+
+class RawCacheTests(unittest.TestCase):
+    """
+    Unit tests for the RawCache class and the replay function.
+
+    Test Cases:
+        - test_raw_cache_partitions_by_location_and_date: Verify that files are written under location= and date= directories.
+        - test_raw_cache_round_trip: Verify that cached data is read back unchanged.
+        - test_raw_cache_read_filters: Verify that reads can be limited to locations and dates.
+        - test_replay_loads_without_extraction: Verify that replay transforms and loads the cached data.
+        - test_replay_main_reads_configuration: Verify that replay.py reads its cache and sink from the configuration file.
+        - test_replay_main_invalid_configuration: Verify that replay.py returns 2 for an unknown location.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = RawCache(self.directory.name)
+        self.df = pd.DataFrame(
+            {
+                "time": ["2024-01-01T00:00:00.000Z", "2024-01-02T00:00:00.000Z"],
+                "id": ["us1", "us2"],
+                "mag": [1.5, None],
+                "nst": pd.array([10, None], dtype="Int64"),
+                "place": ["10 km N of Somewhere", None],
+            }
+        )
+        self.first_day = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+        self.second_day = datetime(2024, 1, 2, 12, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_raw_cache_partitions_by_location_and_date(self):
+        path = self.cache.write("pleo_dk", self.df, extracted_at=self.first_day)
+
+        self.assertTrue(
+            path.startswith(os.path.join("location=pleo_dk", "date=2024-01-01"))
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, path)))
+        self.assertEqual(
+            [
+                (entry["location"], entry["date"], entry["rows"])
+                for entry in self.cache.manifest()
+            ],
+            [("pleo_dk", "2024-01-01", 2)],
+        )
+
+    def test_raw_cache_round_trip(self):
+        self.cache.write("pleo_dk", self.df)
+
+        [(location_name, df)] = list(self.cache.read())
+
+        self.assertEqual(location_name, "pleo_dk")
+        assert_frame_equal(df, self.df)
+
+    def test_raw_cache_read_filters(self):
+        self.cache.write("pleo_dk", self.df, extracted_at=self.first_day)
+        self.cache.write("pleo_de", self.df, extracted_at=self.first_day)
+        self.cache.write("pleo_dk", self.df, extracted_at=self.second_day)
+
+        self.assertEqual(
+            [name for name, _ in self.cache.read(locations=["pleo_dk"])],
+            ["pleo_dk", "pleo_dk"],
+        )
+        self.assertEqual(
+            [name for name, _ in self.cache.read(start_date="2024-01-02")],
+            ["pleo_dk"],
+        )
+        self.assertEqual(
+            [name for name, _ in self.cache.read(end_date="2024-01-01")],
+            ["pleo_dk", "pleo_de"],
+        )
+
+    def test_replay_loads_without_extraction(self):
+        self.cache.write("pleo_dk", self.df)
+        self.cache.write("pleo_de", self.df)
+        client = FakeBigQueryClient()
+        loader = BatchLoader("project", client=client)
+
+        total_rows = replay(
+            self.cache,
+            loader,
+            dataset_raw="raw_data",
+            dataset_curated="curated_data",
+            columns_to_keep=["hashed_id", "id", "location"],
+        )
+
+        self.assertEqual(total_rows, 4)
+        curated = client.tables["project.curated_data.earthquakes"]
+        self.assertEqual(
+            sorted(curated["location"]), ["pleo_de", "pleo_de", "pleo_dk", "pleo_dk"]
+        )
+        self.assertEqual(len(client.tables["project.raw_data.pleo_dk"]), 2)
+
+    def write_config(self):
+        path = os.path.join(self.directory.name, "config.toml")
+        with open(path, "w") as file:
+            file.write(
+                "[state]\n"
+                f"raw_cache_dir = '{self.directory.name}'\n"
+                "metrics_path = ''\n"
+                "[sink]\n"
+                "type = 'parquet'\n"
+                f"parquet_dir = '{os.path.join(self.directory.name, 'parquet')}'\n"
+            )
+        return path
+
+    def test_replay_main_reads_configuration(self):
+        df = make_usgs_dataframe(5)
+        self.cache.write("pleo_dk", df)
+        self.cache.write("pleo_de", df)
+
+        status = replay_script.main(
+            ["--config", self.write_config(), "--locations", "pleo_dk"]
+        )
+
+        self.assertEqual(status, 0)
+        parquet_dir = os.path.join(self.directory.name, "parquet")
+        self.assertEqual(os.listdir(parquet_dir), ["curated_data"])
+        curated = ds.dataset(
+            os.path.join(parquet_dir, "curated_data", "earthquakes"),
+            partitioning="hive",
+        ).to_table()
+        self.assertEqual(curated.column_names[:2], ["hashed_id", "id"])
+        self.assertEqual(sorted(curated["id"].to_pylist()), sorted(df["id"]))
+
+    def test_replay_main_invalid_configuration(self):
+        with self.assertLogs("replay", level="ERROR"):
+            status = replay_script.main(
+                ["--config", self.write_config(), "--locations", "pleo_xx"]
+            )
+
+        self.assertEqual(status, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
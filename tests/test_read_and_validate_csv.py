@@ -0,0 +1,102 @@
+import unittest
+from benchmarks.fixtures import make_usgs_csv
+from functions.transformation import compute_hashed_id, read_and_validate_csv
+
+HEADER = "time,latitude,gap,id,place\n"
+SCHEMA = {
+    "time": "string",
+    "latitude": "float64",
+    "gap": "int64",
+    "id": "string",
+    "place": "string",
+}
+
+
+class ReadAndValidateCsv(unittest.TestCase):
+    """
+    Unit tests for the read_and_validate_csv function.
+
+    Test Cases:
+        - test_read_and_validate_csv_types: Verify that the columns are parsed with the expected dtypes.
+        - test_read_and_validate_csv_from_bytes: Verify that bytes and text produce the same DataFrame.
+        - test_read_and_validate_csv_rejects_non_integral_value: Verify that an int64 column with decimals raises a ValueError.
+        - test_read_and_validate_csv_reports_failing_values: Verify that the error names the column, value and row that failed to convert.
+        - test_read_and_validate_csv_hash_ignores_other_rows: Verify that the dtypes, and so the hash of an event, do not depend on the other rows.
+        - test_read_and_validate_csv_missing_column: Verify that a missing column raises a ValueError.
+        - test_read_and_validate_csv_invalid_number: Verify that a non-numeric value in a numeric column raises a ValueError.
+        - test_read_and_validate_csv_null_required_column: Verify that a null id raises a ValueError.
+    """
+
+    def test_read_and_validate_csv_types(self):
+        data = (
+            HEADER
+            + "2024-01-01T00:00:00Z,52.5,40,us1,Berlin\n2024-01-02T00:00:00Z,,,us2,\n"
+        )
+        df = read_and_validate_csv(data, SCHEMA)
+        self.assertEqual(df["latitude"].dtype, "float64")
+        self.assertEqual(df["gap"].dtype, "Int64")
+        self.assertEqual(df["gap"].tolist()[0], 40)
+        self.assertTrue(df["gap"].isna().iloc[1])
+        self.assertEqual(df["time"].dtype, "object")
+        self.assertEqual(df["id"].tolist(), ["us1", "us2"])
+
+    def test_read_and_validate_csv_from_bytes(self):
+        data = HEADER + "2024-01-01T00:00:00Z,52.5,40,us1,Berlin\n"
+        self.assertTrue(
+            read_and_validate_csv(data, SCHEMA).equals(
+                read_and_validate_csv(data.encode(), SCHEMA)
+            )
+        )
+
+    def test_read_and_validate_csv_rejects_non_integral_value(self):
+        data = HEADER + "2024-01-01T00:00:00Z,52.5,40.5,us1,Berlin\n"
+        with self.assertRaises(ValueError):
+            read_and_validate_csv(data, SCHEMA)
+
+    def test_read_and_validate_csv_reports_failing_values(self):
+        data = (
+            HEADER
+            + "2024-01-01T00:00:00Z,52.5,40,us1,Berlin\n"
+            + "2024-01-02T00:00:00Z,52.5,40.5,us2,Berlin\n"
+            + "2024-01-03T00:00:00Z,52.5,41.5,us3,Berlin\n"
+        )
+        with self.assertLogs("transformation", level="ERROR"):
+            with self.assertRaisesRegex(
+                ValueError, "column gap: expected int64, got 40.5 in row 1 and 1 other"
+            ):
+                read_and_validate_csv(data, SCHEMA)
+
+    def test_read_and_validate_csv_hash_ignores_other_rows(self):
+        lines = make_usgs_csv(2).splitlines()
+        columns = lines[0].split(",")
+        row = lines[2].split(",")
+        row[columns.index("gap")] = "40.5"
+        row[columns.index("magNst")] = ""
+        lines[2] = ",".join(row)
+
+        alone = read_and_validate_csv("\n".join(lines[:2]))
+        with_others = read_and_validate_csv("\n".join(lines))
+
+        self.assertEqual(alone["gap"].dtype, with_others["gap"].dtype)
+        self.assertEqual(
+            compute_hashed_id(alone).iloc[0], compute_hashed_id(with_others).iloc[0]
+        )
+
+    def test_read_and_validate_csv_missing_column(self):
+        data = "time,latitude,id,place\n2024-01-01T00:00:00Z,52.5,us1,Berlin\n"
+        with self.assertRaises(ValueError):
+            read_and_validate_csv(data, SCHEMA)
+
+    def test_read_and_validate_csv_invalid_number(self):
+        data = HEADER + "2024-01-01T00:00:00Z,north,40,us1,Berlin\n"
+        with self.assertRaises(ValueError):
+            read_and_validate_csv(data, SCHEMA)
+
+    def test_read_and_validate_csv_null_required_column(self):
+        data = HEADER + "2024-01-01T00:00:00Z,52.5,40,,Berlin\n"
+        with self.assertRaises(ValueError):
+            read_and_validate_csv(data, SCHEMA)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from benchmarks.fixtures import make_usgs_csv
+from functions.bigquery_client import set_bigquery_client
+from functions.config import load_config
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.geocode_cache import GEOCODER_VERSION, normalize_address
+from functions.request_cache import RequestCache, canonical_key
+from functions.runner import run_pipeline
+from functions.usgs_client import set_usgs_client
+from tests.stub_usgs_server import StubUSGSServer
+
+LOCATIONS = {
+    "pleo_dk": "Sortedam Dossering 7 - 4th floor  2200 Copenhagen N",
+    "pleo_es": "Calle Gran Via, 39 6th floor 28013 Madrid",
+}
+COORDINATES = {"pleo_dk": [55.69, 12.57], "pleo_es": [40.42, -3.70]}
+
+
+class RequestCacheTests(unittest.TestCase):
+    """
+    Unit tests for the cache of USGS counts.
+
+    Test Cases:
+        - test_canonical_key: Verify that equivalent queries share a key and other windows do not.
+        - test_fresh_entries_skip_requests: Verify that a count is requested once within the TTL.
+        - test_conditional_requests: Verify that expired entries are revalidated with their ETag.
+        - test_coalesces_identical_requests: Verify that identical requests in flight are sent once.
+        - test_save_and_load: Verify that entries and loaded counts are kept in the JSON file.
+        - test_run_pipeline_skips_unchanged_regions: Verify that a second run downloads nothing if the counts did not change.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(set_usgs_client, None)
+
+    def count_url(self, server, start="2024-01-01", latitude="55.69"):
+        return (
+            f"{server.url}/fdsnws/event/1/count?starttime={start}&endtime=2024-02-01"
+            f"&latitude={latitude}&longitude=12.57&maxradiuskm=500"
+        )
+
+    def count_requests(self, server):
+        return [path for _, path in server.requests if "/count" in path]
+
+    def test_canonical_key(self):
+        url = (
+            "https://earthquake.usgs.gov/fdsnws/event/1/count?starttime=2024-01-01"
+            "&endtime=2024-02-01&latitude=55.69&longitude=12.57&maxradiuskm=500"
+        )
+        same = (
+            "https://earthquake.usgs.gov/fdsnws/event/1/count?longitude=12.570001"
+            "&maxradiuskm=500.0&latitude=55.69000&starttime=2024-01-01T00:00:00"
+            "&endtime=2024-02-01T00:00:00.000"
+        )
+        other_window = url.replace("2024-01-01", "2024-01-15")
+
+        self.assertEqual(canonical_key(url), canonical_key(same))
+        self.assertNotEqual(canonical_key(url), canonical_key(other_window))
+
+    def test_fresh_entries_skip_requests(self):
+        cache = RequestCache(ttl=timedelta(minutes=10))
+        with StubUSGSServer(count=7) as server:
+            bodies = [cache.get(self.count_url(server)) for _ in range(3)]
+            cache.get(self.count_url(server, latitude="55.690001"))
+
+        self.assertEqual(bodies, ["7", "7", "7"])
+        self.assertEqual(len(self.count_requests(server)), 1)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+        self.assertEqual(cache.hit_ratio, 0.75)
+
+    def test_conditional_requests(self):
+        cache = RequestCache()
+        with StubUSGSServer(count=7) as server:
+            server.etag = '"count-7"'
+            cache.get(self.count_url(server))
+            server.count = 8  # Not served, as the ETag did not change
+            body = cache.get(self.count_url(server))
+
+        self.assertEqual(body, "7")
+        self.assertEqual(len(self.count_requests(server)), 2)
+        self.assertEqual(server.request_headers[1]["If-None-Match"], '"count-7"')
+        self.assertEqual((cache.revalidated, cache.misses), (1, 1))
+
+    def test_coalesces_identical_requests(self):
+        cache = RequestCache()
+        bodies = []
+        with StubUSGSServer(count=7, delay=0.3) as server:
+            threads = [
+                threading.Thread(
+                    target=lambda: bodies.append(cache.get(self.count_url(server)))
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(bodies, ["7"] * 4)
+        self.assertEqual(len(self.count_requests(server)), 1)
+        self.assertEqual((cache.coalesced, cache.misses), (3, 1))
+
+    def test_save_and_load(self):
+        path = os.path.join(self.directory.name, "state", "request_cache.json")
+        cache = RequestCache(path, ttl=timedelta(minutes=10))
+        with StubUSGSServer(count=7) as server:
+            url = self.count_url(server)
+            cache.get(url)
+            cache.set_loaded({url: 7})
+            cache.save()
+
+            reloaded = RequestCache(path, ttl=timedelta(minutes=10))
+            self.assertEqual(reloaded.get(url), "7")
+
+        self.assertEqual(reloaded.hits, 1)
+        self.assertEqual(reloaded.get_loaded(url), 7)
+        self.assertIsNone(reloaded.get_loaded(self.count_url(server, "2024-01-15")))
+
+    def run_pipeline(self, server, client):
+        directory = self.directory.name
+        config = load_config(
+            overrides={
+                "locations": LOCATIONS,
+                "extraction": {
+                    "usgs_url": server.url,
+                    "end_time": "2024-02-01",
+                    "incremental": False,
+                },
+                "concurrency": {"requests_per_second": 100},
+                "state": {
+                    "state_path": os.path.join(directory, "watermarks.json"),
+                    "geocode_cache_path": os.path.join(directory, "geocode_cache.json"),
+                    "request_cache_path": os.path.join(directory, "request_cache.json"),
+                    "raw_cache_dir": os.path.join(directory, "raw"),
+                    "metrics_path": None,
+                },
+                "sink": {"project_id": "project"},
+            }
+        )
+        set_bigquery_client(client)
+        self.addCleanup(set_bigquery_client, None)
+        return run_pipeline(config)
+
+    def test_run_pipeline_skips_unchanged_regions(self):
+        with open(os.path.join(self.directory.name, "geocode_cache.json"), "w") as file:
+            json.dump(
+                {
+                    "version": GEOCODER_VERSION,
+                    "entries": {
+                        normalize_address(LOCATIONS[name]): {
+                            "coordinates": coordinates,
+                            "cached_at": time.time(),
+                        }
+                        for name, coordinates in COORDINATES.items()
+                    },
+                },
+                file,
+            )
+
+        with StubUSGSServer(csv_body=make_usgs_csv(20), count=20) as server:
+            self.assertEqual(self.run_pipeline(server, FakeBigQueryClient()), 40)
+            first_requests = len(server.requests)
+
+            client = FakeBigQueryClient()
+            self.assertEqual(self.run_pipeline(server, client), 0)
+
+        self.assertEqual(len(server.requests), first_requests)
+        self.assertEqual(client.tables, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
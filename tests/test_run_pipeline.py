@@ -0,0 +1,228 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from benchmarks.fixtures import make_usgs_csv
+from functions import extraction
+from functions.bigquery_client import set_bigquery_client
+from functions.config import DEFAULT_CONFIG, load_config, select_locations
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.geocode_cache import GEOCODER_VERSION, normalize_address
+from functions.raw_cache import RawCache
+from functions.runner import run_pipeline
+from functions.usgs_client import set_usgs_client
+from tests.stub_usgs_server import StubUSGSServer
+
+LOCATIONS = {
+    "pleo_dk": "Sortedam Dossering 7 - 4th floor  2200 Copenhagen N",
+    "pleo_es": "Calle Gran Via, 39 6th floor 28013 Madrid",
+}
+COORDINATES = {"pleo_dk": [55.69, 12.57], "pleo_es": [40.42, -3.70]}
+
+CONFIG_TOML = """
+[locations]
+pleo_dk = "Sortedam Dossering 7 - 4th floor  2200 Copenhagen N"
+
+[extraction]
+start_time = "2024-01-01"
+end_time = ""
+max_overfetch = false
+
+[concurrency]
+max_workers = 2
+"""
+
+
+class RunPipelineTests(unittest.TestCase):
+    """
+    Unit tests for the configuration and the run_pipeline function.
+
+    Test Cases:
+        - test_load_config_from_toml: Verify that a TOML file overrides the defaults of its settings only.
+        - test_load_config_from_yaml: Verify that a YAML file is read as the TOML one.
+        - test_load_config_keeps_zero: Verify that the max_overfetch of 0.0 in config.toml is not read as turned off.
+        - test_load_config_rejects_unknown_settings: Verify that unknown sections and settings, and incremental text runs, raise a ValueError.
+        - test_select_locations: Verify that a run can be limited to some of the configured locations.
+        - test_dry_run_skips_heavy_imports: Verify that a dry run of the CLI imports neither pandas, geopy nor google.cloud.
+        - test_run_pipeline: Verify a full run against the USGS stub and the fake BigQuery client.
+        - test_run_pipeline_streams_large_windows: Verify that windows above stream_chunk_rows are transformed and loaded chunk by chunk.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as file:
+            file.write(content)
+        return path
+
+    def test_load_config_from_toml(self):
+        config = load_config(self.write("config.toml", CONFIG_TOML))
+
+        self.assertEqual(list(config["locations"]), ["pleo_dk"])
+        self.assertEqual(config["extraction"]["start_time"], "2024-01-01")
+        self.assertIsNone(config["extraction"]["end_time"])
+        self.assertIsNone(config["extraction"]["max_overfetch"])
+        self.assertEqual(config["concurrency"]["max_workers"], 2)
+        self.assertEqual(config["concurrency"]["requests_per_second"], 2)
+        self.assertEqual(config["sink"], DEFAULT_CONFIG["sink"])
+
+    @unittest.skipUnless(importlib.util.find_spec("yaml"), "PyYAML is not installed.")
+    def test_load_config_from_yaml(self):
+        path = self.write(
+            "config.yaml",
+            "locations:\n  pleo_dk: Karl-Marx-Allee 3, 10178 Berlin\n"
+            "extraction:\n  end_time: null\n  maxradiuskm: 250\n",
+        )
+        config = load_config(path, overrides={"concurrency": {"max_workers": 8}})
+
+        self.assertEqual(config["extraction"]["maxradiuskm"], 250)
+        self.assertIsNone(config["extraction"]["end_time"])
+        self.assertEqual(config["concurrency"]["max_workers"], 8)
+
+    def test_load_config_keeps_zero(self):
+        path = os.path.join(os.path.dirname(__file__), "..", "config.toml")
+        config = load_config(path)
+
+        self.assertIsNotNone(config["extraction"]["max_overfetch"])
+        self.assertEqual(config["extraction"]["max_overfetch"], 0.0)
+        overrides = {"extraction": {"max_overfetch": 0}}
+        self.assertEqual(
+            load_config(overrides=overrides)["extraction"]["max_overfetch"], 0
+        )
+
+    def test_load_config_rejects_unknown_settings(self):
+        with self.assertRaisesRegex(ValueError, "Unknown configuration section"):
+            load_config(overrides={"extract": {}})
+        with self.assertRaisesRegex(ValueError, "Unknown setting in concurrency"):
+            load_config(overrides={"concurrency": {"workers": 8}})
+        with self.assertRaisesRegex(ValueError, "Unsupported sink"):
+            load_config(overrides={"sink": {"type": "postgres"}})
+        with self.assertRaisesRegex(ValueError, "set incremental = false"):
+            load_config(overrides={"extraction": {"file_format": "text"}})
+        text = {"file_format": "text", "incremental": False}
+        self.assertEqual(
+            load_config(overrides={"extraction": text})["extraction"]["file_format"],
+            "text",
+        )
+
+    def test_select_locations(self):
+        config = load_config()
+
+        selected = select_locations(config, ["pleo_es", "pleo_dk"])
+
+        self.assertEqual(list(selected["locations"]), ["pleo_dk", "pleo_es"])
+        self.assertEqual(len(config["locations"]), 7)
+        with self.assertRaisesRegex(ValueError, "Unknown locations: pleo_xx"):
+            select_locations(config, ["pleo_xx"])
+
+    def test_dry_run_skips_heavy_imports(self):
+        script = (
+            "import sys, app\n"
+            "status = app.main(['--dry-run', '--locations', 'pleo_dk'])\n"
+            "heavy = [name for name in ('pandas', 'geopy', 'google.cloud', 'pandas_gbq') if name in sys.modules]\n"
+            "print(status, heavy)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.splitlines()[-1], "0 []")
+        self.assertIn("Dry run: 1 locations", result.stdout)
+
+    def run_pipeline(self, client, extraction_overrides=None):
+        directory = self.directory.name
+        with open(os.path.join(directory, "geocode_cache.json"), "w") as file:
+            json.dump(
+                {
+                    "version": GEOCODER_VERSION,
+                    "entries": {
+                        normalize_address(LOCATIONS[name]): {
+                            "coordinates": coordinates,
+                            "cached_at": time.time(),
+                        }
+                        for name, coordinates in COORDINATES.items()
+                    },
+                },
+                file,
+            )
+
+        set_bigquery_client(client)
+        self.addCleanup(set_bigquery_client, None)
+        self.addCleanup(set_usgs_client, None)
+
+        with StubUSGSServer(csv_body=make_usgs_csv(20), count=20) as server:
+            config = load_config(
+                overrides={
+                    "locations": LOCATIONS,
+                    "extraction": {
+                        "usgs_url": server.url,
+                        "end_time": "2024-02-01",
+                        **(extraction_overrides or {}),
+                    },
+                    "concurrency": {"requests_per_second": 100},
+                    "state": {
+                        "state_path": os.path.join(directory, "watermarks.json"),
+                        "geocode_cache_path": os.path.join(
+                            directory, "geocode_cache.json"
+                        ),
+                        "request_cache_path": os.path.join(
+                            directory, "request_cache.json"
+                        ),
+                        "raw_cache_dir": os.path.join(directory, "raw"),
+                        "metrics_path": os.path.join(directory, "metrics.json"),
+                    },
+                    "sink": {"project_id": "project"},
+                }
+            )
+            return run_pipeline(config)
+
+    def test_run_pipeline(self):
+        directory = self.directory.name
+        client = FakeBigQueryClient()
+        total_rows = self.run_pipeline(client)
+
+        self.assertEqual(total_rows, 40)
+        tables = client.tables
+        self.assertEqual(len(tables["project.raw_data.pleo_dk"]), 20)
+        self.assertEqual(
+            sorted(tables["project.curated_data.earthquakes"]["location"].unique()),
+            ["pleo_dk", "pleo_es"],
+        )
+        self.assertEqual(len(client.ddl), 3)
+        self.assertTrue(os.path.exists(os.path.join(directory, "watermarks.json")))
+        self.assertTrue(os.path.exists(os.path.join(directory, "metrics.json")))
+
+    def test_run_pipeline_streams_large_windows(self):
+        client = FakeBigQueryClient()
+        with mock.patch.object(
+            extraction, "extract_data_chunks", wraps=extraction.extract_data_chunks
+        ) as extract_data_chunks:
+            total_rows = self.run_pipeline(client, {"stream_chunk_rows": 8})
+
+        self.assertEqual(total_rows, 40)
+        self.assertEqual(extract_data_chunks.call_count, 2)
+        self.assertEqual(extract_data_chunks.call_args.args[2], 8)
+        # Every chunk is transformed and cached on its own, never the whole window
+        manifest = RawCache(os.path.join(self.directory.name, "raw")).manifest()
+        self.assertEqual(
+            sorted(
+                entry["rows"] for entry in manifest if entry["location"] == "pleo_dk"
+            ),
+            [4, 8, 8],
+        )
+        self.assertEqual(len(client.tables["project.raw_data.pleo_dk"]), 20)
+        self.assertEqual(len(client.tables["project.curated_data.earthquakes"]), 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import threading
+import time
+import unittest
+from benchmarks.fixtures import make_usgs_csv
+from functions.bigquery_functions import push_data_to_bigquery
+from functions.extraction import extract_data_return_df
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.pipeline import Stage, run_stages
+from functions.rate_limit import HostConcurrencyLimiter, TokenBucket
+from functions.transformation import minor_transform_dataframe
+from tests.stub_usgs_server import StubUSGSServer
+
+LOCATIONS = ["pleo_dk", "pleo_uk", "pleo_de", "pleo_es"]
+STAGE_SECONDS = 0.1
+
+
+class RunStagesTests(unittest.TestCase):
+    """
+    Unit tests for the run_stages function.
+
+    Test Cases:
+        - test_run_stages_overlaps_stages: Verify that extraction, transform and load overlap, against the USGS stub and the fake BigQuery client.
+        - test_run_stages_applies_back_pressure: Verify that a slow stage caps the number of items in flight.
+        - test_run_stages_skips_none: Verify that items for which a stage returns None are dropped.
+        - test_run_stages_fan_out_applies_back_pressure: Verify that a fan-out stage is paused while the next queue is full.
+        - test_run_stages_raises_stage_errors: Verify that the first error of a stage is raised and the run stops.
+        - test_extract_workers_speedup: Verify that the workers of the extract stage fetch locations in parallel.
+        - test_extract_workers_rate_limit: Verify that the token bucket spaces out the requests of the workers.
+        - test_extract_workers_host_cap: Verify that the per-host cap bounds the requests in flight.
+    """
+
+    def make_stages(self, server, client):
+        def extract(location_name):
+            url = f"{server.url}/fdsnws/event/1/query?format=csv"
+            return location_name, extract_data_return_df(url, location_name)
+
+        def transform(item):
+            location_name, df = item
+            time.sleep(STAGE_SECONDS)  # CPU-bound work in the real pipeline
+            return location_name, minor_transform_dataframe(location_name, df)
+
+        def load(item):
+            location_name, df = item
+            push_data_to_bigquery(
+                df, "project", "raw_data", location_name, client=client
+            )
+            return location_name
+
+        return [
+            Stage("extract", extract),
+            Stage("transform", transform),
+            Stage("load", load),
+        ]
+
+    def test_run_stages_overlaps_stages(self):
+        with StubUSGSServer(csv_body=make_usgs_csv(100), delay=STAGE_SECONDS) as server:
+            client = FakeBigQueryClient(job_latency=STAGE_SECONDS)
+            stages = self.make_stages(server, client)
+
+            start = time.perf_counter()
+            for location_name in LOCATIONS:
+                item = location_name
+                for stage in stages:
+                    item = stage.function(item)
+            serial = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = run_stages(LOCATIONS, stages, queue_size=1)
+            pipelined = time.perf_counter() - start
+
+        self.assertEqual(sorted(results), sorted(LOCATIONS))
+        # Four items through three stages of equal length take six stage lengths, not twelve
+        self.assertLess(pipelined, serial * 0.75)
+
+    def test_run_stages_applies_back_pressure(self):
+        lock = threading.Lock()
+        counts = {"in_flight": 0, "max_in_flight": 0}
+
+        def produce(item):
+            with lock:
+                counts["in_flight"] += 1
+                counts["max_in_flight"] = max(
+                    counts["max_in_flight"], counts["in_flight"]
+                )
+            return item
+
+        def consume(item):
+            time.sleep(0.01)
+            with lock:
+                counts["in_flight"] -= 1
+            return item
+
+        results = run_stages(
+            range(50),
+            [Stage("produce", produce), Stage("consume", consume)],
+            queue_size=2,
+        )
+
+        self.assertEqual(sorted(results), list(range(50)))
+        # The queue, the item being consumed, and the item waiting for room in the queue
+        self.assertLessEqual(counts["max_in_flight"], 2 + 1 + 1)
+
+    def test_run_stages_fan_out_applies_back_pressure(self):
+        lock = threading.Lock()
+        counts = {"in_flight": 0, "max_in_flight": 0}
+
+        def produce(item):
+            for chunk in range(20):
+                with lock:
+                    counts["in_flight"] += 1
+                    counts["max_in_flight"] = max(
+                        counts["max_in_flight"], counts["in_flight"]
+                    )
+                yield item, chunk
+
+        def consume(item):
+            time.sleep(0.01)
+            with lock:
+                counts["in_flight"] -= 1
+            return item
+
+        results = run_stages(
+            range(3),
+            [Stage("produce", produce, fan_out=True), Stage("consume", consume)],
+            queue_size=2,
+        )
+
+        self.assertEqual(
+            sorted(results), [(item, chunk) for item in range(3) for chunk in range(20)]
+        )
+        # The queue, the chunk being consumed, and the chunk waiting for room in the queue
+        self.assertLessEqual(counts["max_in_flight"], 2 + 1 + 1)
+
+    def test_run_stages_skips_none(self):
+        results = run_stages(
+            range(10),
+            [Stage("filter", lambda item: item if item % 2 else None, workers=3)],
+        )
+        self.assertEqual(sorted(results), [1, 3, 5, 7, 9])
+
+    def test_run_stages_raises_stage_errors(self):
+        def transform(item):
+            if item == 3:
+                raise ValueError("Invalid data")
+            return item
+
+        start = time.perf_counter()
+        with self.assertRaisesRegex(ValueError, "Invalid data"):
+            run_stages(
+                range(1000),
+                [Stage("transform", transform), Stage("load", lambda item: item)],
+            )
+        self.assertLess(time.perf_counter() - start, 5)
+
+    def run_extraction(self, server, workers, rate_limiter=None, host_limiter=None):
+        def extract(location_name):
+            return location_name, extract_data_return_df(
+                url=f"{server.url}/fdsnws/event/1/query?location={location_name}",
+                location_name=location_name,
+                rate_limiter=rate_limiter,
+                host_limiter=host_limiter,
+            )
+
+        return dict(run_stages(LOCATIONS, [Stage("extract", extract, workers=workers)]))
+
+    def test_extract_workers_speedup(self):
+        with StubUSGSServer(csv_body=make_usgs_csv(5), delay=0.3) as server:
+            start = time.monotonic()
+            self.run_extraction(server, workers=1)
+            serial = time.monotonic() - start
+
+            start = time.monotonic()
+            results = self.run_extraction(server, workers=4)
+            concurrent = time.monotonic() - start
+
+        self.assertEqual(set(results), set(LOCATIONS))
+        self.assertTrue(all(len(df) == 5 for df in results.values()))
+        self.assertLess(concurrent, serial / 2)
+
+    def test_extract_workers_rate_limit(self):
+        with StubUSGSServer(csv_body=make_usgs_csv(5)) as server:
+            self.run_extraction(server, workers=4, rate_limiter=TokenBucket(rate=10))
+
+        times = sorted(request_time for request_time, _ in server.requests)
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        self.assertEqual(len(times), 4)
+        self.assertTrue(all(gap >= 0.08 for gap in gaps), gaps)
+
+    def test_extract_workers_host_cap(self):
+        with StubUSGSServer(csv_body=make_usgs_csv(5), delay=0.2) as server:
+            self.run_extraction(
+                server, workers=4, host_limiter=HostConcurrencyLimiter(2)
+            )
+
+        self.assertEqual(server.max_in_flight, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from io import StringIO
+import pandas as pd
+from functions.schema import compile_schema
+from functions.transformation import (
+    USGS_SCHEMA,
+    validate_and_transform_schema_from_csv,
+)
+from benchmarks.fixtures import make_usgs_csv
+
+SCHEMA = {"id": "string", "mag": "float64", "gap": "int64"}
+
+
+class CompiledSchemaTests(unittest.TestCase):
+    """
+    Unit tests for the compiled schema and the CSV validation built on it.
+
+    Test Cases:
+        - test_compile_schema_is_cached: Verify that a schema is compiled once.
+        - test_infer_from_sample: Verify the types inferred from a parsed sample.
+        - test_coerce_converts_whole_columns: Verify that columns are converted to their expected types.
+        - test_coerce_reports_failing_rows: Verify that every value that cannot be converted is reported with its row.
+        - test_coerce_reports_non_integral_values: Verify that integer columns are Int64 and report decimals.
+        - test_validate_and_transform_schema_from_csv: Verify that the CSV data is returned with the expected types.
+        - test_validate_and_transform_schema_from_csv_invalid: Verify that invalid values raise a ValueError naming the row.
+    """
+
+    def test_compile_schema_is_cached(self):
+        self.assertIs(compile_schema(dict(SCHEMA)), compile_schema(dict(SCHEMA)))
+        self.assertEqual(compile_schema(SCHEMA).numeric_columns, ("mag", "gap"))
+        self.assertEqual(compile_schema(SCHEMA).integer_columns, ("gap",))
+
+    def test_infer_from_sample(self):
+        sample = pd.read_csv(
+            StringIO("id,mag,gap,nst,place\nus1,1.5,10,,\nus2,2,20,4,\n"),
+            keep_default_na=False,
+            na_values=[""],
+        )
+        self.assertEqual(
+            compile_schema(SCHEMA).infer(sample),
+            {
+                "id": "string",
+                "mag": "float64",
+                "gap": "int64",
+                "nst": "int64",
+                "place": "string",
+            },
+        )
+
+    def test_coerce_converts_whole_columns(self):
+        df = pd.DataFrame(
+            {"id": ["us1", "us2"], "mag": ["1.5", None], "gap": ["10", "20"]}
+        )
+
+        df, failures = compile_schema(SCHEMA).coerce(df)
+
+        self.assertTrue(failures.empty)
+        self.assertEqual(str(df["mag"].dtype), "float64")
+        self.assertEqual(str(df["gap"].dtype), "Int64")
+        self.assertTrue(pd.isna(df.loc[1, "mag"]))
+
+    def test_coerce_reports_failing_rows(self):
+        df = pd.DataFrame(
+            {
+                "id": ["us1", "us2", "us3"],
+                "mag": ["1.5", "n/a", "2.0"],
+                "gap": ["10", "20", "wide"],
+            }
+        )
+
+        _, failures = compile_schema(SCHEMA).coerce(df)
+
+        self.assertEqual(
+            failures.to_dict("records"),
+            [
+                {"row": 1, "column": "mag", "value": "n/a"},
+                {"row": 2, "column": "gap", "value": "wide"},
+            ],
+        )
+
+    def test_coerce_reports_non_integral_values(self):
+        df = pd.DataFrame(
+            {"id": ["us1", "us2"], "mag": ["1.5", "2"], "gap": ["10", "40.5"]}
+        )
+
+        df, failures = compile_schema(SCHEMA).coerce(df)
+
+        self.assertEqual(str(df["gap"].dtype), "Int64")
+        self.assertEqual(
+            failures.to_dict("records"), [{"row": 1, "column": "gap", "value": "40.5"}]
+        )
+
+    def test_validate_and_transform_schema_from_csv(self):
+        df = validate_and_transform_schema_from_csv(
+            make_usgs_csv(50, null_fraction=0.3)
+        )
+
+        self.assertEqual(list(df.columns), list(USGS_SCHEMA))
+        self.assertEqual(str(df["gap"].dtype), "float64")
+        self.assertEqual(str(df["magNst"].dtype), "float64")
+        self.assertTrue(df["gap"].isna().any())
+
+    def test_validate_and_transform_schema_from_csv_invalid(self):
+        lines = make_usgs_csv(5).splitlines()
+        columns = lines[0].split(",")
+        row = lines[3].split(",")
+        row[columns.index("mag")] = "unknown"
+        lines[3] = ",".join(row)
+
+        with self.assertRaisesRegex(ValueError, "column mag.*'unknown' in row 2"):
+            validate_and_transform_schema_from_csv("\n".join(lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,241 @@
+import importlib.util
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from benchmarks.fixtures import make_usgs_csv, make_usgs_dataframe
+from functions.bigquery_client import set_bigquery_client
+from functions.bigquery_functions import BatchLoader, push_data_to_bigquery
+from functions.config import load_config
+from functions.geocode_cache import GEOCODER_VERSION, normalize_address
+from functions.runner import run_pipeline
+from functions.sinks import DuckDBSink, ParquetSink, Sink, to_arrow
+from functions.tables import CURATED_TABLE
+from functions.transformation import minor_transform_dataframe
+from functions.usgs_client import set_usgs_client
+from tests.stub_usgs_server import StubUSGSServer
+
+TABLE_ID = "project.curated_data.earthquakes"
+
+
+class SinkTests(unittest.TestCase):
+    """
+    Unit tests for the Arrow batches and the local sinks.
+
+    Test Cases:
+        - test_to_arrow_uses_table_types: Verify that batches have the Arrow types of their table.
+        - test_parquet_sink_partitions_by_day: Verify that Parquet tables are split in day partitions.
+        - test_parquet_sink_merge: Verify that a merge replaces the rows of the same key and adds the others.
+        - test_parquet_sink_replace_partitions: Verify that 'replace' keeps the partitions without rows.
+        - test_parquet_sink_fail: Verify that 'fail' raises if the table holds rows.
+        - test_duckdb_sink_merge: Verify that DuckDB tables are merged as the BigQuery ones.
+        - test_duckdb_sink_requires_duckdb: Verify that the DuckDB sink raises a ValueError without the duckdb package.
+        - test_sink_requires_write: Verify that a sink without `write` cannot be created.
+        - test_push_data_with_sink: Verify that push_data_to_bigquery writes to a given sink.
+        - test_run_pipeline_offline: Verify a full run to the Parquet sink, without any BigQuery client.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        df = make_usgs_dataframe(30)
+        df["time"] = [f"2024-01-0{1 + index % 3}T12:00:00.000Z" for index in range(30)]
+        self.curated_df = minor_transform_dataframe("pleo_dk", df)
+
+    def read_parquet(self, root):
+        table = ds.dataset(
+            os.path.join(root, "curated_data", "earthquakes"), partitioning="hive"
+        ).to_table()
+        return table.to_pandas().sort_values("hashed_id", ignore_index=True)
+
+    def test_to_arrow_uses_table_types(self):
+        table = to_arrow(
+            pd.concat([self.curated_df, self.curated_df.iloc[:5]]),
+            CURATED_TABLE,
+            merge_keys=["hashed_id"],
+        )
+
+        self.assertEqual(table.num_rows, 30)
+        self.assertEqual(table.schema, CURATED_TABLE.arrow_schema)
+        self.assertEqual(table.schema.field("time").type, pa.timestamp("us", "UTC"))
+
+    def test_parquet_sink_partitions_by_day(self):
+        sink = ParquetSink(self.directory.name)
+
+        size = sink.write(
+            TABLE_ID, to_arrow(self.curated_df, CURATED_TABLE), spec=CURATED_TABLE
+        )
+
+        directory = os.path.join(self.directory.name, "curated_data", "earthquakes")
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            ["date=2024-01-01", "date=2024-01-02", "date=2024-01-03"],
+        )
+        self.assertGreater(size, 0)
+        df = self.read_parquet(self.directory.name)
+        self.assertEqual(len(df), 30)
+        self.assertEqual(sorted(df["hashed_id"]), sorted(self.curated_df["hashed_id"]))
+
+    def test_parquet_sink_merge(self):
+        sink = ParquetSink(self.directory.name)
+        sink.write(
+            TABLE_ID,
+            to_arrow(self.curated_df, CURATED_TABLE),
+            "merge",
+            ["hashed_id"],
+            CURATED_TABLE,
+        )
+
+        changed = self.curated_df.iloc[:2].copy()
+        changed["mag"] = 9.9
+        changed.loc[changed.index[1], "time"] = "2024-01-05T12:00:00.000Z"
+        sink.write(
+            TABLE_ID,
+            to_arrow(changed, CURATED_TABLE),
+            "merge",
+            ["hashed_id"],
+            CURATED_TABLE,
+        )
+
+        df = self.read_parquet(self.directory.name)
+        self.assertEqual(len(df), 30)
+        self.assertEqual(
+            sorted(df.loc[df["mag"] == 9.9, "hashed_id"]), sorted(changed["hashed_id"])
+        )
+
+    def test_parquet_sink_replace_partitions(self):
+        sink = ParquetSink(self.directory.name)
+        sink.write(
+            TABLE_ID, to_arrow(self.curated_df, CURATED_TABLE), spec=CURATED_TABLE
+        )
+
+        first_day = self.curated_df.iloc[:1]
+        sink.write(
+            TABLE_ID, to_arrow(first_day, CURATED_TABLE), "replace", spec=CURATED_TABLE
+        )
+
+        df = self.read_parquet(self.directory.name)
+        self.assertEqual(len(df), 21)
+        self.assertEqual((df["date"] == "2024-01-01").sum(), 1)
+
+    def test_parquet_sink_fail(self):
+        sink = ParquetSink(self.directory.name)
+        table = to_arrow(self.curated_df, CURATED_TABLE)
+        sink.write(TABLE_ID, table, "fail", spec=CURATED_TABLE)
+
+        with self.assertRaises(ValueError):
+            sink.write(TABLE_ID, table, "fail", spec=CURATED_TABLE)
+
+    @unittest.skipUnless(importlib.util.find_spec("duckdb"), "DuckDB is not installed")
+    def test_duckdb_sink_merge(self):
+        sink = DuckDBSink(os.path.join(self.directory.name, "earthquakes.duckdb"))
+        self.addCleanup(sink.close)
+        with BatchLoader("project", if_exists="merge", sink=sink) as loader:
+            loader.add(
+                self.curated_df,
+                "curated_data",
+                "earthquakes",
+                ["hashed_id"],
+                CURATED_TABLE,
+            )
+        changed = self.curated_df.iloc[:2].copy()
+        changed["mag"] = 9.9
+        with BatchLoader("project", if_exists="merge", sink=sink) as loader:
+            loader.add(
+                changed, "curated_data", "earthquakes", ["hashed_id"], CURATED_TABLE
+            )
+
+        rows = sink.connection.execute(
+            'SELECT count(*), count(*) FILTER (WHERE mag = 9.9) FROM "curated_data"."earthquakes"'
+        ).fetchone()
+        self.assertEqual(rows, (30, 2))
+
+    def test_duckdb_sink_requires_duckdb(self):
+        with mock.patch.dict("sys.modules", {"duckdb": None}):
+            with self.assertRaisesRegex(ValueError, "requirements-optional.txt"):
+                DuckDBSink(os.path.join(self.directory.name, "earthquakes.duckdb"))
+
+    def test_sink_requires_write(self):
+        class NoWriteSink(Sink):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoWriteSink()
+
+    def test_push_data_with_sink(self):
+        sink = ParquetSink(self.directory.name)
+
+        push_data_to_bigquery(
+            self.curated_df,
+            "project",
+            "curated_data",
+            "earthquakes",
+            spec=CURATED_TABLE,
+            sink=sink,
+        )
+
+        self.assertEqual(len(self.read_parquet(self.directory.name)), 30)
+
+    def test_run_pipeline_offline(self):
+        directory = self.directory.name
+        coordinates = {"pleo_dk": [55.69, 12.57], "pleo_es": [40.42, -3.70]}
+        locations = {
+            "pleo_dk": "Sortedam Dossering 7 - 4th floor  2200 Copenhagen N",
+            "pleo_es": "Calle Gran Via, 39 6th floor 28013 Madrid",
+        }
+        with open(os.path.join(directory, "geocode_cache.json"), "w") as file:
+            json.dump(
+                {
+                    "version": GEOCODER_VERSION,
+                    "entries": {
+                        normalize_address(locations[name]): {
+                            "coordinates": value,
+                            "cached_at": time.time(),
+                        }
+                        for name, value in coordinates.items()
+                    },
+                },
+                file,
+            )
+        # Any use of BigQuery would fail on the missing client
+        set_bigquery_client(None)
+        self.addCleanup(set_usgs_client, None)
+
+        with StubUSGSServer(csv_body=make_usgs_csv(20), count=20) as server:
+            config = load_config(
+                overrides={
+                    "locations": locations,
+                    "extraction": {"usgs_url": server.url, "end_time": "2024-02-01"},
+                    "concurrency": {"requests_per_second": 100},
+                    "state": {
+                        "state_path": os.path.join(directory, "watermarks.json"),
+                        "geocode_cache_path": os.path.join(
+                            directory, "geocode_cache.json"
+                        ),
+                        "request_cache_path": None,
+                        "raw_cache_dir": os.path.join(directory, "raw"),
+                        "metrics_path": None,
+                    },
+                    "sink": {
+                        "type": "parquet",
+                        "parquet_dir": os.path.join(directory, "parquet"),
+                    },
+                }
+            )
+            total_rows = run_pipeline(config)
+
+        self.assertEqual(total_rows, 40)
+        df = self.read_parquet(os.path.join(directory, "parquet"))
+        self.assertEqual(sorted(df["location"].unique()), ["pleo_dk", "pleo_es"])
+        self.assertEqual(len(df), 40)
+        raw_directory = os.path.join(directory, "parquet", "raw_data")
+        self.assertEqual(sorted(os.listdir(raw_directory)), ["pleo_dk", "pleo_es"])
+
+
+if __name__ == "__main__":
+    unittest.main()
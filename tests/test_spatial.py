@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+import pandas as pd
+from functions.spatial import (
+    EARTH_RADIUS_KM,
+    assign_to_offices,
+    bounding_box,
+    haversine_km,
+    plan_regions,
+)
+
+OFFICES = {
+    "pleo_dk": (55.6867, 12.5701),
+    "pleo_de": (52.5233, 13.4167),
+    "pleo_es": (40.4203, -3.7058),
+    "pleo_ca": (45.5017, -73.5673),
+}
+
+
+class SpatialTests(unittest.TestCase):
+    """
+    Unit tests for the region planning and office assignment functions.
+
+    Test Cases:
+        - test_haversine_km: Verify the distance between two known points.
+        - test_bounding_box_covers_circles: Verify that the box contains the points at the radius of every office.
+        - test_plan_regions_merges_nearby_offices: Verify that only offices whose box saves area are merged.
+        - test_plan_regions_one_query_per_office: Verify that None keeps one radius query per office.
+        - test_assign_to_offices: Verify that events are assigned to every office within the radius.
+    """
+
+    def test_haversine_km(self):
+        distance = haversine_km(*OFFICES["pleo_dk"], *OFFICES["pleo_de"])
+        self.assertAlmostEqual(float(distance), 355.8, delta=1.0)
+        self.assertEqual(float(haversine_km(10.0, 20.0, 10.0, 20.0)), 0.0)
+
+    def test_bounding_box_covers_circles(self):
+        box = bounding_box([OFFICES["pleo_dk"], OFFICES["pleo_de"]], 500)
+        for latitude, longitude in (OFFICES["pleo_dk"], OFFICES["pleo_de"]):
+            delta_latitude = np.degrees(500 / EARTH_RADIUS_KM)
+            delta_longitude = np.degrees(
+                np.arcsin(np.sin(500 / EARTH_RADIUS_KM) / np.cos(np.radians(latitude)))
+            )
+            self.assertLessEqual(box["minlatitude"], latitude - delta_latitude)
+            self.assertGreaterEqual(box["maxlatitude"], latitude + delta_latitude)
+            self.assertLessEqual(box["minlongitude"], longitude - delta_longitude)
+            self.assertGreaterEqual(box["maxlongitude"], longitude + delta_longitude)
+
+    def test_plan_regions_merges_nearby_offices(self):
+        regions = plan_regions(OFFICES, 500)
+
+        self.assertEqual(sorted(regions), ["pleo_ca", "pleo_dk+pleo_de", "pleo_es"])
+        self.assertEqual(
+            regions["pleo_dk+pleo_de"]["locations"], ["pleo_dk", "pleo_de"]
+        )
+        self.assertIn("minlatitude", regions["pleo_dk+pleo_de"]["query"])
+        self.assertEqual(
+            regions["pleo_es"]["query"],
+            {"latitude": 40.4203, "longitude": -3.7058, "maxradiuskm": 500},
+        )
+
+    def test_plan_regions_one_query_per_office(self):
+        regions = plan_regions(OFFICES, 500, max_overfetch=None)
+        self.assertEqual(list(regions), list(OFFICES))
+
+    def test_assign_to_offices(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(
+            {
+                "id": [f"us{i}" for i in range(10_000)],
+                "latitude": rng.uniform(45.0, 62.0, 10_000),
+                "longitude": rng.uniform(0.0, 25.0, 10_000),
+            }
+        )
+        offices = {name: OFFICES[name] for name in ("pleo_dk", "pleo_de")}
+
+        assigned = assign_to_offices(df, offices, 500)
+
+        for name, (latitude, longitude) in offices.items():
+            distances = haversine_km(
+                latitude, longitude, df["latitude"], df["longitude"]
+            )
+            expected = df[distances <= 500].reset_index(drop=True)
+            pd.testing.assert_frame_equal(assigned[name], expected)
+        both = set(assigned["pleo_dk"]["id"]) & set(assigned["pleo_de"]["id"])
+        self.assertGreater(len(both), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
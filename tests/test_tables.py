@@ -0,0 +1,165 @@
+import tempfile
+import unittest
+from datetime import datetime
+import pandas as pd
+import pyarrow.dataset as ds
+from functions.bigquery_functions import BatchLoader, push_data_to_bigquery
+from functions.fake_bigquery import FakeBigQueryClient
+from functions.sinks import ParquetSink, to_arrow
+from functions.tables import CURATED_TABLE, RAW_TABLE, ensure_table
+from functions.transformation import USGS_SCHEMA, minor_transform_dataframe
+from benchmarks.fixtures import make_usgs_dataframe
+
+
+class TableSpecTests(unittest.TestCase):
+    """
+    Unit tests for the partitioned and clustered tables, against the fake BigQuery client.
+
+    Test Cases:
+        - test_ensure_table_records_ddl: Verify that tables are created once, partitioned on time and clustered.
+        - test_prepare_parses_timestamps: Verify that TIMESTAMP columns are parsed to UTC datetimes.
+        - test_merge_scans_affected_partitions: Verify that a merge only deletes from the partitions of its rows.
+        - test_replace_keeps_other_partitions: Verify that 'replace' only replaces the partitions of its rows.
+        - test_batch_loader_creates_tables: Verify that the loader creates the raw and curated tables before loading.
+        - test_raw_table_matches_usgs_schema: Verify that the raw table has the USGS columns, with the numbers as FLOAT64.
+        - test_raw_table_keeps_fractional_gap: Verify that a non-integral gap is converted to Arrow and written by a sink.
+    """
+
+    def setUp(self):
+        self.client = FakeBigQueryClient()
+        self.df = make_usgs_dataframe(20)
+        self.df["time"] = [
+            f"2024-01-0{1 + index % 3}T12:00:00.000Z" for index in range(20)
+        ]
+
+    def test_ensure_table_records_ddl(self):
+        ensure_table(self.client, "project.curated_data.earthquakes", CURATED_TABLE)
+        ensure_table(self.client, "project.curated_data.earthquakes", CURATED_TABLE)
+
+        self.assertEqual(len(self.client.ddl), 1)
+        self.assertIn("`time` TIMESTAMP", self.client.ddl[0])
+        self.assertIn("PARTITION BY TIMESTAMP_TRUNC(`time`, DAY)", self.client.ddl[0])
+        self.assertIn("CLUSTER BY location", self.client.ddl[0])
+
+    def test_prepare_parses_timestamps(self):
+        curated_df = minor_transform_dataframe("pleo_dk", self.df.copy())
+        curated_df["extra"] = 1
+
+        prepared = CURATED_TABLE.prepare(curated_df)
+
+        self.assertEqual(list(prepared.columns), list(CURATED_TABLE.schema))
+        for column in ("time", "inserted_at"):
+            self.assertEqual(str(prepared[column].dt.tz), "UTC")
+        self.assertEqual(
+            CURATED_TABLE.partitions(prepared),
+            [datetime(2024, 1, day).date() for day in (1, 2, 3)],
+        )
+        with self.assertRaisesRegex(ValueError, "Missing column for the table: place"):
+            CURATED_TABLE.prepare(curated_df.drop(columns=["place"]))
+
+    def test_merge_scans_affected_partitions(self):
+        push_data_to_bigquery(
+            self.df,
+            "project",
+            "raw_data",
+            "pleo_dk",
+            "merge",
+            self.client,
+            ["id"],
+            spec=RAW_TABLE,
+        )
+        push_data_to_bigquery(
+            self.df,
+            "project",
+            "raw_data",
+            "pleo_dk",
+            "merge",
+            self.client,
+            ["id"],
+            spec=RAW_TABLE,
+        )
+
+        self.assertEqual(len(self.client.tables["project.raw_data.pleo_dk"]), 20)
+        # The days of the rows, with a day of margin on both sides
+        self.assertIn(
+            "target.`time` >= '2023-12-31 00:00:00+00:00' "
+            "AND target.`time` < '2024-01-05 00:00:00+00:00'",
+            self.client.queries[-1],
+        )
+
+    def test_replace_keeps_other_partitions(self):
+        push_data_to_bigquery(
+            self.df,
+            "project",
+            "raw_data",
+            "pleo_dk",
+            "append",
+            self.client,
+            spec=RAW_TABLE,
+        )
+
+        second_day = self.df[self.df["time"].str.startswith("2024-01-02")].iloc[:2]
+        push_data_to_bigquery(
+            second_day,
+            "project",
+            "raw_data",
+            "pleo_dk",
+            "replace",
+            self.client,
+            spec=RAW_TABLE,
+        )
+
+        table = self.client.tables["project.raw_data.pleo_dk"]
+        days = table["time"].str[:10].value_counts().to_dict()
+        self.assertEqual(days, {"2024-01-01": 7, "2024-01-02": 2, "2024-01-03": 6})
+
+    def test_batch_loader_creates_tables(self):
+        with BatchLoader("project", if_exists="merge", client=self.client) as loader:
+            loader.add(self.df, "raw_data", "pleo_dk", ["id"], spec=RAW_TABLE)
+            curated_df = minor_transform_dataframe("pleo_dk", self.df.copy())
+            loader.add(
+                curated_df[list(CURATED_TABLE.schema)],
+                "curated_data",
+                "earthquakes",
+                ["hashed_id"],
+                spec=CURATED_TABLE,
+            )
+
+        self.assertEqual(len(self.client.ddl), 2)
+        curated = self.client.tables["project.curated_data.earthquakes"]
+        self.assertEqual(len(curated), 20)
+        self.assertTrue(curated["time"].str.endswith("+00:00").all())
+        self.assertTrue(
+            (
+                pd.to_datetime(curated["inserted_at"], utc=True)
+                <= pd.Timestamp.now("UTC")
+            ).all()
+        )
+
+    def test_raw_table_matches_usgs_schema(self):
+        self.assertEqual(list(RAW_TABLE.schema), list(USGS_SCHEMA))
+        for column, dtype in USGS_SCHEMA.items():
+            if dtype == "float64":
+                self.assertEqual(RAW_TABLE.schema[column], "FLOAT64", column)
+
+    def test_raw_table_keeps_fractional_gap(self):
+        df = self.df.copy()
+        df["gap"] = 40.5
+        df["magNst"] = None
+
+        table = to_arrow(df, RAW_TABLE)
+
+        self.assertEqual(table["gap"].to_pylist(), [40.5] * 20)
+        self.assertEqual(table["magNst"].null_count, 20)
+        with tempfile.TemporaryDirectory() as directory:
+            ParquetSink(directory).write(
+                "project.raw_data.pleo_dk", table, spec=RAW_TABLE
+            )
+            written = ds.dataset(
+                f"{directory}/raw_data/pleo_dk", partitioning="hive"
+            ).to_table()
+        self.assertEqual(written["gap"].to_pylist(), [40.5] * 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import unittest
+import requests
+from functions.usgs_client import USGSClient
+from tests.stub_usgs_server import StubUSGSServer
+
+
+class USGSClientTests(unittest.TestCase):
+    """
+    Unit tests for the USGSClient class, against a local stub server injecting failures.
+
+    Test Cases:
+        - test_usgs_client_retries_failures: Verify that 503 and 500 responses are retried until success.
+        - test_usgs_client_honours_retry_after: Verify that a 429 waits for the Retry-After header.
+        - test_usgs_client_gives_up: Verify that an HTTPError is raised once the retries are exhausted.
+        - test_usgs_client_does_not_retry_client_errors: Verify that a 400 is raised without retrying.
+        - test_usgs_client_timeout: Verify that a stalled response raises a Timeout.
+        - test_usgs_client_session_headers: Verify that requests ask for gzip and keep-alive connections.
+    """
+
+    def setUp(self):
+        self.client = USGSClient(backoff_factor=0.01, max_retries=3)
+
+    def test_usgs_client_retries_failures(self):
+        with StubUSGSServer(count=42) as server:
+            server.failures = [(503, {}), (500, {})]
+            response = self.client.get(f"{server.url}/fdsnws/event/1/count")
+
+        self.assertEqual(response.text, "42")
+        self.assertEqual(len(server.requests), 3)
+
+    def test_usgs_client_honours_retry_after(self):
+        with StubUSGSServer(count=42) as server:
+            server.failures = [(429, {"Retry-After": "1"})]
+            start = time.monotonic()
+            self.client.get(f"{server.url}/fdsnws/event/1/count")
+
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+
+    def test_usgs_client_gives_up(self):
+        with StubUSGSServer(count=42) as server:
+            server.failures = [(503, {})] * 4
+            with self.assertRaises(requests.HTTPError):
+                self.client.get(f"{server.url}/fdsnws/event/1/count")
+
+        self.assertEqual(len(server.requests), 4)
+
+    def test_usgs_client_does_not_retry_client_errors(self):
+        with StubUSGSServer(count=42) as server:
+            server.failures = [(400, {})]
+            with self.assertRaises(requests.HTTPError):
+                self.client.get(f"{server.url}/fdsnws/event/1/count")
+
+        self.assertEqual(len(server.requests), 1)
+
+    def test_usgs_client_timeout(self):
+        client = USGSClient(timeout=(1, 0.1), max_retries=1, backoff_factor=0.01)
+        with StubUSGSServer(count=42, delay=0.5) as server:
+            with self.assertRaises(requests.Timeout):
+                client.get(f"{server.url}/fdsnws/event/1/count")
+
+        self.assertEqual(len(server.requests), 2)
+
+    def test_usgs_client_session_headers(self):
+        with StubUSGSServer(count=42) as server:
+            for _ in range(3):
+                self.client.get(f"{server.url}/fdsnws/event/1/count")
+
+        self.assertEqual(server.request_headers[0]["Accept-Encoding"], "gzip")
+        self.assertTrue(
+            all(
+                headers["Connection"] == "keep-alive"
+                for headers in server.request_headers
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
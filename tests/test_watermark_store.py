@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from benchmarks.fixtures import make_usgs_text
+from functions.formats import decode_response
+from functions.state import WatermarkStore, compute_watermark
+
+
+class WatermarkStoreTests(unittest.TestCase):
+    """
+    Unit tests for the WatermarkStore class and the compute_watermark function.
+
+    Test Cases:
+        - test_watermark_store_first_run: Verify that a missing state file returns no watermark.
+        - test_watermark_store_persists: Verify that saved watermarks are read back by a new store.
+        - test_compute_watermark: Verify that the watermark is the latest 'updated' time in UTC.
+        - test_compute_watermark_empty: Verify that an empty extraction keeps the previous watermark.
+        - test_compute_watermark_without_updated: Verify that data without 'updated' times, as from the text format, keeps the previous watermark.
+        - test_compute_watermark_capped_at_end_time: Verify that revisions after the window do not move the watermark past it.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "state", "watermarks.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_watermark_store_first_run(self):
+        self.assertIsNone(WatermarkStore(self.path).get("pleo_dk"))
+
+    def test_watermark_store_persists(self):
+        WatermarkStore(self.path).update({"pleo_dk": "2024-01-02T03:04:05.678"})
+        store = WatermarkStore(self.path)
+        store.update({"pleo_de": "2024-02-01T00:00:00.000"})
+
+        reloaded = WatermarkStore(self.path)
+        self.assertEqual(reloaded.get("pleo_dk"), "2024-01-02T03:04:05.678")
+        self.assertEqual(reloaded.get("pleo_de"), "2024-02-01T00:00:00.000")
+
+    def test_compute_watermark(self):
+        df = pd.DataFrame(
+            {"updated": ["2024-01-02T03:04:05.678Z", "2024-03-01T10:00:00.001Z"]}
+        )
+        self.assertEqual(compute_watermark(df), "2024-03-01T10:00:00.001")
+
+    def test_compute_watermark_empty(self):
+        df = pd.DataFrame({"updated": []})
+        self.assertEqual(
+            compute_watermark(df, previous_watermark="2024-01-01T00:00:00.000"),
+            "2024-01-01T00:00:00.000",
+        )
+
+    def test_compute_watermark_without_updated(self):
+        df = decode_response(make_usgs_text(3).encode(), "text")
+
+        self.assertIsNone(compute_watermark(df))
+        self.assertEqual(
+            compute_watermark(df, previous_watermark="2024-01-01T00:00:00.000"),
+            "2024-01-01T00:00:00.000",
+        )
+
+    def test_compute_watermark_capped_at_end_time(self):
+        # Yesterday's event revised this morning, after the window ending at midnight
+        df = pd.DataFrame(
+            {"updated": ["2024-03-01T12:00:00.000Z", "2024-03-02T10:00:00.000Z"]}
+        )
+        watermark = compute_watermark(df, end_time="2024-03-02")
+
+        self.assertEqual(watermark, "2024-03-02T00:00:00.000")
+        # An event of 09:00 today, never revised, is still extracted by the next run
+        self.assertLess(watermark, "2024-03-02T09:00:00.000")
+
+
+if __name__ == "__main__":
+    unittest.main()